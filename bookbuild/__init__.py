@@ -0,0 +1,5 @@
+"""
+Shared build helpers for 'Curls & Contemplation'.
+
+Used by generate-pod-pdf.py and the LaTeX scripts in pdf/.
+"""
@@ -0,0 +1,92 @@
+"""
+Content-addressed store of finished book outputs.
+
+A POD PDF, the LaTeX master PDF or the EPUB is stored under a key that
+hashes everything its bytes depend on: the source files, the build code,
+generated text (trim CSS, the LaTeX preamble), the options, the tool
+versions and the source date. A build whose key is already stored writes
+the stored bytes and skips the work. The store is a DiskCache, so the
+least recently used artifacts are evicted once it outgrows its budget.
+
+This relies on the builds being reproducible. Dates come from
+source_date_epoch() and PDF IDs are derived from the content, so the same
+inputs give the same bytes whether or not the artifact was cached.
+"""
+
+import importlib.metadata
+import os
+from pathlib import Path
+
+from .cache import DiskCache, hash_parts
+from .files import write_if_changed
+
+# Bump when the key layout changes
+ARTIFACT_VERSION = "1"
+
+# 1980-01-01, the earliest date a zip entry can carry
+DEFAULT_EPOCH = 315532800
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+
+
+def artifact_cache(enabled: bool = True) -> DiskCache:
+    """Return the store of finished outputs."""
+    return DiskCache("artifacts", max_bytes=512 * 1024 * 1024, enabled=enabled)
+
+
+def source_date_epoch() -> int:
+    """Return the date stamped into outputs: SOURCE_DATE_EPOCH, or 1980-01-01."""
+    return int(os.environ.get("SOURCE_DATE_EPOCH", DEFAULT_EPOCH))
+
+
+def files_digest(root: Path, paths: list) -> str:
+    """Hash the names (relative to root) and contents of files."""
+    root = Path(root)
+    parts = []
+    for path in paths:
+        parts.append(Path(path).relative_to(root).as_posix())
+        parts.append(Path(path).read_bytes())
+    return hash_parts(*parts)
+
+
+def tree_digest(root: Path) -> str:
+    """Hash every file under root."""
+    root = Path(root)
+    return files_digest(root, sorted(p for p in root.rglob("*") if p.is_file()))
+
+
+def code_digest(*scripts) -> str:
+    """Hash the build code: the bookbuild package and the given scripts."""
+    files = sorted(PACKAGE_DIR.glob("*.py")) + sorted(PACKAGE_DIR.glob("*.lua"))
+    files += [Path(script).resolve() for script in scripts]
+    return hash_parts(*(part for path in files for part in (path.name, path.read_bytes())))
+
+
+def package_versions(*names) -> str:
+    """Return 'name version' lines for Python distributions."""
+    lines = []
+    for name in names:
+        try:
+            version = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            version = "not installed"
+        lines.append(f"{name} {version}")
+    return "\n".join(lines)
+
+
+def artifact_key(kind: str, *parts) -> str:
+    """Return the key of an artifact of kind built from parts."""
+    return hash_parts("artifact", ARTIFACT_VERSION, kind, *parts)
+
+
+def restore_artifact(cache: DiskCache, key: str, output: Path):
+    """
+    Write the stored artifact for key to output.
+
+    Returns its bytes, or None if it is not stored. An output that already
+    holds them is left alone.
+    """
+    data = cache.get(key)
+    if data is not None:
+        write_if_changed(output, data)
+    return data
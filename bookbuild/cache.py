@@ -0,0 +1,125 @@
+"""
+Content-addressed on-disk cache for build outputs.
+
+Entries are keyed by a hash of everything that affects the output (input
+bytes, tool versions, arguments) and stored under .cache/<name>/. The total
+size of each cache is bounded; the least recently used entries are evicted
+first.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+CACHE_ROOT = Path(os.environ.get(
+    "BOOKBUILD_CACHE_DIR",
+    Path(__file__).resolve().parent.parent / ".cache",
+))
+
+
+def hash_parts(*parts) -> str:
+    """Hash a sequence of str/bytes parts into a hex digest."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") differ
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    """Hash the contents of a file."""
+    return hash_parts(Path(path).read_bytes())
+
+
+class DiskCache:
+    """A named, size-bounded cache of byte blobs keyed by hex digests."""
+
+    def __init__(self, name: str, max_bytes: int = 64 * 1024 * 1024, enabled: bool = True):
+        self.path = CACHE_ROOT / name
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _entry(self, key: str) -> Path:
+        return self.path / key[:2] / key
+
+    def get(self, key: str):
+        """Return the cached bytes for key, or None on a miss."""
+        if not self.enabled:
+            return None
+        entry = self._entry(key)
+        try:
+            data = entry.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        # Bump mtime so eviction sees this entry as recently used
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store data under key and evict old entries if over budget."""
+        if not self.enabled:
+            return
+        entry = self._entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so concurrent readers never see
+        # a partial entry
+        fd, tmp = tempfile.mkstemp(dir=entry.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, entry)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def get_text(self, key: str):
+        """Return the cached entry decoded as UTF-8, or None on a miss."""
+        data = self.get(key)
+        return None if data is None else data.decode("utf-8")
+
+    def put_text(self, key: str, text: str) -> None:
+        """Store a UTF-8 text entry."""
+        self.put(key, text.encode("utf-8"))
+
+    def evict(self) -> None:
+        """Delete least recently used entries until under max_bytes."""
+        entries = []
+        total = 0
+        for entry in self.path.glob("??/*"):
+            if entry.name.startswith(".tmp-"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self) -> str:
+        """Return a short hit/miss summary."""
+        if not self.enabled:
+            return "cache disabled"
+        return f"{self.hits} hits, {self.misses} misses"
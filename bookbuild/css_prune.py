@@ -0,0 +1,136 @@
+"""
+Drop CSS rules that cannot match the combined POD document.
+
+WeasyPrint tests every selector against every element, so rules for markup
+the book does not use (web-only components, other page types) cost cascade
+time on each render. The document is parsed the way WeasyPrint parses it
+(tinyhtml5, so implied elements such as <tbody> exist), every selector is
+run through one cssselect2 Matcher, and style rules without a matching
+element are removed.
+
+Kept unconditionally: at-rules other than @media/@supports (@page,
+@font-face, @import, ...), and any rule whose selectors cssselect2 cannot
+compile. Pseudo-elements (::before, ::first-letter, ...) are matched on
+their originating element, so they stay whenever it exists. @media and
+@supports blocks are pruned inside and dropped only when empty.
+
+The result is cached by the hash of the stylesheets and the document.
+"""
+
+import re
+
+from .cache import DiskCache, hash_parts
+
+# Bump when the pruning rules change
+PRUNE_VERSION = "1"
+
+# Pseudo-elements, including the CSS2 single-colon spellings
+PSEUDO_ELEMENT_RE = re.compile(
+    r"::?(before|after|first-letter|first-line|marker|placeholder|selection|footnote-call|footnote-marker)\b",
+    re.IGNORECASE,
+)
+GROUPING_AT_RULES = {"media", "supports"}
+
+
+def css_cache(enabled: bool = True) -> DiskCache:
+    """Return the cache of pruned stylesheets."""
+    return DiskCache("css", enabled=enabled)
+
+
+def _is_group(rule) -> bool:
+    return rule.type == "at-rule" and rule.lower_at_keyword in GROUPING_AT_RULES and rule.content
+
+
+def _parse_groups(rules) -> list:
+    """Return rules as (rule, children) pairs; children is the parsed body of @media/@supports."""
+    import tinycss2
+
+    nodes = []
+    for rule in rules:
+        children = None
+        if _is_group(rule):
+            children = _parse_groups(tinycss2.parse_rule_list(
+                rule.content, skip_comments=True, skip_whitespace=True))
+        nodes.append((rule, children))
+    return nodes
+
+
+def _style_rules(nodes, out: list) -> None:
+    """Collect every qualified rule, descending into @media/@supports."""
+    for rule, children in nodes:
+        if rule.type == "qualified-rule":
+            out.append(rule)
+        elif children is not None:
+            _style_rules(children, out)
+
+
+def _matching_rules(document_html: str, rules: list) -> set:
+    """Return the ids of the rules whose selectors match at least one element."""
+    import cssselect2
+    import tinycss2
+    import tinyhtml5
+
+    matcher = cssselect2.Matcher()
+    keep = set()
+    for rule in rules:
+        selector_text = PSEUDO_ELEMENT_RE.sub("", tinycss2.serialize(rule.prelude)).strip()
+        try:
+            for selector in cssselect2.compile_selector_list(selector_text):
+                matcher.add_selector(selector, id(rule))
+        except cssselect2.SelectorError:
+            keep.add(id(rule))
+
+    root = cssselect2.ElementWrapper.from_html_root(tinyhtml5.parse(document_html))
+    for element in root.iter_subtree():
+        for _, _, _, rule_id in matcher.match(element):
+            keep.add(rule_id)
+    return keep
+
+
+def _serialize(nodes, keep: set) -> str:
+    """Serialize rules, dropping unmatched style rules and empty groups."""
+    import tinycss2
+
+    parts = []
+    for rule, children in nodes:
+        if rule.type == "qualified-rule":
+            if id(rule) in keep:
+                parts.append(rule.serialize())
+        elif children is not None:
+            inner = _serialize(children, keep)
+            if inner:
+                prelude = tinycss2.serialize(rule.prelude)
+                parts.append(f"@{rule.at_keyword}{prelude}{{\n{inner}\n}}")
+        elif rule.type == "at-rule":
+            parts.append(rule.serialize())
+    return "\n".join(parts)
+
+
+def prune_stylesheets(stylesheets: list, document_html: str, cache: DiskCache = None) -> tuple:
+    """
+    Prune stylesheets (CSS strings) against document_html.
+
+    Returns (pruned stylesheets, rules kept, rules before).
+    """
+    import tinycss2
+
+    key = hash_parts("prune", PRUNE_VERSION, document_html, *stylesheets)
+    cached = cache.get_text(key) if cache is not None else None
+    if cached is not None:
+        kept, total, *pruned = cached.split("\0")
+        return pruned, int(kept), int(total)
+
+    parsed = []
+    rules = []
+    for css in stylesheets:
+        sheet = _parse_groups(tinycss2.parse_stylesheet(css, skip_comments=True, skip_whitespace=True))
+        parsed.append(sheet)
+        _style_rules(sheet, rules)
+
+    keep = _matching_rules(document_html, rules)
+    pruned = [_serialize(sheet, keep) for sheet in parsed]
+    kept = sum(1 for rule in rules if id(rule) in keep)
+
+    if cache is not None:
+        cache.put_text(key, "\0".join([str(kept), str(len(rules)), *pruned]))
+    return pruned, kept, len(rules)
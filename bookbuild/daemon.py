@@ -0,0 +1,177 @@
+"""
+A warm build server on a Unix domain socket.
+
+The server imports the build scripts once and runs each request's main()
+in the server process, so WeasyPrint, lxml and the scripts are imported
+once and in-process state (pod_render.keep_warm()) carries over between
+builds. Requests are handled one at a time, in the client's working
+directory. For the length of a request, file descriptors 1 and 2 are a
+pipe to the client, so the output of subprocesses (pandoc, pdftoppm),
+worker processes and logging reaches it along with print()'s.
+
+The protocol is one JSON object per line. The client sends
+{"command": name, "args": [...], "cwd": dir}; the server answers with
+{"out": text} messages carrying the build's output as it is printed,
+then {"exit": status}.
+"""
+
+import codecs
+import contextlib
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+from pathlib import Path
+
+from .cache import CACHE_ROOT
+
+DEFAULT_SOCKET = CACHE_ROOT / "build-daemon.sock"
+
+
+def _send(stream, message: dict) -> None:
+    stream.write((json.dumps(message) + "\n").encode("utf-8"))
+    stream.flush()
+
+
+class _Capture:
+    """
+    Forward everything written to file descriptors 1 and 2 to the client.
+
+    Entering returns a line-buffered text stream on the same pipe, for
+    sys.stdout and sys.stderr. broken is set once the client has gone away;
+    the pipe is still drained so writers never block.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.broken = False
+
+    def __enter__(self):
+        sys.__stdout__.flush()
+        sys.__stderr__.flush()
+        read_fd, write_fd = os.pipe()
+        self.saved = [os.dup(1), os.dup(2)]
+        os.dup2(write_fd, 1)
+        os.dup2(write_fd, 2)
+        self.output = open(write_fd, "w", encoding="utf-8", buffering=1)
+        self.reader = threading.Thread(target=self._forward, args=(read_fd,))
+        self.reader.start()
+        return self.output
+
+    def __exit__(self, *exc_info):
+        # Streams opened before the request still buffer for fds 1 and 2
+        sys.__stdout__.flush()
+        sys.__stderr__.flush()
+        self.output.close()
+        for fd, saved in zip((1, 2), self.saved):
+            os.dup2(saved, fd)
+            os.close(saved)
+        # Returns once every writer, including worker processes, has closed the pipe
+        self.reader.join()
+
+    def _forward(self, read_fd: int) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with open(read_fd, "rb", buffering=0) as pipe:
+            while chunk := pipe.read(65536):
+                text = decoder.decode(chunk)
+                if text and not self.broken:
+                    try:
+                        _send(self.stream, {"out": text})
+                    except OSError:
+                        self.broken = True
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            command, args = request["command"], list(request.get("args", []))
+        except (ValueError, KeyError, TypeError):
+            _send(self.wfile, {"out": "Error: malformed request\n"})
+            _send(self.wfile, {"exit": 2})
+            return
+
+        if command == "stop":
+            self.server.stopping = True
+            _send(self.wfile, {"out": "Daemon stopping\n"})
+            _send(self.wfile, {"exit": 0})
+            return
+        if command not in self.server.commands:
+            _send(self.wfile, {"out": f"Error: unknown command {command!r}\n"})
+            _send(self.wfile, {"exit": 2})
+            return
+
+        capture = _Capture(self.wfile)
+        previous = os.getcwd()
+        status = 0
+        try:
+            os.chdir(request.get("cwd") or previous)
+            with capture as output, contextlib.redirect_stdout(output), \
+                    contextlib.redirect_stderr(output):
+                try:
+                    self.server.commands[command](args)
+                except SystemExit as e:
+                    if isinstance(e.code, str):
+                        print(e.code)
+                    status = e.code if isinstance(e.code, int) else (1 if e.code else 0)
+                except Exception:
+                    traceback.print_exc()
+                    status = 1
+        finally:
+            os.chdir(previous)
+        if capture.broken:
+            return  # the client went away
+        try:
+            _send(self.wfile, {"exit": status})
+        except BrokenPipeError:
+            pass
+
+
+def serve(commands: dict, socket_path: Path = DEFAULT_SOCKET) -> None:
+    """
+    Serve {command name: function(argv)} on socket_path until a stop request.
+
+    Raises RuntimeError if another server is listening on the socket.
+    """
+    socket_path = Path(socket_path)
+    if socket_path.exists():
+        try:
+            with socket.socket(socket.AF_UNIX) as probe:
+                probe.connect(str(socket_path))
+        except OSError:
+            socket_path.unlink()  # left behind by a server that died
+        else:
+            raise RuntimeError(f"a daemon is already listening on {socket_path}")
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with socketserver.UnixStreamServer(str(socket_path), _Handler) as server:
+        server.commands = commands
+        server.stopping = False
+        try:
+            while not server.stopping:
+                server.handle_request()
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+def request(command: str, args: list, socket_path: Path = DEFAULT_SOCKET) -> int:
+    """
+    Run command on the daemon, printing its output; returns the exit status.
+
+    Raises ConnectionError (or FileNotFoundError) when no daemon is running.
+    """
+    with socket.socket(socket.AF_UNIX) as conn:
+        conn.connect(str(socket_path))
+        stream = conn.makefile("rwb")
+        _send(stream, {"command": command, "args": args, "cwd": os.getcwd()})
+        for line in stream:
+            message = json.loads(line)
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "exit" in message:
+                return message["exit"]
+    raise ConnectionError("the daemon closed the connection without an exit status")
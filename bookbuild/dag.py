@@ -0,0 +1,165 @@
+"""
+Run build stages as a dependency graph.
+
+A stage is either a command line (run as a subprocess, its output going
+to <log dir>/<stage>.log) or a function (run in a worker process; its
+return value is the stage's log). A stage starts as soon as every stage it
+depends on has succeeded, so independent branches run side by side; when
+a stage fails, only the stages that depend on it are skipped.
+
+Stages declare how many CPUs they use (slots; a stage that runs its own
+worker pool takes several). The stages running at any time never hold
+more than the global limit, so branches do not oversubscribe the machine.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+OK, FAILED, SKIPPED = "ok", "failed", "skipped"
+
+
+class Stage:
+    """One node of the build graph."""
+
+    def __init__(self, name: str, command: list = None, func=None, args: tuple = (),
+                 deps: tuple = (), cwd: Path = None, slots: int = 1):
+        if (command is None) == (func is None):
+            raise ValueError(f"stage {name}: give exactly one of command and func")
+        self.name = name
+        self.command = [str(part) for part in command] if command else None
+        self.func = func
+        self.args = args
+        self.deps = tuple(deps)
+        self.cwd = cwd
+        self.slots = slots
+
+
+class _Slots:
+    """A counting semaphore where each acquire takes several units."""
+
+    def __init__(self, total: int):
+        self.free = total
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, count: int) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.free >= count)
+            self.free -= count
+
+    async def release(self, count: int) -> None:
+        async with self._condition:
+            self.free += count
+            self._condition.notify_all()
+
+
+def topological_order(stages: list) -> list:
+    """Return stages with every stage after its dependencies; raises ValueError on cycles."""
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"stage {stage.name} depends on unknown stage {dep}")
+
+    ordered, state = [], {}
+
+    def visit(stage, path):
+        if state.get(stage.name) == "done":
+            return
+        if state.get(stage.name) == "visiting":
+            raise ValueError("dependency cycle: " + " -> ".join(path + [stage.name]))
+        state[stage.name] = "visiting"
+        for dep in stage.deps:
+            visit(by_name[dep], path + [stage.name])
+        state[stage.name] = "done"
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage, [])
+    return ordered
+
+
+def critical_path(stages: list, results: dict) -> tuple:
+    """Return (seconds, stage names) of the longest chain of dependent stages."""
+    longest = {}
+    for stage in topological_order(stages):
+        before = max((longest[dep] for dep in stage.deps), key=lambda p: p[0], default=(0.0, []))
+        longest[stage.name] = (before[0] + results[stage.name][1], before[1] + [stage.name])
+    return max(longest.values(), key=lambda p: p[0], default=(0.0, []))
+
+
+def _tail(path: Path, lines: int = 20) -> str:
+    try:
+        return "\n".join(path.read_text(errors="replace").splitlines()[-lines:])
+    except FileNotFoundError:
+        return ""
+
+
+async def _run_graph(stages: list, limit: int, log_dir: Path, executor) -> dict:
+    slots = _Slots(limit)
+    results, tasks = {}, {}
+    loop = asyncio.get_running_loop()
+
+    async def run(stage):
+        await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+        failed = [dep for dep in stage.deps if results[dep][0] != OK]
+        if failed:
+            results[stage.name] = (SKIPPED, 0.0)
+            print(f"  [skipped] {stage.name} ({', '.join(failed)} did not finish)")
+            return
+
+        needed = min(stage.slots, limit)
+        await slots.acquire(needed)
+        log_path = log_dir / f"{stage.name}.log"
+        print(f"  [start]   {stage.name}")
+        start = time.monotonic()
+        try:
+            if stage.command:
+                with open(log_path, "wb") as log:
+                    process = await asyncio.create_subprocess_exec(
+                        *stage.command, cwd=stage.cwd,
+                        stdout=log, stderr=asyncio.subprocess.STDOUT,
+                    )
+                    returncode = await process.wait()
+                error = f"exit status {returncode}" if returncode else None
+            else:
+                try:
+                    output = await loop.run_in_executor(executor, stage.func, *stage.args)
+                    log_path.write_text(f"{output or ''}\n")
+                    error = None
+                except Exception as e:
+                    log_path.write_text(f"{type(e).__name__}: {e}\n")
+                    error = str(e) or type(e).__name__
+        finally:
+            await slots.release(needed)
+
+        elapsed = time.monotonic() - start
+        if error:
+            results[stage.name] = (FAILED, elapsed)
+            print(f"  [FAILED]  {stage.name} after {elapsed:.1f}s: {error} (log: {log_path})")
+            tail = _tail(log_path)
+            if tail:
+                print("    " + tail.replace("\n", "\n    "))
+        else:
+            results[stage.name] = (OK, elapsed)
+            print(f"  [done]    {stage.name} in {elapsed:.1f}s")
+
+    for stage in topological_order(stages):
+        tasks[stage.name] = asyncio.ensure_future(run(stage))
+    await asyncio.gather(*tasks.values())
+    return results
+
+
+def run_stages(stages: list, limit: int, log_dir: Path) -> dict:
+    """
+    Run the graph with at most limit CPU slots busy at once.
+
+    Returns {stage name: (status, seconds)}; status is OK, FAILED or SKIPPED.
+    """
+    topological_order(stages)
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    workers = max(1, min(limit, sum(1 for stage in stages if stage.func)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return asyncio.run(_run_graph(stages, max(1, limit), log_dir, executor))
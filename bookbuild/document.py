@@ -0,0 +1,217 @@
+"""
+One parsed model of each spine XHTML file, shared by the build stages.
+
+load_document() parses a file once with lxml and describes it: headings,
+referenced images, stylesheets and fonts, CSS classes, epub:type
+semantics and the kind of page it is. The kind comes from the epub:type
+vocabulary where the file uses it and from the file name otherwise. The
+description is cached on disk by the hash of the file's bytes, and the
+documents (with their parsed trees) are kept for the life of the process,
+so the POD build, the LaTeX build and the daemon reuse them.
+
+body() hands out a copy for callers that rewrite the tree; root is the
+shared tree, for reading only.
+"""
+
+import copy
+import json
+import re
+import threading
+from pathlib import Path
+
+from lxml import etree
+
+from .cache import DiskCache, hash_parts
+
+# Bump when the description changes
+DOCUMENT_VERSION = "1"
+
+XHTML_NS = "http://www.w3.org/1999/xhtml"
+EPUB_NS = "http://www.idpf.org/2007/ops"
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+# epub:type structural semantics -> file type; the first one in document order wins
+EPUB_TYPES = {
+    "titlepage": "titlepage",
+    "copyright-page": "copyright",
+    "copyright-statement": "copyright",
+    "toc": "toc",
+    "dedication": "dedication",
+    "preface": "preface",
+    "epigraph": "quote",
+    "part": "part",
+    "chapter": "chapter",
+    "conclusion": "conclusion",
+    "acknowledgments": "acknowledgments",
+    "bibliography": "bibliography",
+}
+
+FONT_URL_RE = re.compile(r"url\(\s*['\"]?([^'\")]+\.(?:woff2?|ttf|otf))['\"]?\s*\)", re.IGNORECASE)
+
+
+def type_from_filename(filename: str) -> str:
+    """Determine the type of content from the file name, for files without epub:type."""
+    if "TitlePage" in filename:
+        return "titlepage"
+    elif "Copyright" in filename:
+        return "copyright"
+    elif "TableOfContents" in filename:
+        return "toc"
+    elif "Dedication" in filename:
+        return "dedication"
+    elif "Preface" in filename and "quote" not in filename:
+        return "preface"
+    elif "-quote" in filename:
+        return "quote"
+    elif "Part-I" in filename or "Part-II" in filename or "Part-III" in filename or "Part-IV" in filename:
+        return "part"
+    elif "chapter-" in filename:
+        return "chapter"
+    elif "Conclusion" in filename and "quote" not in filename:
+        return "conclusion"
+    elif "QuizKey" in filename:
+        return "quizkey"
+    elif "SelfAssessment" in filename:
+        return "assessment"
+    elif "Affirmation" in filename or "affirmation" in filename:
+        return "affirmation"
+    elif "Acknowledgments" in filename:
+        return "acknowledgments"
+    elif "AbouttheAuthor" in filename:
+        return "author"
+    elif "bibliography" in filename:
+        return "bibliography"
+    elif "Journal" in filename or "journal" in filename:
+        return "journal"
+    elif "Doodle" in filename:
+        return "doodle"
+    elif "SMART" in filename:
+        return "worksheet"
+    elif "Collective" in filename:
+        return "collective"
+    elif "commitment" in filename:
+        return "commitment"
+    else:
+        return "generic"
+
+
+def document_cache(enabled: bool = True) -> DiskCache:
+    """Return the cache of document descriptions."""
+    return DiskCache("documents", max_bytes=8 * 1024 * 1024, enabled=enabled)
+
+
+def _text(el) -> str:
+    return " ".join("".join(el.itertext()).split())
+
+
+def describe(root, filename: str) -> dict:
+    """Describe a parsed XHTML document (see SpineDocument)."""
+    headings, images, classes, epub_types, stylesheets = [], [], set(), [], []
+    for el in root.iter():
+        if not isinstance(el.tag, str):
+            continue  # comments and processing instructions
+        name = etree.QName(el).localname
+        if name in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            headings.append([int(name[1]), _text(el), el.get("id")])
+        elif name == "img" and el.get("src"):
+            images.append(el.get("src"))
+        elif name == "image" and (el.get(XLINK_HREF) or el.get("href")):
+            images.append(el.get(XLINK_HREF) or el.get("href"))
+        elif name == "link" and "stylesheet" in (el.get("rel") or "").split():
+            stylesheets.append(el.get("href"))
+        classes.update((el.get("class") or "").split())
+        epub_types.extend((el.get(f"{{{EPUB_NS}}}type") or "").split())
+
+    file_type = next((EPUB_TYPES[t] for t in epub_types if t in EPUB_TYPES), None)
+    return {
+        "type": file_type or type_from_filename(filename),
+        "type_source": "epub:type" if file_type else "filename",
+        "epub_types": list(dict.fromkeys(epub_types)),
+        "headings": headings,
+        "images": list(dict.fromkeys(images)),
+        "stylesheets": stylesheets,
+        "classes": sorted(classes),
+    }
+
+
+class SpineDocument:
+    """A spine XHTML file, parsed once."""
+
+    def __init__(self, path: Path, data: bytes, description: dict):
+        self.path = Path(path)
+        self.digest = hash_parts(data)
+        self._data = data
+        self._root = None
+        self._lock = threading.Lock()
+        self.file_type = description["type"]
+        self.type_source = description["type_source"]
+        self.epub_types = description["epub_types"]
+        self.headings = [tuple(h) for h in description["headings"]]
+        self.images = description["images"]
+        self.stylesheets = description["stylesheets"]
+        self.classes = set(description["classes"])
+
+    @property
+    def root(self):
+        """The parsed document element (shared; do not modify)."""
+        with self._lock:
+            if self._root is None:
+                self._root = etree.fromstring(self._data, base_url=str(self.path))
+            return self._root
+
+    def body(self):
+        """Return a copy of the <body> element that the caller may rewrite."""
+        return copy.deepcopy(self.root.find(f"{{{XHTML_NS}}}body"))
+
+    @property
+    def fonts(self) -> list:
+        """Font files named by the linked stylesheets, resolved against the document."""
+        fonts = []
+        for href in self.stylesheets:
+            css_path = (self.path.parent / href).resolve()
+            try:
+                css = css_path.read_text()
+            except OSError:
+                continue
+            fonts += [(css_path.parent / url).resolve() for url in FONT_URL_RE.findall(css)]
+        return list(dict.fromkeys(fonts))
+
+
+# Documents parsed in this process, by path and content hash
+_documents = {}
+_documents_lock = threading.Lock()
+
+
+def load_document(path: Path, cache: DiskCache = None) -> SpineDocument:
+    """
+    Return the document model of an XHTML file.
+
+    Raises OSError if it cannot be read and etree.XMLSyntaxError if it is
+    not well-formed.
+    """
+    path = Path(path)
+    data = path.read_bytes()
+    memo_key = (path.resolve(), hash_parts(data))
+    with _documents_lock:
+        document = _documents.get(memo_key)
+    if document is not None:
+        return document
+
+    key = hash_parts("document", DOCUMENT_VERSION, path.name, data)
+    cached = cache.get_text(key) if cache is not None else None
+    if cached is not None:
+        document = SpineDocument(path, data, json.loads(cached))
+    else:
+        root = etree.fromstring(data, base_url=str(path))
+        description = describe(root, path.name)
+        if cache is not None:
+            cache.put_text(key, json.dumps(description))
+        document = SpineDocument(path, data, description)
+        document._root = root
+
+    with _documents_lock:
+        # Only the current version of a file is kept
+        for stale in [k for k in _documents if k[0] == memo_key[0]]:
+            del _documents[stale]
+        _documents[memo_key] = document
+    return document
@@ -0,0 +1,165 @@
+"""
+Deterministic EPUB packaging of the pub/ tree.
+
+The archive holds, in this order: mimetype (first and stored, as OCF
+requires), META-INF/, the package document named in container.xml, then
+every manifest item in manifest order. Files in the tree that the manifest
+does not list are left out; manifest items missing from the tree are
+skipped and reported.
+
+Every entry gets the same timestamp (SOURCE_DATE_EPOCH, or 1980-01-01) and
+permissions, so the same tree always gives the same bytes. The zip is
+written by hand rather than through zipfile so that compressed entries can
+be reused: each file's raw deflate stream is cached by the hash of its
+bytes, and after a one-file edit only that file is compressed again.
+Entries that do not shrink (PNG, JPEG, WOFF2) are stored. The archive is
+streamed to a temporary file and only replaces the output if it differs.
+"""
+
+import os
+import struct
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import unquote
+from xml.etree import ElementTree as ET
+
+from .artifacts import source_date_epoch
+from .cache import DiskCache, hash_parts
+from .files import _UMASK
+from .opf import read_manifest
+
+# Bump when the compression settings change
+EPUB_VERSION = "1"
+
+CONTAINER_NS = {"c": "urn:oasis:names:tc:opendocument:xmlns:container"}
+
+STORED, DEFLATED = 0, 8
+ZIP_VERSION = 20
+# Made by Unix, so external_attr carries the mode
+MADE_BY = (3 << 8) | ZIP_VERSION
+FILE_MODE = 0o100644
+UTF8_FLAG = 0x800
+
+
+def epub_cache(enabled: bool = True) -> DiskCache:
+    """Return the cache of compressed EPUB entries."""
+    return DiskCache("epub", max_bytes=256 * 1024 * 1024, enabled=enabled)
+
+
+def package_document(root: Path) -> str:
+    """Return the path (relative to root) of the package document in container.xml."""
+    container = ET.parse(Path(root) / "META-INF" / "container.xml").getroot()
+    rootfile = container.find(".//c:rootfiles/c:rootfile", CONTAINER_NS)
+    if rootfile is None or not rootfile.get("full-path"):
+        raise ValueError("META-INF/container.xml names no rootfile")
+    return rootfile.get("full-path")
+
+
+def package_entries(root: Path) -> tuple:
+    """
+    Return (archive names in archive order, missing manifest hrefs).
+    """
+    root = Path(root)
+    opf_name = package_document(root)
+    opf_dir = Path(opf_name).parent
+    names = ["mimetype"]
+    names += sorted(p.relative_to(root).as_posix()
+                    for p in (root / "META-INF").rglob("*") if p.is_file())
+    names.append(opf_name)
+    missing = []
+    for _, href, _ in read_manifest(root / opf_name):
+        name = (opf_dir / unquote(href.split("#")[0])).as_posix()
+        if (root / name).is_file():
+            names.append(name)
+        else:
+            missing.append(href)
+    return list(dict.fromkeys(names)), missing
+
+
+def _dos_timestamp(epoch: int) -> tuple:
+    """Return (dos time, dos date) for a Unix time, clamped to the zip epoch."""
+    t = time.gmtime(max(epoch, 315532800))  # 1980-01-01
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+def _compress(data: bytes, level: int, cache: DiskCache = None) -> tuple:
+    """Return (method, payload, compressed now) for one entry, reusing a cached deflate stream."""
+    key = hash_parts("deflate", EPUB_VERSION, str(level), data)
+    deflated = cache.get(key) if cache is not None else None
+    recompressed = deflated is None
+    if recompressed:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        deflated = compressor.compress(data) + compressor.flush()
+        if cache is not None:
+            cache.put(key, deflated)
+    if len(deflated) >= len(data):
+        return STORED, data, recompressed
+    return DEFLATED, deflated, recompressed
+
+
+def write_epub(root: Path, output: Path, level: int = 9, cache: DiskCache = None,
+               epoch: int = None) -> tuple:
+    """
+    Package the EPUB tree at root into output.
+
+    Returns (entry count, recompressed count, written, missing) where
+    written is False when output already held exactly these bytes and
+    missing lists the manifest hrefs not found in the tree.
+    """
+    root, output = Path(root), Path(output)
+    if epoch is None:
+        epoch = source_date_epoch()
+    dos_time, dos_date = _dos_timestamp(epoch)
+    if (root / "mimetype").read_bytes() != b"application/epub+zip":
+        raise ValueError(f"{root / 'mimetype'} must contain exactly 'application/epub+zip'")
+
+    names, missing = package_entries(root)
+    central, recompressed = [], 0
+    output.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=output.parent, prefix=f".{output.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for name in names:
+                data = (root / name).read_bytes()
+                if name == "mimetype":
+                    method, payload = STORED, data
+                else:
+                    method, payload, fresh = _compress(data, level, cache)
+                    recompressed += fresh
+                encoded = name.encode("utf-8")
+                flags = 0 if encoded.isascii() else UTF8_FLAG
+                fields = (ZIP_VERSION, flags, method, dos_time, dos_date,
+                          zlib.crc32(data), len(payload), len(data), len(encoded))
+                if f.tell() > 0xFFFFFFFF or len(data) > 0xFFFFFFFF:
+                    raise ValueError("EPUB too large for a zip without ZIP64")
+                central.append((fields, f.tell(), encoded))
+                f.write(struct.pack("<IHHHHHIIIHH", 0x04034B50, *fields, 0))
+                f.write(encoded)
+                f.write(payload)
+
+            directory_offset = f.tell()
+            for fields, offset, encoded in central:
+                f.write(struct.pack("<IH", 0x02014B50, MADE_BY))
+                f.write(struct.pack("<HHHHHIIIHHHHHII", *fields, 0, 0, 0, 0,
+                                    FILE_MODE << 16, offset))
+                f.write(encoded)
+            directory_size = f.tell() - directory_offset
+            f.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(central), len(central),
+                                directory_size, directory_offset, 0))
+
+        try:
+            unchanged = output.read_bytes() == Path(tmp).read_bytes()
+        except FileNotFoundError:
+            unchanged = False
+        if unchanged:
+            Path(tmp).unlink()
+        else:
+            os.chmod(tmp, 0o666 & ~_UMASK)
+            os.replace(tmp, output)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return len(names), recompressed, not unchanged, missing
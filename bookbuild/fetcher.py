@@ -0,0 +1,153 @@
+"""
+Caching url_fetcher for WeasyPrint.
+
+The combined POD document keeps the EPUB's relative URLs (../images/...,
+../fonts/...) and is rendered with a base URL inside pub/OEBPS/xhtml/, so
+every asset arrives here as a file: URL under the OEBPS root. Fetched bytes
+are kept in a size-bounded LRU, so fonts and images referenced many times
+(brushstroke.svg appears on every chapter opener) are read once, and files
+can be swapped for prepared variants (print-resolution images) without
+rewriting the document.
+
+Workers of a process pool can share one warm fetcher: prefetch() in the
+parent, then hand the fetcher to the pool initializer; forked workers start
+with the cache already filled.
+
+Fetchers here are functions of a URL returning WeasyPrint's resource dict.
+WeasyPrint changed its fetcher API: older releases take such a function
+(their default is weasyprint.default_url_fetcher), newer ones (the build
+runs with WeasyPrint 70) take a weasyprint.urls.URLFetcher whose fetch()
+returns a URLFetcherResponse. as_url_fetcher() wraps a fetcher for the
+installed release, so both are supported.
+"""
+
+import functools
+import mimetypes
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+mimetypes.add_type("font/woff2", ".woff2")
+mimetypes.add_type("image/svg+xml", ".svg")
+
+
+def default_fetch(url: str):
+    """Fetch url with WeasyPrint's own fetcher (a dict, or a response on newer releases)."""
+    try:
+        from weasyprint.urls import URLFetcher
+    except ImportError:  # releases without the URLFetcher class
+        from weasyprint import default_url_fetcher
+        return default_url_fetcher(url)
+    return URLFetcher().fetch(url)
+
+
+@functools.lru_cache(maxsize=None)
+def _adapter_class():
+    """Return a URLFetcher subclass that serves a fetcher function, or None on older releases."""
+    try:
+        from weasyprint.urls import URLFetcher, URLFetcherResponse
+    except ImportError:
+        return None
+
+    class FunctionFetcher(URLFetcher):
+        def __init__(self, fetch):
+            super().__init__()
+            self._fetch = fetch
+
+        def fetch(self, url, headers=None):
+            result = self._fetch(url)
+            if isinstance(result, URLFetcherResponse):
+                return result
+            content_type = result.get("mime_type")
+            return URLFetcherResponse(
+                result.get("redirected_url", url),
+                result.get("string", result.get("file_obj")),
+                {"Content-Type": content_type} if content_type else None,
+            )
+
+    return FunctionFetcher
+
+
+def as_url_fetcher(fetch):
+    """Return fetch (url -> resource dict) as a url_fetcher for the installed WeasyPrint."""
+    adapter = _adapter_class()
+    return fetch if adapter is None else adapter(fetch)
+
+
+class CachingFetcher:
+    """Fetcher serving file: URLs from an in-memory LRU (pass it through as_url_fetcher())."""
+
+    def __init__(self, root: Path, overrides: dict = None, max_bytes: int = 64 * 1024 * 1024):
+        self.root = Path(root).resolve()
+        # source path -> replacement path
+        self.overrides = {Path(k).resolve(): Path(v) for k, v in (overrides or {}).items()}
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __call__(self, url: str, *args, **kwargs) -> dict:
+        parsed = urlparse(url)
+        if parsed.scheme != "file":
+            return default_fetch(url)
+
+        path = Path(unquote(parsed.path))
+        return {
+            "string": self.read(path),
+            "mime_type": mimetypes.guess_type(path.name)[0],
+            "redirected_url": url,
+            "filename": path.name,
+        }
+
+    def source(self, path: Path) -> Path:
+        """Return the file that serves path: its override, or path itself."""
+        return self.overrides.get(Path(path).resolve(), Path(path))
+
+    def read(self, path: Path) -> bytes:
+        """Return the bytes for path (or its override), from the cache if possible."""
+        with self._lock:
+            data = self._entries.get(path)
+            if data is not None:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        data = self.source(path).read_bytes()
+        self._store(path, data)
+        return data
+
+    def _store(self, path: Path, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if path in self._entries:
+                return
+            self._entries[path] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def prefetch(self, *directories: Path) -> None:
+        """Load every file in the given directories (relative to root) into the cache."""
+        for directory in directories:
+            for path in sorted((self.root / directory).iterdir()):
+                if path.is_file():
+                    self._store(path, self.overrides.get(path, path).read_bytes())
+
+    def stats(self) -> str:
+        """Return a short hit/miss summary."""
+        return f"{self.hits} hits, {self.misses} misses"
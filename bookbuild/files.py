@@ -0,0 +1,40 @@
+"""
+File helpers for generated build outputs.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+# mkstemp creates files as 0600; generated files should get the usual umask
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_if_changed(path: Path, content) -> bool:
+    """
+    Write content (str or bytes) to path unless it already holds exactly that.
+
+    Unchanged files keep their mtime, so make/latexmk and the \\includeonly
+    logic in build_latex.py do not treat them as dirty. Returns True if the
+    file was written.
+    """
+    path = Path(path)
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return True
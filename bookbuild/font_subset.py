@@ -0,0 +1,238 @@
+"""
+Subset the book's web fonts to the characters the POD render can draw.
+
+fonts.css loads complete Libre Baskerville, Cinzel Decorative and Montserrat
+WOFF2 files; WeasyPrint decompresses every one of them (once per @font-face
+rule, aliases included) and hands the whole font to fontconfig and Pango.
+
+Every font file an @font-face rule loads is cut down with fontTools to the
+characters the document can put on the page: its text in every case (for
+text-transform), the strings and attr() values of content declarations,
+and a fixed set that generated text can need (ASCII for page numbers and
+hyphenation, typographic punctuation), limited to the face's
+unicode-range. Which face draws which text is left to WeasyPrint, so each
+file keeps every character any face could be asked for. All OpenType
+layout features are kept. The subsets are plain TTF, so WeasyPrint skips
+the WOFF2 decompression too.
+
+Subsets are cached by the font's content hash and its character set; the
+character analysis is cached by the hash of the stylesheets and the
+document.
+"""
+
+import json
+from pathlib import Path
+from urllib.parse import unquote, urljoin, urlparse
+
+from .cache import DiskCache, hash_file, hash_parts
+from .files import write_if_changed
+
+# Bump when the analysis or subsetting options change
+SUBSET_VERSION = "3"
+
+# Characters every subset keeps: generated content (page numbers, attr(),
+# hyphenation, list markers) and a margin for typographic punctuation
+BASELINE_CHARS = (
+    {chr(c) for c in range(0x20, 0x7F)}
+    | set(" ­‐‑–—‘’“”•…©®™·")
+)
+
+# Element text that is never drawn
+SKIPPED_ELEMENTS = {"head", "style", "script", "title", "meta", "link"}
+
+# Properties whose strings end up on the page
+GENERATED_PROPERTIES = {"content", "quotes"}
+GROUPING_AT_RULES = {"media", "supports"}
+
+
+def font_cache(enabled: bool = True) -> DiskCache:
+    """Return the cache of font subsets and character analyses."""
+    return DiskCache("fonts", max_bytes=64 * 1024 * 1024, enabled=enabled)
+
+
+def _unicode_ranges(tokens):
+    """Return the (first, last) code points of a unicode-range descriptor, or None for all."""
+    ranges = [(t.start, t.end) for t in tokens if t.type == "unicode-range"]
+    return ranges or None
+
+
+def _font_face(content, base_url: str):
+    """Return (local path, unicode ranges) for an @font-face with a file: source."""
+    import tinycss2
+
+    descriptors = {}
+    for decl in tinycss2.parse_blocks_contents(content, skip_comments=True, skip_whitespace=True):
+        if decl.type == "declaration":
+            descriptors[decl.lower_name] = decl.value
+    for token in descriptors.get("src", []):
+        url = token.value if token.type == "url" else None
+        if token.type == "function" and token.lower_name == "url":
+            url = next((t.value for t in token.arguments if t.type == "string"), None)
+        if url:
+            parsed = urlparse(urljoin(base_url, url))
+            if parsed.scheme == "file":
+                return Path(unquote(parsed.path)), _unicode_ranges(descriptors.get("unicode-range", []))
+    return None
+
+
+def _collect(rules, base_url: str, faces: dict, strings: list, attributes: set) -> None:
+    """
+    Walk rules for @font-face files and generated text.
+
+    Fills faces ({path: unicode ranges or None}), strings (content and
+    quotes strings) and attributes (names read by attr()).
+    """
+    import tinycss2
+
+    def values(tokens):
+        for token in tokens:
+            if token.type == "string":
+                strings.append(token.value)
+            elif token.type == "function" and token.lower_name == "attr":
+                attributes.update(t.value for t in token.arguments if t.type == "ident")
+            elif token.type == "function":
+                values(token.arguments)
+
+    def block(content):
+        for item in tinycss2.parse_blocks_contents(content, skip_comments=True, skip_whitespace=True):
+            if item.type == "declaration" and item.lower_name in GENERATED_PROPERTIES:
+                values(item.value)
+            elif item.type == "at-rule" and item.content is not None:
+                block(item.content)  # @page margin boxes
+
+    for rule in rules:
+        if rule.type == "qualified-rule":
+            block(rule.content)
+        elif rule.type != "at-rule" or rule.content is None:
+            continue
+        elif rule.lower_at_keyword == "font-face":
+            face = _font_face(rule.content, base_url)
+            if face:
+                path, ranges = face
+                # A file loaded by several rules keeps the characters of all of them
+                if path in faces:
+                    ranges = None if faces[path] is None or ranges is None else faces[path] + ranges
+                faces[path] = ranges
+        elif rule.lower_at_keyword == "page":
+            block(rule.content)
+        elif rule.lower_at_keyword in GROUPING_AT_RULES:
+            _collect(tinycss2.parse_rule_list(rule.content, skip_comments=True, skip_whitespace=True),
+                     base_url, faces, strings, attributes)
+
+
+def _document_text(document_html: str, attributes: set) -> str:
+    """Return the drawn text of the document and the values of attributes."""
+    import tinyhtml5
+
+    parts = []
+
+    def walk(element):
+        if element.tag.rpartition("}")[2] in SKIPPED_ELEMENTS:
+            return
+        parts.append(element.text or "")
+        parts.extend(element.get(name, "") for name in attributes)
+        for child in element:
+            if isinstance(child.tag, str):  # not a comment
+                walk(child)
+            parts.append(child.tail or "")
+
+    walk(tinyhtml5.parse(document_html))
+    return "".join(parts)
+
+
+def used_characters(stylesheets: list, document_html: str, base_url: str) -> dict:
+    """
+    Return {font file path: set of characters} for every font the stylesheets load.
+
+    stylesheets are CSS strings in cascade order; base_url resolves their
+    @font-face URLs (the combined document's base).
+    """
+    import tinycss2
+
+    faces, strings, attributes = {}, [], set()
+    for css in stylesheets:
+        _collect(tinycss2.parse_stylesheet(css, skip_comments=True, skip_whitespace=True),
+                 base_url, faces, strings, attributes)
+
+    characters = set(_document_text(document_html, attributes)) | set("".join(strings))
+    # text-transform can draw any case of a character
+    for char in list(characters):
+        characters.update(char.upper() + char.lower() + char.title())
+    characters |= BASELINE_CHARS
+
+    used = {}
+    for path, ranges in faces.items():
+        if ranges is None:
+            used[path] = set(characters)
+        else:
+            used[path] = {c for c in characters
+                          if any(first <= ord(c) <= last for first, last in ranges)}
+    return used
+
+
+def subset_font(path: Path, characters: set, cache: DiskCache = None) -> bytes:
+    """Return a TTF subset of the font at path, from the cache when possible."""
+    text = "".join(sorted(characters))
+    key = hash_parts("subset", SUBSET_VERSION, hash_file(path), text)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    import io
+
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+
+    options = subset.Options()
+    options.layout_features = ["*"]
+    options.name_IDs = ["*"]
+    options.name_languages = ["*"]
+    options.notdef_outline = True
+    options.glyph_names = True
+    # FontForge's timestamp and the webfont generator's tag
+    options.drop_tables += ["FFTM", "webf"]
+    # Keep head.modified, so the same characters always give the same bytes
+    font = TTFont(path, recalcTimestamp=False)
+    font.flavor = None
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=text)
+    subsetter.subset(font)
+    out = io.BytesIO()
+    font.save(out)
+    data = out.getvalue()
+
+    if cache is not None:
+        cache.put(key, data)
+    return data
+
+
+def subset_fonts(stylesheets: list, document_html: str, base_url: str, out_dir: Path,
+                 cache: DiskCache = None) -> dict:
+    """
+    Write a subset of every font the document uses into out_dir.
+
+    Returns {original font path: subset path}; fonts that fontTools cannot
+    read are left out, so the original is used.
+    """
+    key = hash_parts("chars", SUBSET_VERSION, base_url, document_html, *stylesheets)
+    cached = cache.get_text(key) if cache is not None else None
+    if cached is not None:
+        used = {Path(p): set(chars) for p, chars in json.loads(cached).items()}
+    else:
+        used = used_characters(stylesheets, document_html, base_url)
+        if cache is not None:
+            cache.put_text(key, json.dumps({str(p): "".join(sorted(c)) for p, c in used.items()}))
+
+    out_dir = Path(out_dir)
+    subsets = {}
+    for path, characters in sorted(used.items()):
+        try:
+            data = subset_font(path, characters, cache)
+        except Exception as e:  # fontTools raises many types for bad fonts
+            print(f"  Warning: could not subset {path.name}: {e}")
+            continue
+        target = out_dir / (path.stem + ".ttf")
+        write_if_changed(target, data)
+        subsets[path] = target
+    return subsets
@@ -0,0 +1,139 @@
+"""
+Print-resolution image variants for the 6x9 PDF pipelines.
+
+Each raster image is resampled so that, at the largest size the layout can
+place it on the page, it has the target effective DPI: 300 for print, less
+for proofs. Images already at or below the target are passed through
+byte-for-byte, so print output never loses quality to a re-encode.
+
+Results are cached by source content hash and settings, and written into a
+variant directory that the LaTeX files or combined HTML point at.
+"""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from pathlib import Path
+
+from .cache import DiskCache, hash_file, hash_parts
+from .files import write_if_changed
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+PRINT_DPI = 300
+# Must stay >= 96 so resampled images are never smaller than their CSS
+# (96 px/in) natural size within the text block; LaTeX reads the DPI
+# written into each variant
+PROOF_DPI = 150
+
+RASTER_SUFFIXES = {".jpeg", ".jpg", ".png"}
+
+# Text block of the 6x9 layout (TRIMS["6x9"]): 0.95in gutter + 0.70in
+# outside margin, 0.75in top and bottom
+TEXT_WIDTH_IN = 4.35
+TEXT_HEIGHT_IN = 7.5
+
+# Largest placed size (width, height) in inches, first match wins;
+# print.css caps .quote-figure images at 7in high
+PLACEMENTS = [
+    ("*-quote.*", (TEXT_WIDTH_IN, 7.0)),
+    ("*", (TEXT_WIDTH_IN, TEXT_HEIGHT_IN)),
+]
+
+JPEG_QUALITY = 90
+# Bump when the resampling or encoding settings change
+VARIANT_VERSION = "3"
+
+
+def image_cache(enabled: bool = True) -> DiskCache:
+    """Return the shared cache for resampled images."""
+    return DiskCache("images", max_bytes=256 * 1024 * 1024, enabled=enabled)
+
+
+def placed_size(name: str, scale: float = 1.0) -> tuple:
+    """
+    Return the largest (width, height) in inches an image can take on the page.
+
+    scale enlarges the 6x9 placements for trims with a bigger text block.
+    """
+    width, height = next(box for pattern, box in PLACEMENTS if fnmatch(name, pattern))
+    return width * scale, height * scale
+
+
+def variant_dir_name(dpi: int, scale: float = 1.0) -> str:
+    """Directory name for the variants at dpi and placement scale."""
+    return f"{dpi}dpi" if scale == 1 else f"x{scale:.2f}-{dpi}dpi"
+
+
+def target_size(size: tuple, box: tuple, dpi: int) -> tuple:
+    """Pixel size that gives dpi at the placed size; never upscales."""
+    width, height = size
+    scale = min(box[0] * dpi / width, box[1] * dpi / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _resample(src: Path, dpi: int, scale: float = 1.0) -> bytes:
+    """Return src resampled for dpi, or its original bytes if already small enough."""
+    data = src.read_bytes()
+    with Image.open(io.BytesIO(data)) as im:
+        icc_profile = im.info.get("icc_profile")
+        fmt = im.format
+        # Size the image as it is displayed, i.e. after EXIF rotation
+        im = ImageOps.exif_transpose(im)
+        size = target_size(im.size, placed_size(src.name, scale), dpi)
+        if size == im.size:
+            return data
+
+        im = im.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+        out = io.BytesIO()
+        if fmt == "JPEG":
+            im.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, icc_profile=icc_profile,
+                    dpi=(dpi, dpi))
+        else:
+            im.save(out, fmt, optimize=True, icc_profile=icc_profile, dpi=(dpi, dpi))
+        return out.getvalue()
+
+
+def optimize_image(src: Path, dpi: int, cache: DiskCache = None, scale: float = 1.0) -> bytes:
+    """Return the print variant of src, using the cache when possible."""
+    key = hash_parts("image", VARIANT_VERSION, hash_file(src), src.name, str(dpi), str(JPEG_QUALITY))
+    if scale != 1:
+        key = hash_parts(key, f"{scale:.2f}")
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    data = _resample(src, dpi, round(scale, 2))
+    if cache is not None:
+        cache.put(key, data)
+    return data
+
+
+def optimize_images(sources: list, out_dir: Path, dpi: int, jobs: int = None,
+                    cache: DiskCache = None, scale: float = 1.0) -> dict:
+    """
+    Write print variants of the raster images in sources into out_dir.
+
+    Images are processed in parallel. Returns {name: variant path}; without
+    Pillow nothing is written and the dict is empty, so callers keep using
+    the original files.
+    """
+    sources = [Path(p) for p in sources if Path(p).suffix.lower() in RASTER_SUFFIXES]
+    if Image is None:
+        print("   Warning: Pillow is not installed, using full-resolution images")
+        return {}
+
+    out_dir = Path(out_dir)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        variants = list(pool.map(lambda src: optimize_image(src, dpi, cache, scale), sources))
+
+    paths = {}
+    for src, data in zip(sources, variants):
+        write_if_changed(out_dir / src.name, data)
+        paths[src.name] = out_dir / src.name
+    return paths
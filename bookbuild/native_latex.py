@@ -0,0 +1,360 @@
+"""
+In-process XHTML -> LaTeX conversion built on lxml.
+
+Maps the book's XHTML vocabulary straight to LaTeX without starting a pandoc
+process. Headings, lists, links and images follow pandoc's mapping for the
+same markup (h1 -> \\section, h2 -> \\subsection, ...) so the output drops
+into the same master document; class-tagged boxes use the environments from
+create_preamble() in pdf/build_latex.py.
+
+Elements it does not know (tables, definition lists, ...) are handed to
+pandoc one fragment at a time, so only files containing them pay for a
+pandoc process, and the pandoc cache makes repeat runs free.
+"""
+
+import re
+from pathlib import Path
+from lxml import etree
+
+from .cache import DiskCache
+from .document import document_cache, load_document
+from .pandoc import run_pandoc, run_pandoc_fragment
+
+XHTML_NS = "http://www.w3.org/1999/xhtml"
+
+# Same sectioning levels pandoc uses for HTML headings
+HEADINGS = {
+    "h1": "section",
+    "h2": "subsection",
+    "h3": "subsubsection",
+    "h4": "paragraph",
+    "h5": "subparagraph",
+    "h6": "subparagraph",
+}
+
+# Box classes -> environments defined in create_preamble()
+BOX_ENVIRONMENTS = {
+    "action-steps": "actionsteps",
+    "case-study": "casestudy",
+    "quote-box": "reflection",
+}
+
+# Environments that print their own title, so the box's first heading is dropped
+TITLED_ENVIRONMENTS = {"actionsteps", "casestudy"}
+
+# Page break markers used by print.css
+PAGE_BREAK_CLASSES = {"page-break", "page-break-after"}
+PAGE_BREAK_BEFORE_CLASSES = {"page-break-before"}
+
+CONTAINER_TAGS = {"body", "main", "section", "article", "div", "header", "footer", "aside", "nav"}
+INLINE_TAGS = {"strong", "b", "em", "i", "cite", "a", "sup", "sub", "span", "code",
+               "label", "small", "abbr", "q", "u", "br", "img", "input"}
+SKIP_TAGS = {"head", "title", "meta", "link", "script", "style", "input"}
+
+INLINE_COMMANDS = {
+    "strong": "textbf",
+    "b": "textbf",
+    "em": "emph",
+    "i": "emph",
+    "cite": "emph",
+    "sup": "textsuperscript",
+    "sub": "textsubscript",
+    "code": "texttt",
+    "u": "underline",
+}
+
+LIST_LABELS = {"A": r"\Alph*.", "a": r"\alph*.", "I": r"\Roman*.", "i": r"\roman*."}
+
+IMAGE_OPTIONS = r"width=\linewidth,height=0.8\textheight,keepaspectratio"
+IMAGE_CLASS_OPTIONS = {
+    "chapter-number-brush": "width=1.5in",
+}
+
+_ESCAPES = {
+    "\\": r"\textbackslash{}",
+    "{": r"\{",
+    "}": r"\}",
+    "$": r"\$",
+    "&": r"\&",
+    "#": r"\#",
+    "^": r"\^{}",
+    "_": r"\_",
+    "%": r"\%",
+    "~": r"\textasciitilde{}",
+    "[": "{[}",
+    "]": "{]}",
+}
+_ESCAPE_RE = re.compile("[" + re.escape("".join(_ESCAPES)) + "]")
+_LINE_BREAK = "\\\\\n"
+
+
+def escape_latex(text: str) -> str:
+    """Escape LaTeX special characters in plain text."""
+    text = _ESCAPE_RE.sub(lambda m: _ESCAPES[m.group()], text)
+    # Keep "--" from turning into a dash under TeX ligatures, as pandoc does
+    return re.sub(r"-(?=-)", r"-\\/", text)
+
+
+def escape_url(url: str) -> str:
+    """Escape characters that are special inside \\href{}."""
+    return url.replace("\\", "/").replace("%", r"\%").replace("#", r"\#")
+
+
+def _text(text) -> str:
+    """Collapse HTML whitespace and escape a text node."""
+    if not text:
+        return ""
+    return escape_latex(re.sub(r"\s+", " ", text))
+
+
+def _tag(el) -> str:
+    return etree.QName(el).localname
+
+
+def _classes(el) -> set:
+    return set((el.get("class") or "").split())
+
+
+class LatexConverter:
+    """Converts one parsed XHTML document to LaTeX."""
+
+    def __init__(self, cache: DiskCache = None):
+        self.cache = cache
+        self.fallbacks = []
+        self._box_depth = 0
+
+    def convert(self, root) -> str:
+        """Convert an XHTML tree to LaTeX body text."""
+        body = root.find(f"{{{XHTML_NS}}}body")
+        if body is None:
+            body = root.find("body")
+        if body is None:
+            body = root
+        blocks = self._blocks(body)
+        return "\n\n".join(blocks) + "\n" if blocks else ""
+
+    # ------------------------------------------------------------------
+    # Block level
+    # ------------------------------------------------------------------
+
+    def _blocks(self, el, skip=None) -> list:
+        """Render the children of a block container as a list of LaTeX blocks."""
+        blocks = []
+        inline = [_text(el.text)]
+
+        def flush():
+            paragraph = self._paragraph("".join(inline))
+            if paragraph:
+                blocks.append(paragraph)
+            inline.clear()
+
+        for child in el:
+            if isinstance(child.tag, str) and child is not skip:
+                if _tag(child) in INLINE_TAGS:
+                    inline.append(self._inline_element(child))
+                else:
+                    flush()
+                    blocks.extend(self._block(child))
+            inline.append(_text(child.tail))
+
+        flush()
+        return blocks
+
+    def _block(self, el) -> list:
+        """Render one block-level element."""
+        tag = _tag(el)
+        classes = _classes(el)
+
+        if tag in SKIP_TAGS:
+            return []
+        if tag == "p":
+            paragraph = self._paragraph(self._anchor(el) + self._inline(el))
+            return [paragraph] if paragraph else []
+        if tag in HEADINGS:
+            return self._heading(el, tag)
+        if tag in ("ul", "ol"):
+            return self._list(el, ordered=(tag == "ol"))
+        if tag == "blockquote":
+            return [self._environment("quote", self._blocks(el))]
+        if tag == "figure":
+            return self._figure(el)
+        if tag == "img":
+            return [self._centered(self._image(el))]
+        if tag == "hr":
+            return [r"\begin{center}\rule{0.5\linewidth}{0.5pt}\end{center}"]
+        if tag == "textarea":
+            return [r"\writinglines{8}"]
+        if tag in CONTAINER_TAGS:
+            blocks = []
+            if classes & PAGE_BREAK_BEFORE_CLASSES:
+                blocks.append(r"\clearpage")
+            env = next((BOX_ENVIRONMENTS[c] for c in el.get("class", "").split()
+                        if c in BOX_ENVIRONMENTS), None)
+            if env:
+                blocks.append(self._box(el, env))
+            else:
+                inner = self._blocks(el)
+                anchor = self._anchor(el)
+                if anchor and inner:
+                    inner[0] = anchor + inner[0]
+                blocks.extend(inner)
+            if classes & PAGE_BREAK_CLASSES:
+                blocks.append(r"\clearpage")
+            return blocks
+
+        return [self._fallback(el)]
+
+    def _paragraph(self, text: str):
+        """Normalize whitespace in rendered inline text; None if empty."""
+        lines = [re.sub(r" {2,}", " ", line).strip() for line in text.split("\n")]
+        text = "\n".join(line for line in lines if line)
+        # A line break with no line before or after it is an error in LaTeX
+        while text.startswith("\\\\"):
+            text = text[2:].lstrip()
+        while text.endswith("\\\\"):
+            text = text[:-2].rstrip()
+        return text or None
+
+    def _heading(self, el, tag: str) -> list:
+        title = self._paragraph(self._inline(el))
+        if not title:
+            return []
+        title = title.replace(_LINE_BREAK, " ").replace("\n", " ")
+        if self._box_depth:
+            # Sectioning commands cannot appear inside tcolorbox/quote boxes
+            return [f"{self._anchor(el)}\\textbf{{{title}}}"]
+        label = f"\\label{{{el.get('id')}}}" if el.get("id") else ""
+        return [f"\\{HEADINGS[tag]}{{{title}}}{label}"]
+
+    def _list(self, el, ordered: bool) -> list:
+        options = []
+        if ordered:
+            if el.get("type") in LIST_LABELS:
+                options.append(f"label={LIST_LABELS[el.get('type')]}")
+            if (el.get("start") or "").isdigit():
+                options.append(f"start={el.get('start')}")
+
+        items = []
+        for li in el:
+            if not isinstance(li.tag, str) or _tag(li) != "li":
+                continue
+            body = "\n\n".join(self._blocks(li))
+            items.append(f"\\item {self._anchor(li)}{body}".rstrip())
+
+        if not items:
+            return []
+        env = "enumerate" if ordered else "itemize"
+        opts = f"[{','.join(options)}]" if options else ""
+        return [f"\\begin{{{env}}}{opts}\n" + "\n".join(items) + f"\n\\end{{{env}}}"]
+
+    def _figure(self, el) -> list:
+        images = []
+        caption = None
+        for child in el:
+            if not isinstance(child.tag, str):
+                continue
+            tag = _tag(child)
+            if tag == "img":
+                images.append(self._image(child))
+            elif tag == "figcaption":
+                caption = self._paragraph(self._inline(child))
+            else:
+                # Anything richer than image + caption is treated as a container
+                return self._blocks(el)
+
+        if not images:
+            return []
+        if self._box_depth:
+            # Floats are not allowed inside boxes
+            return [self._centered("\n".join(images))]
+        lines = [r"\begin{figure}[H]", r"\centering", *images]
+        if caption is not None:
+            lines.append(f"\\caption{{{caption}}}")
+        lines.append(r"\end{figure}")
+        return ["\n".join(lines)]
+
+    def _box(self, el, env: str) -> str:
+        skip = None
+        if env in TITLED_ENVIRONMENTS:
+            first = next((c for c in el if isinstance(c.tag, str)), None)
+            if first is not None and _tag(first) in HEADINGS:
+                skip = first
+        self._box_depth += 1
+        try:
+            blocks = self._blocks(el, skip=skip)
+        finally:
+            self._box_depth -= 1
+        return self._anchor(el) + self._environment(env, blocks)
+
+    def _environment(self, env: str, blocks: list) -> str:
+        return f"\\begin{{{env}}}\n" + "\n\n".join(blocks) + f"\n\\end{{{env}}}"
+
+    def _centered(self, content: str) -> str:
+        return f"\\begin{{center}}\n{content}\n\\end{{center}}"
+
+    def _fallback(self, el) -> str:
+        """Convert an element this engine does not handle with pandoc."""
+        self.fallbacks.append(_tag(el))
+        html = etree.tostring(el, encoding="unicode", with_tail=False)
+        return run_pandoc_fragment(html, self.cache).strip("\n")
+
+    # ------------------------------------------------------------------
+    # Inline level
+    # ------------------------------------------------------------------
+
+    def _inline(self, el) -> str:
+        """Render the content of el (not its tail) as inline LaTeX."""
+        parts = [_text(el.text)]
+        for child in el:
+            if isinstance(child.tag, str):
+                parts.append(self._inline_element(child))
+            parts.append(_text(child.tail))
+        return "".join(parts)
+
+    def _inline_element(self, el) -> str:
+        tag = _tag(el)
+        if tag in SKIP_TAGS:
+            return ""
+        if tag == "br":
+            return _LINE_BREAK
+        if tag == "img":
+            return self._image(el)
+
+        content = self._inline(el)
+        if tag in INLINE_COMMANDS:
+            content = f"\\{INLINE_COMMANDS[tag]}{{{content}}}"
+        elif tag == "a":
+            content = self._link(el, content)
+        return self._anchor(el) + content
+
+    def _link(self, el, content: str) -> str:
+        href = el.get("href") or ""
+        if href.startswith(("http:", "https:", "mailto:")):
+            return f"\\href{{{escape_url(href)}}}{{{content}}}"
+        # In-page and cross-file links both resolve to labels in the master
+        fragment = href.partition("#")[2]
+        if fragment:
+            return f"\\hyperref[{fragment}]{{{content}}}"
+        return content
+
+    def _image(self, el) -> str:
+        options = IMAGE_OPTIONS
+        for c in _classes(el):
+            options = IMAGE_CLASS_OPTIONS.get(c, options)
+        return f"\\includegraphics[{options}]{{{el.get('src', '')}}}"
+
+    def _anchor(self, el) -> str:
+        """Return a hyperref target for el's id, if it has one."""
+        if not el.get("id"):
+            return ""
+        return f"\\protect\\phantomsection\\label{{{el.get('id')}}}"
+
+
+def convert_xhtml(xhtml_path: Path, cache: DiskCache = None) -> str:
+    """Convert a single XHTML file to LaTeX in-process."""
+    try:
+        root = load_document(xhtml_path, document_cache()).root
+    except etree.XMLSyntaxError as e:
+        print(f"Warning: cannot parse {xhtml_path.name} ({e}), using pandoc")
+        return run_pandoc(xhtml_path, cache)
+    return LatexConverter(cache).convert(root)
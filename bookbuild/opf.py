@@ -0,0 +1,42 @@
+"""
+Reading the EPUB package document (content.opf).
+
+The manifest and spine are parsed in one place, so the POD PDF, the asset
+transcoding and the EPUB packager all see the same file list.
+"""
+
+from pathlib import Path
+from xml.etree import ElementTree as ET
+
+NAMESPACES = {
+    "opf": "http://www.idpf.org/2007/opf",
+    "dc": "http://purl.org/dc/elements/1.1/",
+}
+
+
+def read_manifest(opf_path: Path) -> list:
+    """
+    Return (id, href, media type) for each manifest item, in document order.
+
+    hrefs are relative to the directory holding content.opf.
+    """
+    root = ET.parse(opf_path).getroot()
+    items = []
+    for item in root.findall(".//opf:manifest/opf:item", NAMESPACES):
+        item_id = item.get("id")
+        href = item.get("href")
+        if item_id and href:
+            items.append((item_id, href, item.get("media-type")))
+    return items
+
+
+def get_spine_order(opf_path: Path) -> list:
+    """Extract the reading order (manifest hrefs) from the content.opf spine."""
+    manifest = {item_id: href for item_id, href, _ in read_manifest(opf_path)}
+    root = ET.parse(opf_path).getroot()
+    spine_items = []
+    for itemref in root.findall(".//opf:spine/opf:itemref", NAMESPACES):
+        idref = itemref.get("idref")
+        if idref and idref in manifest:
+            spine_items.append(manifest[idref])
+    return spine_items
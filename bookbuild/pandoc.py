@@ -0,0 +1,146 @@
+"""
+Pandoc XHTML -> LaTeX conversion shared by the pdf/ scripts.
+
+Output is cached by XHTML content hash, pandoc version and arguments, so
+unchanged files never start a pandoc process.
+
+Two backends produce byte-identical output:
+
+- subprocess: one `pandoc` process per file (works with any pandoc).
+- batch: many files through one `pandoc lua` process, which pays pandoc's
+  startup cost once per batch instead of once per file (pandoc >= 3.0).
+"""
+
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+
+from .cache import DiskCache, hash_parts
+
+PANDOC_FROM = "html"
+PANDOC_TO = "latex"
+PANDOC_WRAP = "preserve"
+PANDOC_ARGS = ["-f", PANDOC_FROM, "-t", PANDOC_TO, f"--wrap={PANDOC_WRAP}"]
+
+BACKENDS = ["subprocess", "batch"]
+BATCH_SCRIPT = Path(__file__).parent / "pandoc_batch.lua"
+
+
+@lru_cache(maxsize=None)
+def pandoc_version() -> str:
+    """Return the first line of `pandoc --version`."""
+    result = subprocess.run(["pandoc", "--version"], capture_output=True, text=True, check=True)
+    return result.stdout.splitlines()[0]
+
+
+def pandoc_cache(enabled: bool = True) -> DiskCache:
+    """Return the on-disk cache for pandoc output."""
+    return DiskCache("pandoc", max_bytes=64 * 1024 * 1024, enabled=enabled)
+
+
+def _cache_key(xhtml_path: Path, cache: DiskCache):
+    """Return the cache key for xhtml_path, or None if caching is off."""
+    if cache is None or not cache.enabled:
+        return None
+    return hash_parts(xhtml_path.read_bytes(), pandoc_version(), *PANDOC_ARGS)
+
+
+def run_pandoc(xhtml_path: Path, cache: DiskCache = None) -> str:
+    """Convert a single XHTML file to LaTeX using pandoc."""
+    key = _cache_key(xhtml_path, cache)
+    if key is not None:
+        cached = cache.get_text(key)
+        if cached is not None:
+            return cached
+
+    result = subprocess.run(
+        ["pandoc", str(xhtml_path), *PANDOC_ARGS],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        print(f"Warning: pandoc error for {xhtml_path.name}: {result.stderr}")
+    elif key is not None:
+        # Only successful conversions are cached so errors are retried
+        cache.put_text(key, result.stdout)
+    return result.stdout
+
+
+def run_pandoc_fragment(html: str, cache: DiskCache = None) -> str:
+    """Convert an HTML fragment (rather than a file) to LaTeX using pandoc."""
+    key = None
+    if cache is not None and cache.enabled:
+        key = hash_parts(html, pandoc_version(), *PANDOC_ARGS)
+        cached = cache.get_text(key)
+        if cached is not None:
+            return cached
+
+    result = subprocess.run(
+        ["pandoc", *PANDOC_ARGS],
+        input=html,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        print(f"Warning: pandoc error for fragment: {result.stderr}")
+    elif key is not None:
+        cache.put_text(key, result.stdout)
+    return result.stdout
+
+
+def _parse_frames(data: bytes) -> list:
+    """Split pandoc_batch.lua output into (status, payload) tuples."""
+    frames = []
+    pos = 0
+    while pos < len(data):
+        newline = data.index(b"\n", pos)
+        status, length = data[pos:newline].split(b" ")
+        end = newline + 1 + int(length)
+        frames.append((status.decode("ascii"), data[newline + 1:end].decode("utf-8")))
+        pos = end
+    return frames
+
+
+def run_pandoc_batch(xhtml_paths: list, cache: DiskCache = None) -> dict:
+    """
+    Convert several XHTML files to LaTeX in one pandoc process.
+
+    Returns a dict mapping each path to its LaTeX. Cached files are not sent
+    to pandoc. A file pandoc fails on gets a warning and empty output, like
+    run_pandoc(); a failure of the pandoc process itself raises RuntimeError.
+    """
+    results = {}
+    pending = {}
+    for xhtml_path in xhtml_paths:
+        key = _cache_key(xhtml_path, cache)
+        cached = cache.get_text(key) if key is not None else None
+        if cached is not None:
+            results[xhtml_path] = cached
+        else:
+            pending[xhtml_path] = key
+
+    if not pending:
+        return results
+
+    result = subprocess.run(
+        ["pandoc", "lua", str(BATCH_SCRIPT), PANDOC_FROM, PANDOC_TO, PANDOC_WRAP,
+         *[str(path) for path in pending]],
+        capture_output=True
+    )
+    frames = _parse_frames(result.stdout) if result.returncode == 0 else []
+    if len(frames) != len(pending):
+        raise RuntimeError(
+            f"pandoc lua batch failed ({result.returncode}): "
+            f"{result.stderr.decode('utf-8', 'replace').strip()}"
+        )
+
+    for (xhtml_path, key), (status, payload) in zip(pending.items(), frames):
+        if status != "ok":
+            print(f"Warning: pandoc error for {xhtml_path.name}: {payload}")
+            results[xhtml_path] = ""
+            continue
+        if key is not None:
+            cache.put_text(key, payload)
+        results[xhtml_path] = payload
+
+    return results
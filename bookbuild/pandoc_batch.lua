@@ -0,0 +1,26 @@
+-- Convert many files in a single pandoc process.
+--
+-- Usage: pandoc lua pandoc_batch.lua FROM TO WRAP FILE...
+--
+-- Each file is read and written independently, exactly as a separate
+-- `pandoc FILE -f FROM -t TO --wrap=WRAP` run would. Results are written to
+-- stdout in input order, each framed as "<ok|error> <byte length>\n<payload>".
+
+local from, to, wrap = arg[1], arg[2], arg[3]
+
+for i = 4, #arg do
+  local ok, result = pcall(function()
+    local f = assert(io.open(arg[i], "rb"))
+    local text = f:read("a")
+    f:close()
+    local doc = pandoc.read(text, from)
+    local out = pandoc.write(doc, to, {wrap_text = "wrap-" .. wrap})
+    -- The pandoc CLI terminates non-standalone output with a newline
+    if out:sub(-1) ~= "\n" then
+      out = out .. "\n"
+    end
+    return out
+  end)
+  result = tostring(result)
+  io.write(ok and "ok" or "error", " ", #result, "\n", result)
+end
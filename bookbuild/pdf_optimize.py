@@ -0,0 +1,156 @@
+"""
+Lossless post-processing of finished PDFs with pikepdf (qpdf).
+
+optimize_pdf() merges streams that are byte-for-byte identical (images,
+forms and embedded font files, compared together with the streams they
+reference, such as soft masks), so artwork embedded once per use (the
+brushstroke, the quote images) is stored once. qpdf writes only objects
+still reachable from the document, which drops the duplicates and anything
+else unused. The file is saved with and without regenerated object streams
+and the smaller result kept; without linearization the output is never
+larger than the input. Linearization (fast web view) is optional, for the
+website downloads; it only uses regenerated object streams, because qpdf
+linearizes preserved ones into a file whose catalog has lost its page tree.
+Every candidate is reopened and its page count checked before it is used.
+
+qpdf's removeUnreferencedResources() is not used: it gives pages that
+share a resource dictionary (as WeasyPrint's do) their own copies, which
+makes the file larger.
+"""
+
+import hashlib
+import io
+
+# Font file streams hang off /FontDescriptor dictionaries under these keys
+FONT_FILE_KEYS = ("/FontFile", "/FontFile2", "/FontFile3")
+XOBJECT_SUBTYPES = ("/Image", "/Form")
+
+
+def _candidate_streams(pdf) -> list:
+    """Return the image, form and font file streams of pdf."""
+    import pikepdf
+
+    streams, font_files = [], set()
+    for obj in pdf.objects:
+        if isinstance(obj, pikepdf.Dictionary) and obj.get("/Type") == "/FontDescriptor":
+            for key in FONT_FILE_KEYS:
+                if key in obj and obj[key].is_indirect:
+                    font_files.add(obj[key].objgen)
+    for obj in pdf.objects:
+        if isinstance(obj, pikepdf.Stream) and (
+                obj.get("/Subtype") in XOBJECT_SUBTYPES or obj.objgen in font_files):
+            streams.append(obj)
+    return streams
+
+
+def _describe(value, remap: dict) -> str:
+    """Serialize a direct value, naming indirect objects by their canonical object."""
+    import pikepdf
+
+    if isinstance(value, pikepdf.Object) and value.is_indirect:
+        return "ref%d,%d" % remap.get(value.objgen, value.objgen)
+    if isinstance(value, pikepdf.Array):
+        return "[" + " ".join(_describe(v, remap) for v in value) + "]"
+    if isinstance(value, (pikepdf.Dictionary, pikepdf.Stream)):
+        items = sorted((str(k), _describe(v, remap)) for k, v in value.items() if k != "/Length")
+        return "<<" + " ".join(f"{k} {v}" for k, v in items) + ">>"
+    return repr(value)
+
+
+def _stream_key(stream, remap: dict) -> str:
+    digest = hashlib.sha256(stream.read_raw_bytes()).hexdigest()
+    return digest + _describe(stream.stream_dict, remap)
+
+
+def _relink(container, remap: dict, pdf) -> int:
+    """Point references in container (and its direct children) at canonical objects."""
+    import pikepdf
+
+    replaced = 0
+    if isinstance(container, pikepdf.Array):
+        items = list(enumerate(container))
+    elif isinstance(container, (pikepdf.Dictionary, pikepdf.Stream)):
+        items = list(container.items())
+    else:
+        return 0
+    for key, value in items:
+        if isinstance(value, pikepdf.Object) and value.is_indirect:
+            if value.objgen in remap:
+                container[key] = pdf.get_object(remap[value.objgen])
+                replaced += 1
+        elif isinstance(value, (pikepdf.Array, pikepdf.Dictionary)):
+            replaced += _relink(value, remap, pdf)
+    return replaced
+
+
+def deduplicate_streams(pdf) -> int:
+    """Merge identical image, form and font file streams; returns how many were merged."""
+    streams = _candidate_streams(pdf)
+    remap = {}
+    # Repeat so that streams referencing merged streams (images with the
+    # same soft mask) are recognized as identical on the next round
+    while True:
+        canonical, changed = {}, False
+        for stream in streams:
+            if stream.objgen in remap:
+                continue
+            key = _stream_key(stream, remap)
+            first = canonical.setdefault(key, stream.objgen)
+            if first != stream.objgen:
+                remap[stream.objgen] = first
+                changed = True
+        if not changed:
+            break
+
+    if remap:
+        for obj in pdf.objects:
+            _relink(obj, remap, pdf)
+    return len(remap)
+
+
+def _page_count(data: bytes):
+    """Return the page count of a PDF, or None if it cannot be read."""
+    import pikepdf
+
+    try:
+        with pikepdf.open(io.BytesIO(data)) as pdf:
+            return len(pdf.pages)
+    except pikepdf.PdfError:
+        return None
+
+
+def optimize_pdf(data: bytes, linearize: bool = False) -> tuple:
+    """
+    Return (optimized PDF bytes, number of merged streams).
+
+    The page content is untouched; only the file's structure changes.
+    """
+    import pikepdf
+
+    modes = [pikepdf.ObjectStreamMode.generate]
+    if not linearize:
+        modes.append(pikepdf.ObjectStreamMode.preserve)
+
+    candidates = []
+    with pikepdf.open(io.BytesIO(data)) as pdf:
+        page_count = len(pdf.pages)
+        merged = deduplicate_streams(pdf)
+        for mode in modes:
+            out = io.BytesIO()
+            # A content-derived /ID keeps the output reproducible
+            pdf.save(out, compress_streams=True, object_stream_mode=mode, linearize=linearize,
+                     deterministic_id=True)
+            if _page_count(out.getvalue()) == page_count:
+                candidates.append(out.getvalue())
+
+    if not candidates:
+        raise ValueError("qpdf produced no valid optimized PDF")
+    best = min(candidates, key=len)
+    if not linearize and len(best) >= len(data):
+        return data, merged
+    return best, merged
+
+
+def format_size(size: int) -> str:
+    """Return a size in MB for the build summaries."""
+    return f"{size / 1024 / 1024:.2f} MB"
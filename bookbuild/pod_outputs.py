@@ -0,0 +1,145 @@
+"""
+Outputs derived from one POD layout.
+
+Laying out the book is the expensive step, so everything the build reports
+comes from the single render: the PDF bytes, the page -> spine file map
+(from the anchors WeasyPrint records for each chapter section's id), a
+page-count report, and PNG previews rasterized from the PDF in memory.
+
+Each chapter section carries the id section_id(spine file). WeasyPrint
+records it as an anchor on the pages the section occupies and writes it as
+a named destination, so the map can be read from a rendered Document or,
+for the spliced parallel render, from the PDF itself.
+"""
+
+import io
+import json
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .cache import DiskCache, hash_parts
+
+SECTION_ID_PREFIX = "spine-"
+
+
+def section_id(spine_file: str) -> str:
+    """Return the element id of the chapter section for spine_file."""
+    return SECTION_ID_PREFIX + Path(spine_file).stem
+
+
+def _fill_forward(starts: dict, page_count: int, files: dict) -> list:
+    """Expand {page index: section id} into one spine file per page."""
+    page_map, current = [], None
+    for index in range(page_count):
+        if index in starts:
+            current = files.get(starts[index])
+        page_map.append(current)
+    return page_map
+
+
+def document_page_map(document, spine_files: list) -> list:
+    """Return the spine file on each page of a rendered WeasyPrint Document."""
+    files = {section_id(f): f for f in spine_files}
+    starts = {}
+    for index, page in enumerate(document.pages):
+        for name in page.anchors:
+            if name in files and name not in starts.values():
+                starts[index] = name
+    return _fill_forward(starts, len(document.pages), files)
+
+
+def pdf_page_map(pdf: bytes, spine_files: list) -> list:
+    """Return the spine file on each page, from the PDF's named destinations."""
+    import pikepdf
+
+    files = {section_id(f): f for f in spine_files}
+    starts = {}
+    with pikepdf.open(io.BytesIO(pdf)) as doc:
+        if "/Names" in doc.Root and "/Dests" in doc.Root.Names:
+            for name, destination in pikepdf.NameTree(doc.Root.Names.Dests).items():
+                if name in files and isinstance(destination, pikepdf.Array):
+                    starts.setdefault(doc.pages.index(pikepdf.Page(destination[0])), name)
+        page_count = len(doc.pages)
+    return _fill_forward(starts, page_count, files)
+
+
+def page_report(page_map: list) -> list:
+    """Group the page map into (spine file, first page, page count) runs."""
+    report = []
+    for number, spine_file in enumerate(page_map, start=1):
+        if report and report[-1][0] == spine_file:
+            name, first, count = report[-1]
+            report[-1] = (name, first, count + 1)
+        else:
+            report.append((spine_file, number, 1))
+    return report
+
+
+def save_first_pages(cache: DiskCache, trim: str, page_map: list) -> None:
+    """Remember the first page of every spine file from a full build."""
+    first_pages = {name: first for name, first, _ in page_report(page_map) if name}
+    cache.put_text(hash_parts("first-pages", trim), json.dumps(first_pages))
+
+
+def load_first_pages(cache: DiskCache, trim: str) -> dict:
+    """Return {spine file: first page} from the last full build, or {}."""
+    text = cache.get_text(hash_parts("first-pages", trim))
+    return json.loads(text) if text else {}
+
+
+def write_page_map(path: Path, page_map: list) -> None:
+    """Write the page map and report as JSON."""
+    data = {
+        "pages": len(page_map),
+        "page_files": page_map,
+        "files": [
+            {"file": name, "first_page": first, "pages": count}
+            for name, first, count in page_report(page_map)
+        ],
+    }
+    Path(path).write_text(json.dumps(data, indent=2) + "\n")
+
+
+def rasterize_pages(pdf: bytes, out_dir: Path, dpi: int, page_count: int,
+                    jobs: int = 1) -> list:
+    """
+    Write page-NNN.png previews of the PDF into out_dir with pdftoppm.
+
+    The PDF is piped to pdftoppm, split into page ranges across jobs
+    processes. Returns the PNG paths in page order.
+    """
+    if shutil.which("pdftoppm") is None:
+        raise RuntimeError("pdftoppm not found (install poppler-utils)")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for stale in out_dir.glob("page-*.png"):
+        stale.unlink()
+
+    jobs = max(1, min(jobs, page_count))
+    per_job = -(-page_count // jobs)
+    ranges = [(first, min(first + per_job - 1, page_count))
+              for first in range(1, page_count + 1, per_job)]
+
+    def run(page_range):
+        first, last = page_range
+        subprocess.run(
+            ["pdftoppm", "-png", "-r", str(dpi), "-f", str(first), "-l", str(last),
+             "-", str(out_dir / "page")],
+            input=pdf, check=True, capture_output=True,
+        )
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        list(pool.map(run, ranges))
+
+    # pdftoppm pads page numbers to the width of the last page number
+    width = len(str(page_count))
+    paths = []
+    for number in range(1, page_count + 1):
+        written = out_dir / f"page-{number:0{width}d}.png"
+        path = out_dir / f"page-{number:03d}.png"
+        if written != path:
+            written.rename(path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,420 @@
+"""
+Parallel WeasyPrint rendering of the POD book, spliced into one PDF.
+
+The combined document is cut at its forced page breaks (one group of spine
+sections per job), each group is rendered in its own process, and the
+resulting PDFs are concatenated with pikepdf, merging their named
+destinations and outlines.
+
+For the pieces to match a single-document render, every group after the
+first must start on the right page side and page number. It is rendered
+behind a one-page lead-in: the root's break-before puts the lead on the
+opposite side, and an @page :first counter-reset numbers it one before the
+group's real first page. The lead page is dropped when splicing. The lead
+also takes the :first page styles, so the group's real first page is styled
+like any other page, as it is in the full book. Every rendered group is
+checked to start on the side its page number calls for (odd pages on the
+right), so a lead that lost the cascade fails the build instead of
+swapping the gutters.
+
+Start pages depend on the page counts of the groups before them, which are
+only known after rendering. Counts from earlier builds are cached, keyed by
+group content and starting side, and used to guess the start pages; groups
+whose guess was wrong are rendered again until every start page is right.
+Builds where the pagination did not change render each group once.
+
+render_variants() parallelizes the other way: one whole-document render per
+trim-size variant, sharing the document and the warm url_fetcher.
+
+A long-running process (build-daemon.py) can call keep_warm() so that the
+in-process renders reuse one WeasyPrint font configuration, with the
+@font-face fonts already decoded and registered, and the parsed
+stylesheets. Every file the warm state loaded is recorded with its size
+and mtime; when one changes, or the fetcher would serve it from another
+file, the state is rebuilt.
+"""
+
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from .cache import DiskCache, hash_parts
+from .fetcher import as_url_fetcher, default_fetch
+
+LEAD_SECTION = '<section class="splice-lead"></section>'
+# Passed as a user stylesheet, so !important is needed to beat print.css
+LEAD_CSS = """
+html {{ break-before: {side} !important; }}
+section.splice-lead {{ break-after: page !important; }}
+@page :first {{ counter-reset: page {number} !important; }}
+"""
+
+# Rough page size in HTML bytes, for guessing start pages without history
+BYTES_PER_PAGE = 2500
+
+
+def renderer_version() -> str:
+    """Identify WeasyPrint and the Pango it lays text out with, for artifact keys."""
+    import weasyprint
+    from weasyprint.text.ffi import pango
+
+    return f"WeasyPrint {weasyprint.__version__}, Pango {pango.pango_version()}"
+
+
+def page_count_cache(enabled: bool = True) -> DiskCache:
+    """Return the cache of page counts from earlier renders."""
+    return DiskCache("pod-pages", max_bytes=1024 * 1024, enabled=enabled)
+
+
+def split_groups(sections: list, jobs: int) -> list:
+    """Split sections into at most jobs contiguous groups of similar size."""
+    total = sum(len(s) for s in sections)
+    target = total / max(1, jobs)
+    groups, current, size = [], [], 0
+    for section in sections:
+        if current and size + len(section) / 2 > target and len(groups) < jobs - 1:
+            groups.append(current)
+            current, size = [], 0
+        current.append(section)
+        size += len(section)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _group_html(head: str, group: list, start_page: int) -> tuple:
+    """Return (html, extra css) to render group starting at start_page."""
+    body = "\n".join(group)
+    if start_page == 1:
+        return f"{head}\n{body}\n</body>\n</html>", ""
+    # The lead sits on the side opposite the group's first page
+    side = "left" if start_page % 2 else "right"
+    css = LEAD_CSS.format(side=side, number=start_page - 1)
+    return f"{head}\n{LEAD_SECTION}\n{body}\n</body>\n</html>", css
+
+
+def _check_side(page, number: int) -> None:
+    """Raise RuntimeError unless a rendered page sits on the side its number calls for."""
+    expected = "right" if number % 2 else "left"
+    side = page._page_box.page_type.side
+    if side != expected:
+        raise RuntimeError(f"page {number} was laid out as a {side} page")
+
+
+# Per-worker url_fetcher, installed by the pool initializer
+_url_fetcher = None
+
+# WeasyPrint state kept between renders in this process, see keep_warm()
+_warm = None
+
+
+def _init_worker(url_fetcher) -> None:
+    global _url_fetcher, _warm
+    _url_fetcher = url_fetcher
+    # Forked workers start cold; the font configuration's files belong to the parent
+    _warm = None
+
+
+class WarmStyles:
+    """A font configuration and parsed stylesheets reused between renders."""
+
+    def __init__(self, max_stylesheets: int = 16):
+        self.max_stylesheets = max_stylesheets
+        self.font_config = None
+        self.stylesheets = OrderedDict()
+        # file: URL -> (file that served it, (mtime, size))
+        self.sources = {}
+
+    @staticmethod
+    def _source(fetcher, url: str):
+        parsed = urlparse(url)
+        if parsed.scheme != "file":
+            return None
+        path = Path(unquote(parsed.path))
+        return fetcher.source(path) if hasattr(fetcher, "source") else path
+
+    @staticmethod
+    def _stamp(path: Path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _current(self, fetcher) -> bool:
+        for url, (source, stamp) in self.sources.items():
+            now = self._source(fetcher, url)
+            if now != source or self._stamp(now) != stamp:
+                return False
+        return True
+
+    def _recording(self, fetcher):
+        def fetch(url, *args, **kwargs):
+            source = self._source(fetcher, url)
+            if source is not None:
+                self.sources[url] = (source, self._stamp(source))
+            return fetcher(url, *args, **kwargs)
+        return fetch
+
+    def prepare(self, stylesheets: list, fetcher) -> tuple:
+        """Return (font config, CSS objects, url_fetcher to render with)."""
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        if self.font_config is None or not self._current(fetcher):
+            self.font_config = FontConfiguration()
+            self.stylesheets.clear()
+            self.sources = {}
+        recording = as_url_fetcher(self._recording(fetcher))
+        css = []
+        for string in filter(None, stylesheets):
+            if string not in self.stylesheets:
+                self.stylesheets[string] = CSS(string=string, font_config=self.font_config,
+                                               url_fetcher=recording)
+                while len(self.stylesheets) > self.max_stylesheets:
+                    self.stylesheets.popitem(last=False)
+            self.stylesheets.move_to_end(string)
+            css.append(self.stylesheets[string])
+        return self.font_config, css, recording
+
+
+def keep_warm() -> None:
+    """
+    Reuse the font configuration and stylesheets across renders in this process.
+
+    The font configuration (the system font scan) is built right away.
+    """
+    global _warm
+    if _warm is None:
+        _warm = WarmStyles()
+        _warm.prepare([], None)
+
+
+def _prepare(stylesheets: list, fetcher, font_config=None) -> tuple:
+    """Return (font config, CSS objects, url_fetcher) for one render."""
+    if _warm is not None:
+        return _warm.prepare(stylesheets, fetcher)
+
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    font_config = font_config or FontConfiguration()
+    fetcher = as_url_fetcher(fetcher)
+    css = [CSS(string=s, font_config=font_config, url_fetcher=fetcher) for s in stylesheets if s]
+    return font_config, css, fetcher
+
+
+def render_group(html: str, base_url: str, stylesheets: list, start_page: int) -> tuple:
+    """
+    Render one group, laid out by _group_html() for start_page, in a worker process.
+
+    Returns (pdf bytes, page count, fetcher hits, fetcher misses).
+    """
+    from weasyprint import HTML
+
+    fetcher = _url_fetcher or default_fetch
+    hits, misses = getattr(fetcher, "hits", 0), getattr(fetcher, "misses", 0)
+    font_config, css, render_fetcher = _prepare(stylesheets, fetcher)
+    document = HTML(string=html, base_url=base_url, url_fetcher=render_fetcher).render(
+        stylesheets=css, font_config=font_config)
+    lead = start_page > 1
+    _check_side(document.pages[1 if lead else 0], start_page)
+    pages = len(document.pages) - (1 if lead else 0)
+    return (document.write_pdf(), pages,
+            getattr(fetcher, "hits", 0) - hits, getattr(fetcher, "misses", 0) - misses)
+
+
+def render_document(html: str, base_url: str, stylesheets: list, spine_files: list,
+                    url_fetcher=None) -> tuple:
+    """
+    Lay out a whole document once, in this process or a worker.
+
+    Returns (pdf bytes, spine file on each page, fetcher hits, fetcher misses).
+    """
+    from weasyprint import HTML
+
+    from .pod_outputs import document_page_map
+
+    fetcher = url_fetcher or _url_fetcher or default_fetch
+    hits, misses = getattr(fetcher, "hits", 0), getattr(fetcher, "misses", 0)
+    font_config, css, render_fetcher = _prepare(stylesheets, fetcher)
+    document = HTML(string=html, base_url=base_url, url_fetcher=render_fetcher).render(
+        stylesheets=css, font_config=font_config)
+    return (document.write_pdf(), document_page_map(document, spine_files),
+            getattr(fetcher, "hits", 0) - hits, getattr(fetcher, "misses", 0) - misses)
+
+
+def render_runs(head: str, runs: list, base_url: str, css: str, spine_files: list,
+                url_fetcher=None) -> tuple:
+    """
+    Render runs of sections, each at its own start page, into one PDF.
+
+    runs is [(sections, start page)]. Each run is laid out in this process
+    behind a lead page, as the groups of render_parallel() are; the lead
+    pages are dropped and the remaining pages joined into one document.
+
+    Returns (pdf bytes, spine file on each page).
+    """
+    from weasyprint import HTML
+
+    from .pod_outputs import document_page_map
+
+    fetcher = url_fetcher or default_fetch
+    documents, pages, font_config = [], [], None
+    for sections, start_page in runs:
+        html, lead_css = _group_html(head, sections, start_page)
+        font_config, stylesheets, render_fetcher = _prepare([css, lead_css], fetcher, font_config)
+        document = HTML(string=html, base_url=base_url, url_fetcher=render_fetcher).render(
+            stylesheets=stylesheets, font_config=font_config)
+        documents.append(document)
+        run_pages = document.pages[1:] if start_page > 1 else document.pages
+        _check_side(run_pages[0], start_page)
+        pages.extend(run_pages)
+
+    document = documents[0].copy(pages)
+    return document.write_pdf(), document_page_map(document, spine_files)
+
+
+def render_variants(html: str, base_url: str, variant_css: dict, spine_files: list,
+                    jobs: int, url_fetcher=None, log=print) -> dict:
+    """
+    Render one document under several stylesheets, one process per variant.
+
+    The document, the fetcher and its warm cache are shared by every worker;
+    only the variant's CSS differs. Returns {name: (pdf bytes, page map)}.
+    """
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(url_fetcher,)) as pool:
+        futures = {
+            name: pool.submit(render_document, html, base_url, [css], spine_files)
+            for name, css in variant_css.items()
+        }
+        for name, future in futures.items():
+            pdf, page_map, hits, misses = future.result()
+            if url_fetcher is not None:
+                url_fetcher.hits += hits
+                url_fetcher.misses += misses
+            results[name] = (pdf, page_map)
+            log(f"  Rendered {name}: {len(page_map)} pages")
+    return results
+
+
+def _count_key(group: list, css: str, start_page: int) -> str:
+    return hash_parts("pages", css, str(start_page % 2), *group)
+
+
+def render_parallel(head: str, sections: list, base_url: str, css: str, jobs: int,
+                    cache: DiskCache = None, url_fetcher=None, log=print) -> list:
+    """
+    Render sections in up to jobs processes.
+
+    url_fetcher is handed to every worker once, through the pool
+    initializer; hit and miss counts from the workers are added to it.
+
+    Returns [(pdf bytes, start page, page count, lead)] in order, with every
+    group rendered at its true start page.
+    """
+    groups = split_groups(sections, jobs)
+
+    def guess_starts():
+        starts, page = [], 1
+        for group in groups:
+            starts.append(page)
+            cached = cache.get_text(_count_key(group, css, page)) if cache else None
+            page += int(cached) if cached else max(1, sum(len(s) for s in group) // BYTES_PER_PAGE)
+        return starts
+
+    starts = guess_starts()
+    results = [None] * len(groups)
+    pending = list(range(len(groups)))
+    rounds = 0
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(url_fetcher,)) as pool:
+        while pending:
+            rounds += 1
+            log(f"  Round {rounds}: rendering {len(pending)} of {len(groups)} groups in parallel...")
+            futures = {}
+            for i in pending:
+                html, lead_css = _group_html(head, groups[i], starts[i])
+                futures[i] = pool.submit(render_group, html, base_url, [css, lead_css], starts[i])
+            for i, future in futures.items():
+                pdf, count, hits, misses = future.result()
+                if url_fetcher is not None:
+                    url_fetcher.hits += hits
+                    url_fetcher.misses += misses
+                results[i] = (pdf, starts[i], count, starts[i] > 1)
+                if cache:
+                    cache.put_text(_count_key(groups[i], css, starts[i]), str(count))
+
+            # Walk the groups in order; any rendered at the wrong start page goes again
+            pending, page = [], 1
+            for i, (_, start, count, _) in enumerate(results):
+                if start != page:
+                    starts[i] = page
+                    pending.append(i)
+                    cached = cache.get_text(_count_key(groups[i], css, page)) if cache else None
+                    count = int(cached) if cached else count
+                page += count
+
+    log(f"  Rendered {len(groups)} groups in {rounds} round{'s' if rounds != 1 else ''}")
+    return results
+
+
+def _remap_destination(src, destination, page_offset: int, out):
+    """Point an explicit [page /XYZ x y z] destination at the spliced page."""
+    import pikepdf
+
+    if isinstance(destination, pikepdf.Array) and len(destination) and \
+            isinstance(destination[0], pikepdf.Dictionary):
+        page_index = src.pages.index(pikepdf.Page(destination[0])) + page_offset
+        return pikepdf.Array([out.pages[page_index].obj, *destination[1:]])
+    return destination
+
+
+def _copy_outline(src, dest_items, src_items, page_offset: int, out) -> None:
+    """Append src_items (from src's outline) under dest_items, shifting pages."""
+    import pikepdf
+
+    for item in src_items:
+        destination = _remap_destination(src, item.destination, page_offset, out)
+        new_item = pikepdf.OutlineItem(item.title, destination)
+        dest_items.append(new_item)
+        _copy_outline(src, new_item.children, item.children, page_offset, out)
+
+
+def splice_pdfs(results: list) -> bytes:
+    """Concatenate the rendered groups, dropping lead pages."""
+    import pikepdf
+
+    out = pikepdf.open(io.BytesIO(results[0][0]))
+    sources = []
+    dests = pikepdf.NameTree.new(out) if "/Names" not in out.Root or \
+        "/Dests" not in out.Root.Names else pikepdf.NameTree(out.Root.Names.Dests)
+
+    for pdf, _, _, lead in results[1:]:
+        src = pikepdf.open(io.BytesIO(pdf))
+        sources.append(src)
+        offset = len(out.pages) - (1 if lead else 0)
+        out.pages.extend(src.pages[1:] if lead else src.pages)
+
+        if "/Names" in src.Root and "/Dests" in src.Root.Names:
+            for name, destination in pikepdf.NameTree(src.Root.Names.Dests).items():
+                dests[name] = _remap_destination(src, destination, offset, out)
+
+        with src.open_outline() as src_outline, out.open_outline() as out_outline:
+            _copy_outline(src, out_outline.root, src_outline.root, offset, out)
+
+    if "/Names" not in out.Root:
+        out.Root.Names = pikepdf.Dictionary()
+    out.Root.Names.Dests = dests.obj
+
+    buffer = io.BytesIO()
+    out.save(buffer, deterministic_id=True)
+    for src in sources:
+        src.close()
+    return buffer.getvalue()
@@ -0,0 +1,68 @@
+"""
+Single-pass rewriting of converted LaTeX with declared rules.
+
+A RuleSet is a list of named rules, each a regular expression and a
+replacement (a re template or a function of the match and the call's
+context). The rules are compiled into one alternation, so a chapter is
+scanned once however many rules there are; at each position the first
+rule that matches wins, and replaced text is not scanned again. Rules that
+must combine (rebase a path and swap its extension) are written as one
+rule over the whole construct, with the more specific rules first.
+Patterns may use groups but not backreferences or global inline flags.
+
+Every RuleSet counts how often each rule fired, so rules that no longer
+match anything show up in the build output.
+"""
+
+import re
+from collections import Counter
+
+
+class Rule:
+    """One rewrite: a pattern and a template or function(match, **context) -> str."""
+
+    def __init__(self, name: str, pattern: str, replace):
+        self.name = name
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.replace = replace
+
+
+class RuleSet:
+    """Rules compiled into one matcher, applied in a single pass."""
+
+    def __init__(self, rules: list):
+        names = [rule.name for rule in rules]
+        if len(set(names)) != len(names):
+            raise ValueError(f"duplicate rule names in {names}")
+        self.rules = list(rules)
+        # Each rule is wrapped in a named group; lastgroup tells which one matched
+        self._combined = re.compile("|".join(
+            f"(?P<_r{i}>{rule.pattern})" for i, rule in enumerate(self.rules)
+        ))
+        self.counts = Counter({name: 0 for name in names})
+
+    def apply(self, text: str, **context) -> str:
+        """Rewrite text; context is passed to replacement functions."""
+        def dispatch(match):
+            rule = self.rules[int(match.lastgroup[2:])]
+            self.counts[rule.name] += 1
+            # Match the rule on its own so its groups keep their numbers
+            own = rule.regex.match(match.string, match.start())
+            if callable(rule.replace):
+                return rule.replace(own, **context)
+            return own.expand(rule.replace)
+
+        return self._combined.sub(dispatch, text)
+
+    def reset(self) -> None:
+        """Start counting afresh (for each build in a long-running process)."""
+        self.counts = Counter({rule.name: 0 for rule in self.rules})
+
+    def dead_rules(self) -> list:
+        """Return the names of rules that never fired."""
+        return [name for name, count in self.counts.items() if count == 0]
+
+    def report(self) -> str:
+        """Return 'name count, ...' for the build output."""
+        return ", ".join(f"{name} {count}" for name, count in self.counts.items())
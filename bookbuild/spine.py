@@ -0,0 +1,103 @@
+"""
+Select part of the spine for a quick preview build.
+
+Selectors (--only), any number of them, combined:
+
+    chapter:3, chapter:iii      one chapter, by number (arabic or roman)
+    chapter:3-5                 a range of chapters
+    part:2, part:II             a part page and the chapters under it
+    28-Conclusion.xhtml         a spine file, by name, stem or glob
+
+The selection always comes back in spine order.
+"""
+
+import re
+from fnmatch import fnmatch
+from pathlib import Path
+
+ROMAN_VALUES = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100}
+
+CHAPTER_RE = re.compile(r"-chapter-([ivxlc]+)-", re.IGNORECASE)
+PART_RE = re.compile(r"-Part-([IVX]+)-", re.IGNORECASE)
+
+
+def roman_to_int(numeral: str) -> int:
+    """Convert a roman numeral (any case) to an int."""
+    values = [ROMAN_VALUES[c] for c in numeral.lower()]
+    return sum(-v if i + 1 < len(values) and v < values[i + 1] else v
+               for i, v in enumerate(values))
+
+
+def parse_number(text: str) -> int:
+    """Parse an arabic or roman number."""
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    if text and all(c in ROMAN_VALUES for c in text.lower()):
+        return roman_to_int(text)
+    raise ValueError(f"not a number: {text!r}")
+
+
+def chapter_number(filename: str):
+    """Return the chapter number of a spine file, or None."""
+    match = CHAPTER_RE.search(Path(filename).name)
+    return roman_to_int(match.group(1)) if match else None
+
+
+def part_number(filename: str):
+    """Return the part number of a part page, or None."""
+    match = PART_RE.search(Path(filename).name)
+    return roman_to_int(match.group(1)) if match else None
+
+
+def _match(spine_files: list, selector: str) -> set:
+    kind, _, value = selector.partition(":")
+    kind = kind.lower()
+
+    if kind in ("chapter", "ch") and value:
+        first, _, last = value.partition("-")
+        first = parse_number(first)
+        last = parse_number(last) if last else first
+        return {f for f in spine_files if (chapter_number(f) or 0) in range(first, last + 1)}
+
+    if kind == "part" and value:
+        wanted = parse_number(value)
+        selected, inside = set(), False
+        for f in spine_files:
+            if part_number(f) is not None:
+                inside = part_number(f) == wanted
+            elif chapter_number(f) is None and "-quote" not in f:
+                inside = False
+            if inside:
+                selected.add(f)
+        return selected
+
+    return {f for f in spine_files
+            if selector in (f, Path(f).name, Path(f).stem) or fnmatch(Path(f).name, selector)}
+
+
+def select_spine(spine_files: list, selectors: list) -> list:
+    """
+    Return the spine files matching any of selectors, in spine order.
+
+    Raises ValueError for a selector that matches nothing.
+    """
+    selected = set()
+    for selector in selectors:
+        matched = _match(spine_files, selector)
+        if not matched:
+            raise ValueError(f"--only {selector!r} matches no spine file")
+        selected |= matched
+    return [f for f in spine_files if f in selected]
+
+
+def contiguous_runs(spine_files: list, selected: list) -> list:
+    """Split selected into runs of files that are adjacent in spine_files."""
+    runs, previous = [], None
+    positions = {f: i for i, f in enumerate(spine_files)}
+    for f in selected:
+        if previous is None or positions[f] != positions[previous] + 1:
+            runs.append([])
+        runs[-1].append(f)
+        previous = f
+    return runs
@@ -0,0 +1,124 @@
+"""
+Incremental asset sync between the EPUB sources and build directories.
+
+A file is left alone when the destination already matches it: same inode,
+or same size and mtime, or (when only the mtime differs, e.g. after a git
+checkout) same content hash. Anything else is placed with a hardlink, then
+a reflink, and only as a last resort a byte copy, so rebuilds on unchanged
+assets copy no data at all.
+
+Each destination keeps a small manifest of the names it received, so files
+removed from the source are pruned without touching files that other build
+steps write into the same directory (brushstroke.pdf, converted fonts).
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from .cache import hash_file
+from .files import write_if_changed
+
+MANIFEST_NAME = ".synced.json"
+
+# Linux FICLONE ioctl: share extents on btrfs/xfs instead of copying them
+FICLONE = 0x40049409
+
+
+def _same_content(src: Path, dest: Path, src_stat) -> bool:
+    """Check whether dest already holds src, touching as little data as possible."""
+    try:
+        dest_stat = dest.stat()
+    except FileNotFoundError:
+        return False
+    if (dest_stat.st_dev, dest_stat.st_ino) == (src_stat.st_dev, src_stat.st_ino):
+        return True
+    if dest_stat.st_size != src_stat.st_size:
+        return False
+    if dest_stat.st_mtime_ns == src_stat.st_mtime_ns:
+        return True
+    if hash_file(src) != hash_file(dest):
+        return False
+    # Same bytes, different mtime: adopt the source mtime so the next check is a stat
+    os.utime(dest, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+    return True
+
+
+def _reflink(src: Path, dest: Path):
+    import fcntl
+
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    shutil.copystat(src, dest)
+
+
+def _place(src: Path, dest: Path) -> str:
+    """Put src at dest atomically. Returns "linked", "reflinked" or "copied"."""
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.")
+    os.close(fd)
+    tmp = Path(tmp)
+    try:
+        try:
+            tmp.unlink()
+            os.link(src, tmp)
+            method = "linked"
+        except OSError:
+            try:
+                _reflink(src, tmp)
+                method = "reflinked"
+            except (OSError, ImportError):
+                shutil.copy2(src, tmp)
+                method = "copied"
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return method
+
+
+def _read_manifest(dest_dir: Path) -> set:
+    try:
+        return set(json.loads((dest_dir / MANIFEST_NAME).read_text()))
+    except (FileNotFoundError, ValueError):
+        return set()
+
+
+def sync_tree(src_dir: Path, dest_dir: Path) -> dict:
+    """
+    Mirror the files directly inside src_dir into dest_dir.
+
+    Returns counts keyed by "unchanged", "linked", "reflinked", "copied"
+    and "removed".
+    """
+    src_dir, dest_dir = Path(src_dir), Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    counts = dict.fromkeys(("unchanged", "linked", "reflinked", "copied", "removed"), 0)
+
+    names = []
+    for src in sorted(src_dir.iterdir()):
+        if not src.is_file() or src.name.startswith("."):
+            continue
+        names.append(src.name)
+        dest = dest_dir / src.name
+        if _same_content(src, dest, src.stat()):
+            counts["unchanged"] += 1
+        else:
+            counts[_place(src, dest)] += 1
+
+    for name in sorted(_read_manifest(dest_dir) - set(names)):
+        stale = dest_dir / name
+        if stale.is_file():
+            stale.unlink()
+            counts["removed"] += 1
+
+    write_if_changed(dest_dir / MANIFEST_NAME, json.dumps(names, indent=1) + "\n")
+    return counts
+
+
+def format_counts(counts: dict) -> str:
+    """Summarize sync_tree() counts, omitting zeroes after 'unchanged'."""
+    parts = [f"{counts['unchanged']} unchanged"]
+    parts += [f"{n} {key}" for key, n in counts.items() if key != "unchanged" and n]
+    return ", ".join(parts)
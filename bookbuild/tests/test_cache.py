@@ -0,0 +1,57 @@
+import os
+import time
+
+import pytest
+
+from bookbuild import cache
+from bookbuild.cache import DiskCache, hash_parts
+
+
+@pytest.fixture
+def disk_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_ROOT", tmp_path)
+    return DiskCache("test", max_bytes=100)
+
+
+def test_hash_parts_keeps_part_boundaries():
+    assert hash_parts("ab", "c") != hash_parts("a", "bc")
+    assert hash_parts("a", b"b") == hash_parts(b"a", "b")
+
+
+def test_round_trip_and_stats(disk_cache):
+    key = hash_parts("entry")
+    assert disk_cache.get(key) is None
+    disk_cache.put(key, b"data")
+    disk_cache.put_text(hash_parts("text"), "café")
+    assert disk_cache.get(key) == b"data"
+    assert disk_cache.get_text(hash_parts("text")) == "café"
+    assert disk_cache.stats() == "2 hits, 1 misses"
+
+
+def test_disabled_cache_stores_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_ROOT", tmp_path)
+    disabled = DiskCache("test", enabled=False)
+    disabled.put(hash_parts("entry"), b"data")
+    assert disabled.get(hash_parts("entry")) is None
+    assert not (tmp_path / "test").exists()
+
+
+def test_eviction_drops_least_recently_used(disk_cache):
+    a, b, c = hash_parts("a"), hash_parts("b"), hash_parts("c")
+    disk_cache.put(a, b"a" * 40)
+    disk_cache.put(b, b"b" * 40)
+    now = time.time()
+    os.utime(disk_cache._entry(a), (now - 200, now - 200))
+    os.utime(disk_cache._entry(b), (now - 100, now - 100))
+    # Reading a makes b the least recently used
+    assert disk_cache.get(a) is not None
+    disk_cache.put(c, b"c" * 40)
+    assert disk_cache.get(b) is None
+    assert disk_cache.get(a) == b"a" * 40
+    assert disk_cache.get(c) == b"c" * 40
+
+
+def test_entry_larger_than_budget_is_not_kept(disk_cache):
+    key = hash_parts("big")
+    disk_cache.put(key, b"x" * 101)
+    assert disk_cache.get(key) is None
@@ -0,0 +1,53 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from bookbuild import cache
+from bookbuild.cache import DiskCache
+
+COMPILE_LATEX = Path(__file__).resolve().parents[2] / "pdf" / "compile_latex.py"
+
+
+def load_compile_latex():
+    spec = importlib.util.spec_from_file_location("compile_latex", COMPILE_LATEX)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def document(tmp_path):
+    workdir = tmp_path / "pdf"
+    (workdir / "latex").mkdir(parents=True)
+    (workdir / "book.tex").write_text(r"\include{latex/one}")
+    (workdir / "book.pdf").write_bytes(b"%PDF")
+    (workdir / "book.aux").write_text(r"\@input{latex/one.aux}")
+    (workdir / "book.toc").write_text("toc")
+    (workdir / "latex" / "one.aux").write_text(r"\newlabel{one}{{1}{5}}")
+    return workdir / "book.tex"
+
+
+def test_restored_pdf_brings_its_aux_files(document, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_ROOT", tmp_path / "cache")
+    compile_latex = load_compile_latex()
+    artifacts = DiskCache("artifacts")
+    pdf = document.with_suffix(".pdf")
+    compile_latex.store_pdf(artifacts, "ab" * 32, pdf, document)
+
+    pdf.unlink()
+    document.with_suffix(".aux").unlink()
+    (document.parent / "latex" / "one.aux").write_text("stale")
+    assert compile_latex.restore_pdf(artifacts, "ab" * 32, pdf, document)
+    assert pdf.read_bytes() == b"%PDF"
+    assert document.with_suffix(".aux").read_text() == r"\@input{latex/one.aux}"
+    assert (document.parent / "latex" / "one.aux").read_text() == r"\newlabel{one}{{1}{5}}"
+
+
+def test_entry_without_aux_files_is_a_miss(document, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_ROOT", tmp_path / "cache")
+    compile_latex = load_compile_latex()
+    artifacts = DiskCache("artifacts")
+    # Stored before the .aux files were kept
+    artifacts.put("cd" * 32, b"%PDF")
+    assert not compile_latex.restore_pdf(artifacts, "cd" * 32, document.with_suffix(".pdf"), document)
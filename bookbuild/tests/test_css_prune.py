@@ -0,0 +1,50 @@
+import pytest
+
+from bookbuild.css_prune import prune_stylesheets
+
+pytest.importorskip("cssselect2")
+pytest.importorskip("tinyhtml5")
+
+DOCUMENT = """<!DOCTYPE html>
+<html><head><title>t</title></head>
+<body><section class="chapter"><p class="intro">Text</p><table><tr><td>1</td></tr></table></section></body>
+</html>"""
+
+
+def prune(css):
+    (pruned,), kept, total = prune_stylesheets([css], DOCUMENT)
+    return pruned, kept, total
+
+
+def test_rules_without_a_matching_element_are_dropped():
+    pruned, kept, total = prune(".chapter p { color: red } .web-only { display: none }")
+    assert ".chapter p" in pruned and ".web-only" not in pruned
+    assert (kept, total) == (1, 2)
+
+
+def test_implied_elements_exist():
+    pruned, _, _ = prune("tbody td { padding: 0 }")
+    assert "tbody td" in pruned
+
+
+def test_pseudo_elements_follow_their_element():
+    pruned, _, _ = prune("p.intro::first-letter { font-size: 2em } aside::before { content: '' }")
+    assert "p.intro::first-letter" in pruned and "aside" not in pruned
+
+
+def test_grouping_rules_are_pruned_inside_and_dropped_when_empty():
+    pruned, kept, total = prune(
+        "@media print { p { margin: 0 } nav { display: none } }"
+        "@supports (display: grid) { .grid { display: grid } }"
+    )
+    assert "@media print" in pruned and "nav" not in pruned
+    assert "@supports" not in pruned
+    assert (kept, total) == (1, 3)
+
+
+def test_other_at_rules_and_unknown_selectors_are_kept():
+    pruned, kept, total = prune(
+        "@page :left { margin-left: 1in } @font-face { font-family: X; src: url(x.woff2) }"
+        "p:unknown-pseudo(1) { color: red }"
+    )
+    assert "@page" in pruned and "@font-face" in pruned and ":unknown-pseudo" in pruned
@@ -0,0 +1,43 @@
+import multiprocessing
+import subprocess
+import sys
+import time
+
+import pytest
+
+from bookbuild.daemon import request, serve
+
+
+def noisy(args):
+    print("from print()")
+    # A tool writing to the inherited file descriptors
+    subprocess.run([sys.executable, "-c", "import os; os.write(2, b'from a tool\\n')"], check=True)
+    sys.exit(int(args[0]))
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    socket_path = tmp_path / "daemon.sock"
+    server = multiprocessing.get_context("fork").Process(target=serve,
+                                                         args=({"noisy": noisy}, socket_path))
+    server.start()
+    for _ in range(100):
+        if socket_path.exists():
+            break
+        time.sleep(0.05)
+    yield socket_path
+    request("stop", [], socket_path)
+    server.join(5)
+
+
+def test_output_and_status_reach_the_client(daemon, capsys):
+    assert request("noisy", ["3"], daemon) == 3
+    assert capsys.readouterr().out == "from print()\nfrom a tool\n"
+    # The descriptors are restored between requests
+    assert request("noisy", ["0"], daemon) == 0
+    assert capsys.readouterr().out == "from print()\nfrom a tool\n"
+
+
+def test_unknown_command(daemon, capsys):
+    assert request("missing", [], daemon) == 2
+    assert "unknown command" in capsys.readouterr().out
@@ -0,0 +1,64 @@
+import sys
+
+import pytest
+
+from bookbuild.dag import FAILED, OK, SKIPPED, Stage, critical_path, run_stages, topological_order
+
+
+def succeed(text):
+    return text
+
+
+def fail():
+    raise RuntimeError("stage broke")
+
+
+def test_failure_skips_only_dependent_stages(tmp_path):
+    stages = [
+        Stage("broken", func=fail),
+        Stage("after-broken", func=succeed, args=("x",), deps=("broken",)),
+        Stage("after-that", func=succeed, args=("y",), deps=("after-broken",)),
+        Stage("independent", func=succeed, args=("z",)),
+    ]
+    results = run_stages(stages, 2, tmp_path)
+    assert {name: status for name, (status, _) in results.items()} == {
+        "broken": FAILED, "after-broken": SKIPPED, "after-that": SKIPPED, "independent": OK,
+    }
+    assert (tmp_path / "broken.log").read_text() == "RuntimeError: stage broke\n"
+    assert (tmp_path / "independent.log").read_text() == "z\n"
+
+
+def test_command_exit_status_fails_the_stage(tmp_path):
+    stages = [
+        Stage("exits", command=[sys.executable, "-c", "print('out'); raise SystemExit(3)"]),
+        Stage("needs-it", command=[sys.executable, "-c", "pass"], deps=("exits",)),
+    ]
+    results = run_stages(stages, 1, tmp_path)
+    assert results["exits"][0] == FAILED
+    assert results["needs-it"][0] == SKIPPED
+    assert (tmp_path / "exits.log").read_text().strip() == "out"
+
+
+def test_topological_order():
+    stages = [Stage("c", func=succeed, deps=("b",)), Stage("b", func=succeed, deps=("a",)),
+              Stage("a", func=succeed)]
+    assert [stage.name for stage in topological_order(stages)] == ["a", "b", "c"]
+    with pytest.raises(ValueError, match="cycle"):
+        topological_order([Stage("a", func=succeed, deps=("b",)),
+                           Stage("b", func=succeed, deps=("a",))])
+    with pytest.raises(ValueError, match="unknown"):
+        topological_order([Stage("a", func=succeed, deps=("missing",))])
+
+
+def test_critical_path():
+    stages = [Stage("a", func=succeed), Stage("b", func=succeed, deps=("a",)),
+              Stage("c", func=succeed)]
+    results = {"a": (OK, 1.0), "b": (OK, 2.0), "c": (OK, 2.5)}
+    assert critical_path(stages, results) == (3.0, ["a", "b"])
+
+
+def test_stage_needs_one_of_command_and_func():
+    with pytest.raises(ValueError):
+        Stage("neither")
+    with pytest.raises(ValueError):
+        Stage("both", command=["true"], func=succeed)
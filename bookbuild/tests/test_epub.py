@@ -0,0 +1,84 @@
+import os
+import zipfile
+
+import pytest
+
+from bookbuild import cache
+from bookbuild.cache import DiskCache
+from bookbuild.epub import write_epub
+
+CONTAINER = """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+OPF = """<?xml version="1.0"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0">
+  <manifest>
+    <item id="b" href="xhtml/b.xhtml" media-type="application/xhtml+xml"/>
+    <item id="a" href="xhtml/a.xhtml" media-type="application/xhtml+xml"/>
+    <item id="gone" href="xhtml/gone.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+  <spine><itemref idref="a"/><itemref idref="b"/></spine>
+</package>
+"""
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "pub"
+    (root / "META-INF").mkdir(parents=True)
+    (root / "OEBPS" / "xhtml").mkdir(parents=True)
+    (root / "mimetype").write_bytes(b"application/epub+zip")
+    (root / "META-INF" / "container.xml").write_text(CONTAINER)
+    (root / "OEBPS" / "content.opf").write_text(OPF)
+    (root / "OEBPS" / "xhtml" / "a.xhtml").write_text("<html>" + "a" * 500 + "</html>")
+    (root / "OEBPS" / "xhtml" / "b.xhtml").write_text("<html>b</html>")
+    (root / "OEBPS" / "notes.txt").write_text("not in the manifest")
+    return root
+
+
+def test_archive_order_and_missing_items(tree, tmp_path):
+    count, _, written, missing = write_epub(tree, tmp_path / "book.epub", epoch=0)
+    assert (count, written, missing) == (5, True, ["xhtml/gone.xhtml"])
+    with zipfile.ZipFile(tmp_path / "book.epub") as archive:
+        assert archive.namelist() == [
+            "mimetype", "META-INF/container.xml", "OEBPS/content.opf",
+            "OEBPS/xhtml/b.xhtml", "OEBPS/xhtml/a.xhtml",
+        ]
+        first = archive.infolist()[0]
+        assert first.compress_type == zipfile.ZIP_STORED
+        assert archive.read("mimetype") == b"application/epub+zip"
+        assert archive.testzip() is None
+
+
+def test_same_tree_gives_same_bytes(tree, tmp_path):
+    write_epub(tree, tmp_path / "first.epub", epoch=1700000000)
+    # Touch every file: mtimes must not reach the archive
+    for path in tree.rglob("*"):
+        os.utime(path, (1, 1))
+    write_epub(tree, tmp_path / "second.epub", epoch=1700000000)
+    assert (tmp_path / "first.epub").read_bytes() == (tmp_path / "second.epub").read_bytes()
+    *_, written, _ = write_epub(tree, tmp_path / "second.epub", epoch=1700000000)
+    assert not written
+    write_epub(tree, tmp_path / "third.epub", epoch=1800000000)
+    assert (tmp_path / "first.epub").read_bytes() != (tmp_path / "third.epub").read_bytes()
+
+
+def test_cached_entries_give_the_same_bytes(tree, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_ROOT", tmp_path / "cache")
+    deflate = DiskCache("epub")
+    _, recompressed, _, _ = write_epub(tree, tmp_path / "cold.epub", cache=deflate, epoch=0)
+    assert recompressed == 4
+    _, recompressed, _, _ = write_epub(tree, tmp_path / "warm.epub", cache=deflate, epoch=0)
+    assert recompressed == 0
+    assert (tmp_path / "cold.epub").read_bytes() == (tmp_path / "warm.epub").read_bytes()
+
+
+def test_bad_mimetype(tree, tmp_path):
+    (tree / "mimetype").write_text("application/epub+zip\n")
+    with pytest.raises(ValueError, match="mimetype"):
+        write_epub(tree, tmp_path / "book.epub")
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+
+from bookbuild.font_subset import BASELINE_CHARS, subset_font, used_characters
+
+pytest.importorskip("tinycss2")
+pytest.importorskip("tinyhtml5")
+
+FONTS = Path(__file__).resolve().parents[2] / "pub" / "OEBPS" / "fonts"
+
+CSS = """
+@font-face { font-family: Body; src: url(../fonts/body.woff2) }
+@font-face { font-family: Latin; src: url(../fonts/latin.woff2); unicode-range: U+0000-00FF }
+@media print { @font-face { font-family: Print; src: url("../fonts/print.woff2") } }
+a::after { content: " \\2192 " attr(data-note) }
+@page { @top-center { content: "\\a7" } }
+"""
+
+DOCUMENT = """<!DOCTYPE html>
+<html><head><title>Ω</title><style>p::before { content: "Ж" }</style></head>
+<body><p>straße <a data-note="ñ">é</a><!-- Ψ --></p>ŋ tail</body></html>"""
+
+
+def characters(path_name):
+    used = used_characters([CSS], DOCUMENT, "file:///book/xhtml/")
+    return used[Path("/book/fonts") / path_name] - BASELINE_CHARS
+
+
+def test_every_face_gets_the_document_text_in_every_case():
+    chars = characters("body.woff2")
+    assert set("ßéñŋ→§") <= chars
+    assert set("ÉÑŊ") <= chars  # text-transform: uppercase
+    assert characters("print.woff2") == chars
+
+
+def test_undrawn_text_is_left_out():
+    assert not set("ΩΨЖ") & characters("body.woff2")
+
+
+def test_unicode_range_limits_the_subset():
+    used = used_characters([CSS], DOCUMENT, "file:///book/xhtml/")
+    latin = used[Path("/book/fonts/latin.woff2")]
+    assert "é" in latin and "ŋ" not in latin and "→" not in latin
+    assert all(ord(c) <= 0xFF for c in latin)
+
+
+def test_subset_keeps_only_the_characters_given():
+    pytest.importorskip("fontTools")
+    import io
+
+    from fontTools.ttLib import TTFont
+
+    data = subset_font(FONTS / "librebaskerville-regular.woff2", set("Book é"))
+    cmap = TTFont(io.BytesIO(data)).getBestCmap()
+    assert {chr(c) for c in cmap} == set("Book é")
+    assert subset_font(FONTS / "librebaskerville-regular.woff2", set("Book é")) == data
@@ -0,0 +1,55 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from bookbuild.pod_render import _check_side, _group_html
+
+PRINT_CSS = Path(__file__).resolve().parents[2] / "pub" / "OEBPS" / "style" / "print.css"
+HEAD = "<!DOCTYPE html><html><head></head><body>"
+SECTION = '<section class="chapter-section"><p>Text</p></section>'
+
+
+def page(side):
+    return SimpleNamespace(_page_box=SimpleNamespace(page_type=SimpleNamespace(side=side)))
+
+
+def weasyprint_or_skip():
+    try:
+        return pytest.importorskip("weasyprint")
+    except OSError as e:  # Pango or fontconfig missing
+        pytest.skip(f"WeasyPrint cannot load its libraries: {e}")
+
+
+def test_first_group_needs_no_lead():
+    html, css = _group_html(HEAD, [SECTION], 1)
+    assert "splice-lead" not in html and css == ""
+
+
+@pytest.mark.parametrize("start, lead_side", [(2, "right"), (3, "left"), (10, "right"), (11, "left")])
+def test_lead_sits_opposite_the_first_page(start, lead_side):
+    html, css = _group_html(HEAD, [SECTION], start)
+    assert html.index("splice-lead") < html.index("chapter-section")
+    assert f"break-before: {lead_side} !important" in css
+    assert f"counter-reset: page {start - 1} !important" in css
+
+
+def test_check_side():
+    _check_side(page("right"), 1)
+    _check_side(page("left"), 10)
+    with pytest.raises(RuntimeError, match="page 3 was laid out as a left page"):
+        _check_side(page("left"), 3)
+
+
+@pytest.mark.parametrize("start, lead_side", [(2, "right"), (3, "left")])
+def test_lead_css_beats_print_css(start, lead_side):
+    weasyprint = weasyprint_or_skip()
+    from weasyprint.css import get_all_computed_styles
+
+    head = f"<!DOCTYPE html><html><head><style>{PRINT_CSS.read_text()}</style></head><body>"
+    html, css = _group_html(head, [SECTION], start)
+    document = weasyprint.HTML(string=html, base_url=PRINT_CSS.parent.as_uri() + "/")
+    style_for = get_all_computed_styles(document, user_stylesheets=[weasyprint.CSS(string=css)])
+    root = document.etree_element
+    assert style_for(root)["break_before"] == lead_side
+    assert style_for(root.find(".//section"))["break_after"] == "page"
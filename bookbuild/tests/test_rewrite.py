@@ -0,0 +1,73 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from bookbuild.rewrite import Rule, RuleSet
+
+BUILD_LATEX = Path(__file__).resolve().parents[2] / "pdf" / "build_latex.py"
+
+
+def load_build_latex():
+    spec = importlib.util.spec_from_file_location("build_latex", BUILD_LATEX)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_first_matching_rule_wins():
+    rules = RuleSet([
+        Rule("specific", r"\\foo\{bar\}", "SPECIFIC"),
+        Rule("general", r"\\foo\{(\w+)\}", r"GENERAL(\1)"),
+    ])
+    assert rules.apply(r"\foo{bar} \foo{baz}") == "SPECIFIC GENERAL(baz)"
+    assert rules.counts == {"specific": 1, "general": 1}
+
+
+def test_replaced_text_is_not_scanned_again():
+    rules = RuleSet([Rule("a-to-b", "a", "b"), Rule("b-to-c", "b", "c")])
+    assert rules.apply("ab") == "bc"
+
+
+def test_groups_keep_their_numbers_in_later_rules():
+    rules = RuleSet([
+        Rule("first", r"(x)(y)", r"\2\1"),
+        Rule("second", r"(\d+)-(\d+)", r"\2-\1"),
+    ])
+    assert rules.apply("xy 1-2") == "yx 2-1"
+
+
+def test_replacement_function_gets_the_context():
+    rules = RuleSet([Rule("name", r"<(\w+)>", lambda m, names: names.get(m.group(1), "?"))])
+    assert rules.apply("<a> <b>", names={"a": "A"}) == "A ?"
+
+
+def test_dead_rules_and_reset():
+    rules = RuleSet([Rule("used", "a", "b"), Rule("unused", "z", "y")])
+    rules.apply("aa")
+    assert rules.dead_rules() == ["unused"]
+    assert rules.report() == "used 2, unused 0"
+    rules.reset()
+    assert rules.dead_rules() == ["used", "unused"]
+
+
+def test_duplicate_rule_names():
+    with pytest.raises(ValueError):
+        RuleSet([Rule("same", "a", "b"), Rule("same", "c", "d")])
+
+
+def test_latex_rules_rewrite_svg_to_the_transcoded_pdf():
+    rules = load_build_latex().LATEX_RULES
+    # pandoc 2 and pandoc 3 output
+    assert rules.apply(r"\includegraphics{../images/brushstroke.svg}") == \
+        r"\includegraphics{images/brushstroke.pdf}"
+    assert rules.apply(r"\pandocbounded{\includesvg[keepaspectratio]{../images/brushstroke.svg}}") == \
+        r"\pandocbounded{\includegraphics[keepaspectratio]{images/brushstroke.pdf}}"
+
+
+def test_latex_rules_point_images_at_the_variants():
+    rules = load_build_latex().LATEX_RULES
+    text = r"\includegraphics[width=2in]{../images/cover.jpeg}"
+    assert rules.apply(text) == r"\includegraphics[width=2in]{images/cover.jpeg}"
+    assert rules.apply(text, image_variants={"cover.jpeg": "300dpi/cover.jpeg"}) == \
+        r"\includegraphics[width=2in]{images/300dpi/cover.jpeg}"
@@ -0,0 +1,68 @@
+import pytest
+
+from bookbuild.spine import contiguous_runs, parse_number, select_spine
+
+SPINE = [
+    "xhtml/7-Preface.xhtml",
+    "xhtml/8-Part-I-Foundations.xhtml",
+    "xhtml/9-chapter-i-unveiling.xhtml",
+    "xhtml/10-chapter-ii-refining.xhtml",
+    "xhtml/10a-chapter-ii-quote.xhtml",
+    "xhtml/11-chapter-iii-reigniting.xhtml",
+    "xhtml/12-Part-II-Building.xhtml",
+    "xhtml/13-chapter-iv-networking.xhtml",
+    "xhtml/28-Conclusion.xhtml",
+]
+
+
+def test_parse_number():
+    assert parse_number("14") == 14
+    assert parse_number("XIV") == 14
+    assert parse_number("ix") == 9
+    with pytest.raises(ValueError):
+        parse_number("three")
+
+
+def test_chapter_by_arabic_or_roman_number():
+    assert select_spine(SPINE, ["chapter:3"]) == ["xhtml/11-chapter-iii-reigniting.xhtml"]
+    assert select_spine(SPINE, ["chapter:iii"]) == select_spine(SPINE, ["ch:3"])
+
+
+def test_chapter_range_includes_quote_pages():
+    assert select_spine(SPINE, ["chapter:2-3"]) == [
+        "xhtml/10-chapter-ii-refining.xhtml",
+        "xhtml/10a-chapter-ii-quote.xhtml",
+        "xhtml/11-chapter-iii-reigniting.xhtml",
+    ]
+
+
+def test_part_takes_its_chapters_up_to_the_next_part():
+    assert select_spine(SPINE, ["part:I"]) == SPINE[1:6]
+    assert select_spine(SPINE, ["part:2"]) == SPINE[6:8]
+
+
+def test_file_by_name_stem_or_glob():
+    conclusion = ["xhtml/28-Conclusion.xhtml"]
+    assert select_spine(SPINE, ["28-Conclusion.xhtml"]) == conclusion
+    assert select_spine(SPINE, ["28-Conclusion"]) == conclusion
+    assert select_spine(SPINE, ["28-*"]) == conclusion
+
+
+def test_selection_comes_back_in_spine_order():
+    assert select_spine(SPINE, ["28-Conclusion", "chapter:1", "7-Preface"]) == [
+        "xhtml/7-Preface.xhtml",
+        "xhtml/9-chapter-i-unveiling.xhtml",
+        "xhtml/28-Conclusion.xhtml",
+    ]
+
+
+def test_selector_matching_nothing_is_an_error():
+    with pytest.raises(ValueError, match="chapter:20"):
+        select_spine(SPINE, ["chapter:1", "chapter:20"])
+
+
+def test_contiguous_runs():
+    selected = [SPINE[0], SPINE[2], SPINE[3], SPINE[8]]
+    assert contiguous_runs(SPINE, selected) == [[SPINE[0]], [SPINE[2], SPINE[3]], [SPINE[8]]]
+    assert contiguous_runs(SPINE, SPINE) == [SPINE]
+    assert contiguous_runs(SPINE, []) == []
@@ -0,0 +1,74 @@
+from pathlib import Path
+
+import pytest
+
+from bookbuild.trims import (
+    DEFAULT_TRIM, TRIMS, image_scale, latex_page_setup, page_css, scaled_sizes_css, text_block,
+)
+
+PRINT_CSS = Path(__file__).resolve().parents[2] / "pub" / "OEBPS" / "style" / "print.css"
+
+tinycss2 = pytest.importorskip("tinycss2")
+
+
+def page_margins(css: str) -> dict:
+    """Return {page selector: {property: inches}} for the margin declarations of @page rules."""
+    margins = {}
+    for rule in tinycss2.parse_stylesheet(css, skip_comments=True, skip_whitespace=True):
+        if rule.type != "at-rule" or rule.lower_at_keyword != "page":
+            continue
+        selector = tinycss2.serialize(rule.prelude).strip()
+        for decl in tinycss2.parse_blocks_contents(rule.content, skip_comments=True,
+                                                   skip_whitespace=True):
+            if decl.type == "declaration" and decl.lower_name.startswith("margin-"):
+                value = next(t for t in decl.value if t.type == "dimension")
+                inches = value.value / 72 if value.lower_unit == "pt" else value.value
+                margins.setdefault(selector, {})[decl.lower_name] = round(inches, 4)
+    return margins
+
+
+def test_default_trim_matches_print_css():
+    ours = page_margins(page_css(TRIMS[DEFAULT_TRIM]))
+    theirs = page_margins(PRINT_CSS.read_text())
+    for selector, declarations in theirs.items():
+        for name, inches in declarations.items():
+            assert ours[selector][name] == inches, (selector, name)
+
+
+def test_page_css_puts_the_gutter_on_the_binding_side():
+    trim = TRIMS["large-print"]
+    margins = page_margins(page_css(trim))
+    assert margins[":left"] == {"margin-left": trim["gutter"], "margin-right": trim["outside"]}
+    assert margins[":right"] == {"margin-left": trim["outside"], "margin-right": trim["gutter"]}
+    assert margins[":first"] == {"margin-top": trim["first_top"]}
+    assert "size: 504pt 720pt !important" in page_css(trim)
+
+
+def test_latex_page_setup():
+    setup = latex_page_setup(TRIMS[DEFAULT_TRIM])
+    assert "inner=0.95in" in setup and "outer=0.7in" in setup
+    assert "scrextend" not in setup
+    assert "fontsize=15.4pt" in latex_page_setup(TRIMS["large-print"])
+
+
+def test_text_block_and_image_scale():
+    width, height = text_block(TRIMS[DEFAULT_TRIM])
+    assert width == pytest.approx(4.35) and height == pytest.approx(7.5)
+    assert image_scale([TRIMS[DEFAULT_TRIM]]) == 1
+    assert image_scale([TRIMS[DEFAULT_TRIM], TRIMS["letter"]]) > 1
+
+
+def test_scaled_sizes_scale_absolute_lengths_only():
+    css = scaled_sizes_css(["h1 { font-size: 20pt; color: red } p { font-size: 1.2rem; line-height: 14px }"], 1.5)
+    assert css == ("h1 { font-size: 30pt !important; }\n"
+                   "p { font-size: 1.2rem !important; line-height: 21px !important; }\n")
+
+
+def test_scaled_sizes_keep_media_blocks_and_margin_boxes():
+    css = scaled_sizes_css([
+        "@media print { .note { font-size: 9pt } .rule { border: 1pt solid } }"
+        "@page :first { @bottom-center { content: none; font-size: 10pt } }"
+        "@font-face { font-family: X; src: url(x.woff2) }"
+    ], 2, important=False)
+    assert css == ("@media print {\n.note { font-size: 18pt; }\n}\n"
+                   "@page :first { @bottom-center { font-size: 20pt; } }\n")
@@ -0,0 +1,139 @@
+"""
+Cached transcoding of EPUB assets into formats the LaTeX build can use.
+
+The assets to convert are found through the content.opf manifest by media
+type (SVG -> PDF for \\includegraphics, WOFF2 -> TTF for fontspec), so new
+images or fonts are picked up without touching the build scripts.
+Conversions run concurrently in external tools; their output is stored in
+a content-addressed cache, and an output file is only rewritten when its
+bytes change, so a warm build runs no converters at all. Cache keys
+include the converter's version, so upgrading a tool redoes its outputs.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from .cache import DiskCache, hash_file, hash_parts
+from .files import write_if_changed
+from .opf import read_manifest
+
+# Bump when a converter's command line changes
+TRANSCODE_VERSION = "1"
+
+
+def _svg_to_pdf(src: Path, workdir: Path) -> Path:
+    out = workdir / "out.pdf"
+    subprocess.run(
+        ["rsvg-convert", "-f", "pdf", "-o", str(out), str(src)],
+        check=True, capture_output=True,
+    )
+    return out
+
+
+def _woff2_to_ttf(src: Path, workdir: Path) -> Path:
+    # woff2_decompress always writes next to its input
+    staged = workdir / "font.woff2"
+    shutil.copyfile(src, staged)
+    subprocess.run(["woff2_decompress", str(staged)], check=True, capture_output=True)
+    return workdir / "font.ttf"
+
+
+# media type -> (output suffix, tool, converter)
+TRANSCODERS = {
+    "image/svg+xml": (".pdf", "rsvg-convert", _svg_to_pdf),
+    "font/woff2": (".ttf", "woff2_decompress", _woff2_to_ttf),
+    "application/font-woff2": (".ttf", "woff2_decompress", _woff2_to_ttf),
+}
+
+
+@lru_cache(maxsize=None)
+def tool_version(tool: str) -> str:
+    """
+    Identify an installed converter for cache keys.
+
+    Combines the first line of `tool --version` with the location and mtime
+    of the executable, which changes on upgrade even for tools without a
+    --version option (woff2_decompress).
+    """
+    path = shutil.which(tool)
+    if path is None:
+        return f"{tool} not installed"
+    result = subprocess.run([path, "--version"], capture_output=True, text=True)
+    lines = (result.stdout or result.stderr).splitlines()
+    path = os.path.realpath(path)
+    return "\n".join([lines[0] if lines else "", f"{path}:{os.stat(path).st_mtime_ns}"])
+
+
+def transcode_cache(enabled: bool = True) -> DiskCache:
+    """Return the shared cache for transcoded assets."""
+    return DiskCache("transcode", enabled=enabled)
+
+
+def manifest_assets(opf_path: Path) -> list:
+    """
+    Return (href, media type) for each manifest item that needs transcoding.
+
+    hrefs are relative to the directory holding content.opf.
+    """
+    return [(href, media_type) for _, href, media_type in read_manifest(opf_path)
+            if media_type in TRANSCODERS]
+
+
+def transcode_asset(src: Path, media_type: str, cache: DiskCache = None) -> bytes:
+    """Convert one asset, reusing cached output when the source is unchanged."""
+    suffix, tool, converter = TRANSCODERS[media_type]
+    key = hash_parts("transcode", TRANSCODE_VERSION, media_type, tool_version(tool), hash_file(src))
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    if shutil.which(tool) is None:
+        raise RuntimeError(f"{tool} not found")
+    with tempfile.TemporaryDirectory(prefix="transcode-") as workdir:
+        data = converter(src, Path(workdir)).read_bytes()
+
+    if cache is not None:
+        cache.put(key, data)
+    return data
+
+
+def transcode_assets(opf_path: Path, dest_dir: Path, jobs: int = None,
+                     cache: DiskCache = None) -> tuple:
+    """
+    Transcode every convertible manifest asset into dest_dir.
+
+    Outputs keep the manifest's layout (images/brushstroke.svg ->
+    dest_dir/images/brushstroke.pdf). A failed conversion is recorded and
+    does not stop the others.
+
+    Returns (written, unchanged, errors) where errors maps href -> exception.
+    """
+    opf_path, dest_dir = Path(opf_path), Path(dest_dir)
+    assets = [(href, media_type) for href, media_type in manifest_assets(opf_path)
+              if (opf_path.parent / href).is_file()]
+
+    written, unchanged, errors = [], [], {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            href: pool.submit(transcode_asset, opf_path.parent / href, media_type, cache)
+            for href, media_type in assets
+        }
+        for href, media_type in assets:
+            out_path = dest_dir / Path(href).with_suffix(TRANSCODERS[media_type][0])
+            try:
+                data = futures[href].result()
+            except (OSError, RuntimeError, subprocess.CalledProcessError) as e:
+                errors[href] = e
+                continue
+            if write_if_changed(out_path, data):
+                written.append(out_path)
+            else:
+                unchanged.append(out_path)
+
+    return written, unchanged, errors
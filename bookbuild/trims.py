@@ -0,0 +1,193 @@
+"""
+Trim-size variants of the printed book.
+
+Each variant is plain data: page size, margins (gutter is the inside,
+binding-side margin) and a scale for the body text size. Both PDF
+pipelines generate their page setup from it: @page rules for the WeasyPrint
+build, the geometry package options for the LaTeX build. The 6x9 entry
+restates print.css's page setup, so that trim renders as print.css alone
+would and the LaTeX build shares its margins.
+
+The LaTeX build scales its text with the body size. print.css sets most
+sizes in points, so for the WeasyPrint build scaled_sizes_css() restates
+every font-size and line-height of the stylesheets with absolute lengths
+scaled.
+"""
+
+DEFAULT_TRIM = "6x9"
+
+# Body text size of the 6x9 book (print.css and \documentclass[11pt])
+BASE_FONT_PT = 11
+
+# name -> inches, except font_scale; first_top is the top margin of the first page
+TRIMS = {
+    # Keep in step with @page in print.css
+    "6x9": {
+        "width": 6.0, "height": 9.0,
+        "top": 0.75, "bottom": 0.75, "gutter": 0.95, "outside": 0.70,
+        "first_top": 0.75, "font_scale": 1.0,
+    },
+    "5.5x8.5": {
+        "width": 5.5, "height": 8.5,
+        "top": 0.7, "bottom": 0.7, "gutter": 0.8, "outside": 0.55,
+        "first_top": 0.9, "font_scale": 0.95,
+    },
+    "letter": {
+        "width": 8.5, "height": 11.0,
+        "top": 1.0, "bottom": 1.0, "gutter": 1.125, "outside": 0.875,
+        "first_top": 1.25, "font_scale": 1.1,
+    },
+    "large-print": {
+        "width": 7.0, "height": 10.0,
+        "top": 0.75, "bottom": 0.75, "gutter": 0.875, "outside": 0.625,
+        "first_top": 1.0, "font_scale": 1.4,
+    },
+}
+
+
+# Lengths that do not follow the root font size
+ABSOLUTE_UNITS = {"pt", "px", "pc", "in", "cm", "mm", "q"}
+SIZE_PROPERTIES = {"font-size", "line-height"}
+GROUPING_AT_RULES = {"media", "supports"}
+
+
+def _pt(inches: float) -> str:
+    return f"{inches * 72:g}pt"
+
+
+def text_block(trim: dict) -> tuple:
+    """Return the (width, height) of the text block in inches."""
+    return (trim["width"] - trim["gutter"] - trim["outside"],
+            trim["height"] - trim["top"] - trim["bottom"])
+
+
+def image_scale(trims: list, base: str = DEFAULT_TRIM) -> float:
+    """How much larger than on the base trim images can be placed on any of trims."""
+    base_width, base_height = text_block(TRIMS[base])
+    return max(max(width / base_width, height / base_height)
+               for width, height in map(text_block, trims))
+
+
+def page_css(trim: dict) -> str:
+    """
+    Return the @page rules for the WeasyPrint build.
+
+    The rules are passed as a user stylesheet, which loses to print.css
+    unless marked !important. Text sizes come from scaled_sizes_css().
+    """
+    css = f"""
+    @page {{
+        size: {_pt(trim["width"])} {_pt(trim["height"])} !important;
+        margin-top: {_pt(trim["top"])} !important;
+        margin-bottom: {_pt(trim["bottom"])} !important;
+        margin-left: {_pt(trim["outside"])} !important;
+        margin-right: {_pt(trim["outside"])} !important;
+        marks: none !important;
+    }}
+
+    @page :left {{
+        margin-left: {_pt(trim["gutter"])} !important;
+        margin-right: {_pt(trim["outside"])} !important;
+    }}
+
+    @page :right {{
+        margin-left: {_pt(trim["outside"])} !important;
+        margin-right: {_pt(trim["gutter"])} !important;
+    }}
+
+    @page :first {{
+        margin-top: {_pt(trim["first_top"])} !important;
+        marks: none !important;
+    }}
+"""
+    return css
+
+
+def _scaled_value(tokens, scale: float) -> str:
+    import tinycss2
+
+    parts = []
+    for token in tokens:
+        if token.type == "dimension" and token.lower_unit in ABSOLUTE_UNITS:
+            parts.append(f"{token.value * scale:g}{token.unit}")
+        else:
+            parts.append(tinycss2.serialize([token]))
+    return "".join(parts).strip()
+
+
+def _scaled_block(content, scale: float, important: bool) -> str:
+    """Return the scaled size declarations (and @page margin boxes) of a rule body."""
+    import tinycss2
+
+    parts = []
+    for item in tinycss2.parse_blocks_contents(content, skip_comments=True, skip_whitespace=True):
+        if item.type == "declaration" and item.lower_name in SIZE_PROPERTIES:
+            flag = " !important" if important or item.important else ""
+            parts.append(f"{item.lower_name}: {_scaled_value(item.value, scale)}{flag};")
+        elif item.type == "at-rule" and item.content is not None:
+            inner = _scaled_block(item.content, scale, important)
+            if inner:
+                parts.append(f"@{item.at_keyword} {{ {inner} }}")
+    return " ".join(parts)
+
+
+def _scaled_rules(rules, scale: float, important: bool) -> list:
+    import tinycss2
+
+    parts = []
+    for rule in rules:
+        if rule.type == "qualified-rule":
+            block = _scaled_block(rule.content, scale, important)
+            if block:
+                parts.append(f"{tinycss2.serialize(rule.prelude).strip()} {{ {block} }}")
+        elif rule.type == "at-rule" and rule.content is not None:
+            prelude = tinycss2.serialize(rule.prelude)
+            if rule.lower_at_keyword == "page":
+                block = _scaled_block(rule.content, scale, important)
+                if block:
+                    parts.append(f"@page{prelude}{{ {block} }}")
+            elif rule.lower_at_keyword in GROUPING_AT_RULES:
+                inner = _scaled_rules(tinycss2.parse_rule_list(
+                    rule.content, skip_comments=True, skip_whitespace=True), scale, important)
+                if inner:
+                    parts.append(f"@{rule.at_keyword}{prelude}{{\n" + "\n".join(inner) + "\n}")
+    return parts
+
+
+def scaled_sizes_css(stylesheets: list, scale: float, important: bool = True) -> str:
+    """
+    Return rules that scale the text of stylesheets (CSS strings) by scale.
+
+    Every rule that sets font-size or line-height is repeated with those
+    declarations alone, absolute lengths multiplied and relative ones
+    (em, rem, %, unitless) unchanged. Restating the relative values keeps
+    the overrides in the same cascade order as the originals. With
+    important, the rules beat the author stylesheets from a user
+    stylesheet; without it they only follow rules of their own origin.
+    """
+    import tinycss2
+
+    parts = []
+    for css in stylesheets:
+        rules = tinycss2.parse_stylesheet(css, skip_comments=True, skip_whitespace=True)
+        parts.extend(_scaled_rules(rules, scale, important))
+    return "\n".join(parts) + "\n"
+
+
+def latex_page_setup(trim: dict) -> str:
+    """Return the geometry (and body size) packages for the LaTeX preamble."""
+    setup = f"""\\usepackage[
+    paperwidth={trim["width"]:g}in,
+    paperheight={trim["height"]:g}in,
+    inner={trim["gutter"]:g}in,
+    outer={trim["outside"]:g}in,
+    top={trim["top"]:g}in,
+    bottom={trim["bottom"]:g}in,
+    footskip=0.4in
+]{{geometry}}
+"""
+    if trim["font_scale"] != 1:
+        # The book class only offers 10/11/12pt; scrextend sets any size
+        size = f"{BASE_FONT_PT * trim['font_scale']:g}pt"
+        setup += f"\\usepackage[fontsize={size}]{{scrextend}}\n"
+    return setup
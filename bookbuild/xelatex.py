@@ -0,0 +1,251 @@
+"""
+Convergence-driven xelatex pass scheduler.
+
+Instead of a fixed number of xelatex runs, each pass is run with -no-pdf and
+the cross-reference state (.aux/.toc/.out, including the per-chapter .aux
+files written by \\include) is hashed before and after. Once a pass leaves
+that state unchanged, its .xdv is final and xdvipdfmx turns it into the PDF,
+so only the last step pays for the PDF backend.
+
+The package-loading part of the preamble (everything before
+FORMAT_MARKER) can be dumped into a precompiled format with mylatexformat,
+so passes start from a loaded preamble instead of re-reading ~30 packages.
+Fonts are selected after the marker because XeTeX cannot dump native fonts.
+
+Passes and xdvipdfmx run with SOURCE_DATE_EPOCH set (see
+artifacts.source_date_epoch()), so the PDF's dates and /ID are fixed and the
+same sources always compile to the same bytes.
+"""
+
+import os
+import subprocess
+from pathlib import Path
+
+from .artifacts import source_date_epoch
+from .cache import hash_parts
+
+STATE_SUFFIXES = (".aux", ".toc", ".out")
+# Files below the document's directory that a compile can read
+INPUT_SUFFIXES = (".tex", ".sty", ".cls", ".bib", ".png", ".jpg", ".jpeg", ".pdf", ".ttf", ".otf")
+DEFAULT_MAX_PASSES = 5
+FORMAT_MARKER = r"\csname endofdump\endcsname"
+
+
+class LatexError(RuntimeError):
+    """Raised when xelatex or xdvipdfmx fails to produce output."""
+
+
+def state_files(tex_path: Path) -> list:
+    """Return the cross-reference files of a document; some may not exist yet."""
+    workdir = tex_path.parent
+    files = [tex_path.with_suffix(suffix) for suffix in STATE_SUFFIXES]
+    # \include'd files keep their own .aux next to the .tex
+    files += sorted(workdir.glob("*/*.aux"))
+    return files
+
+
+def aux_state(tex_path: Path) -> str:
+    """Hash the cross-reference files that a pass reads and writes."""
+    workdir = tex_path.parent
+    parts = []
+    for path in state_files(tex_path):
+        parts.append(str(path.relative_to(workdir)))
+        parts.append(path.read_bytes() if path.exists() else b"<missing>")
+    return hash_parts(*parts)
+
+
+def document_inputs(tex_path: Path) -> list:
+    """
+    Return the files a compile of tex_path can read, for artifact keys.
+
+    Those are the .tex files next to it and the input files in the
+    directories below it (converted chapters, images, fonts); PDFs next to
+    the document are outputs.
+    """
+    workdir = Path(tex_path).parent
+    files = sorted(workdir.glob("*.tex"))
+    files += sorted(p for p in workdir.glob("*/**/*")
+                    if p.is_file() and p.suffix.lower() in INPUT_SUFFIXES)
+    return files
+
+
+def reproducible_env() -> dict:
+    """Return the environment for xelatex and xdvipdfmx, with the source date pinned."""
+    env = dict(os.environ)
+    env["SOURCE_DATE_EPOCH"] = str(source_date_epoch())
+    env["FORCE_SOURCE_DATE"] = "1"
+    return env
+
+
+def tex_distribution_id() -> str:
+    """
+    Identify the installed TeX distribution for format cache keys.
+
+    Combines the xelatex version line with the location and mtime of the
+    base xelatex.fmt, which fmtutil regenerates whenever packages or the
+    engine are updated.
+    """
+    version = subprocess.run(["xelatex", "--version"], capture_output=True, text=True, check=True)
+    parts = [version.stdout.splitlines()[0]]
+    base_fmt = subprocess.run(
+        ["kpsewhich", "-engine=xetex", "xelatex.fmt"], capture_output=True, text=True
+    ).stdout.strip()
+    if base_fmt and os.path.exists(base_fmt):
+        parts.append(f"{base_fmt}:{os.stat(base_fmt).st_mtime_ns}")
+    return "\n".join(parts)
+
+
+def dumped_preamble(tex_path: Path):
+    """Return the part of the preamble that goes into the format, or None."""
+    text = tex_path.read_text(encoding="utf-8")
+    end = text.find(FORMAT_MARKER)
+    if end == -1:
+        return None
+    return text[:end]
+
+
+def ensure_format(tex_path: Path, log=print):
+    """
+    Build, or reuse, a precompiled format for tex_path's preamble.
+
+    The format is kept next to the document as <stem>-preamble.fmt together
+    with a .key file holding the hash of the dumped preamble text and the TeX
+    distribution id; it is rebuilt only when either changes. Returns the
+    format name to pass to -fmt, or None if no format could be made.
+    """
+    preamble = dumped_preamble(tex_path)
+    if preamble is None:
+        log(f"  No {FORMAT_MARKER} in {tex_path.name}; compiling without a format")
+        return None
+
+    name = f"{tex_path.stem}-preamble"
+    fmt_path = tex_path.with_name(f"{name}.fmt")
+    key_path = tex_path.with_name(f"{name}.key")
+    key = hash_parts(preamble, tex_distribution_id())
+
+    if fmt_path.exists() and key_path.exists() and key_path.read_text() == key:
+        log(f"  Using precompiled preamble: {fmt_path.name}")
+        return name
+
+    log(f"  Building precompiled preamble: {fmt_path.name}")
+    key_path.unlink(missing_ok=True)
+    result = subprocess.run(
+        [
+            "xelatex",
+            "-ini",
+            "-interaction=nonstopmode",
+            f"-jobname={name}",
+            "&xelatex",
+            "mylatexformat.ltx",
+            tex_path.name,
+        ],
+        cwd=tex_path.parent,
+        capture_output=True,
+        text=True,
+        errors="replace",
+    )
+    if result.returncode != 0 or not fmt_path.exists():
+        log(f"  Warning: could not build {fmt_path.name} (exit code {result.returncode}); "
+            f"compiling without a format")
+        return None
+
+    key_path.write_text(key)
+    return name
+
+
+def log_tail(tex_path: Path, lines: int = 20) -> str:
+    """Return the last lines of the xelatex log, for error reports."""
+    log_path = tex_path.with_suffix(".log")
+    if not log_path.exists():
+        return ""
+    text = log_path.read_text(encoding="utf-8", errors="replace")
+    return "\n".join(text.splitlines()[-lines:])
+
+
+def run_pass(tex_path: Path, extra_args: list = None) -> int:
+    """Run one xelatex -no-pdf pass. Returns the exit code."""
+    result = subprocess.run(
+        [
+            "xelatex",
+            "-interaction=nonstopmode",
+            "-no-pdf",
+            *(extra_args or []),
+            tex_path.name,
+        ],
+        cwd=tex_path.parent,
+        env=reproducible_env(),
+        capture_output=True,
+        text=True,
+        errors="replace",
+    )
+    return result.returncode
+
+
+def make_pdf(tex_path: Path) -> Path:
+    """Convert the final .xdv to PDF with xdvipdfmx."""
+    xdv_path = tex_path.with_suffix(".xdv")
+    pdf_path = tex_path.with_suffix(".pdf")
+    if not xdv_path.exists():
+        raise LatexError(f"xelatex produced no {xdv_path.name}\n{log_tail(tex_path)}")
+
+    # Same flags xelatex passes to xdvipdfmx when it makes the PDF itself
+    result = subprocess.run(
+        ["xdvipdfmx", "-q", "-E", "-o", pdf_path.name, xdv_path.name],
+        cwd=tex_path.parent,
+        env=reproducible_env(),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise LatexError(f"xdvipdfmx failed: {result.stderr.strip()}")
+    return pdf_path
+
+
+def compile_latex(tex_path: Path, max_passes: int = DEFAULT_MAX_PASSES,
+                  extra_args: list = None, use_format: bool = True, log=print) -> tuple:
+    """
+    Compile tex_path to PDF, running only as many passes as needed.
+
+    With use_format, passes run against the precompiled preamble from
+    ensure_format() when one can be built.
+
+    Errors in a pass are tolerated while the cross-references are still
+    settling (as the old `|| true` passes did); an error in the last pass
+    raises LatexError. If max_passes is reached without convergence the PDF
+    is still produced from the last pass, with a warning.
+
+    Returns (pdf_path, passes, converged).
+    """
+    tex_path = Path(tex_path).resolve()
+    extra_args = list(extra_args or [])
+    if use_format:
+        fmt = ensure_format(tex_path, log)
+        if fmt:
+            extra_args.append(f"-fmt={fmt}")
+
+    state = aux_state(tex_path)
+    converged = False
+    returncode = 0
+    passes = 0
+
+    while passes < max_passes:
+        passes += 1
+        returncode = run_pass(tex_path, extra_args)
+        new_state = aux_state(tex_path)
+        converged = new_state == state
+        state = new_state
+
+        status = "stable" if converged else "changed"
+        errors = "" if returncode == 0 else f", exit code {returncode}"
+        log(f"  Pass {passes} (no PDF): cross-references {status}{errors}")
+        if converged:
+            break
+
+    if returncode != 0:
+        raise LatexError(f"xelatex failed on pass {passes}\n{log_tail(tex_path)}")
+    if not converged:
+        log(f"  Warning: cross-references still changing after {passes} passes")
+
+    log("  Writing PDF with xdvipdfmx...")
+    pdf_path = make_pdf(tex_path)
+    return pdf_path, passes, converged
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Keep the POD and LaTeX builds warm between runs.
+
+    ./build-daemon.py serve &                 start the daemon
+    ./build-daemon.py pod [--trim ...]        generate-pod-pdf.py on the daemon
+    ./build-daemon.py preview chapter:3       POD preview of part of the spine
+    ./build-daemon.py latex [--only ...]      pdf/build_latex.py on the daemon
+    ./build-daemon.py stop
+
+The daemon imports WeasyPrint and the build scripts once, keeps one font
+configuration with the book's fonts loaded, the parsed stylesheets and
+the parsed spine files between renders (rebuilt when a file changes), and
+serves requests on a Unix domain socket (.cache/build-daemon.sock), so
+back-to-back previews skip the startup cost. Only renders in the daemon
+process itself use the warm state: --jobs and multi-trim renders start
+fresh worker processes. The arguments are those of the scripts
+themselves; all output, including that of tools and worker processes,
+streams back to the client.
+"""
+
+import sys
+import argparse
+import importlib.util
+from pathlib import Path
+
+from bookbuild.daemon import DEFAULT_SOCKET, request, serve
+
+REPO_ROOT = Path(__file__).parent
+SCRIPTS = {
+    "pod": REPO_ROOT / "generate-pod-pdf.py",
+    "latex": REPO_ROOT / "pdf" / "build_latex.py",
+}
+
+
+def load_script(name: str, path: Path):
+    """Import a build script (file names with dashes are not importable by name)."""
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_daemon(socket_path: Path) -> None:
+    """Load the build scripts, warm WeasyPrint and serve requests."""
+    from bookbuild import pod_render
+
+    print("Loading build scripts...")
+    pod = load_script("generate_pod_pdf", SCRIPTS["pod"])
+    latex = load_script("build_latex", SCRIPTS["latex"])
+    try:
+        pod_render.keep_warm()
+    except (ImportError, OSError) as e:
+        print(f"Warning: WeasyPrint is not usable, POD builds will fail: {e}")
+
+    commands = {
+        "pod": pod.main,
+        "preview": lambda args: pod.main(["--only", *args]),
+        "latex": latex.main,
+    }
+    print(f"Listening on {socket_path}")
+    try:
+        serve(commands, socket_path)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print("Stopped")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(
+        description="Warm build daemon for the POD and LaTeX builds.",
+        epilog="Arguments after the command go to the build script; "
+               "'preview SELECTOR ...' is 'pod --only SELECTOR ...'.",
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        default=DEFAULT_SOCKET,
+        help=f"Unix socket path (default: {DEFAULT_SOCKET})",
+    )
+    parser.add_argument("command", choices=["serve", "pod", "preview", "latex", "stop"])
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    if args.command == "preview" and not args.args:
+        parser.error("preview needs a spine selector, e.g. chapter:3")
+    return args
+
+
+def main(argv=None):
+    """Main entry point."""
+    args = parse_args(argv)
+    if args.command == "serve":
+        run_daemon(args.socket)
+        return
+
+    try:
+        status = request(args.command, args.args, args.socket)
+    except (ConnectionError, FileNotFoundError):
+        print(f"Error: no daemon listening on {args.socket} (start one with: "
+              f"{Path(sys.argv[0]).name} serve)")
+        sys.exit(3)
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Build every release output of 'Curls & Contemplation' in one run.
+
+The build scripts are stages of one dependency graph (see bookbuild/dag.py):
+
+    spine --+-- transcode -- latex-convert -- xelatex -- latex-optimize
+            +-- pod-render -- pod-optimize
+            +-- epub
+
+Independent branches run concurrently under a global CPU limit (--jobs),
+so the release takes as long as its longest branch rather than the sum of
+all steps. A failed stage only stops the stages after it; the other
+outputs are still built. Each stage's output goes to .cache/release-logs/.
+The scripts keep their finished outputs in .cache/artifacts/ (see
+bookbuild/artifacts.py), so stages whose inputs did not change restore
+them instead of rebuilding.
+
+Outputs: pdf/CurlsAndContemplation-master.pdf,
+CurlsAndContemplation-POD-<trim>.pdf, CurlsAndContemplation.epub
+"""
+
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+from bookbuild.cache import CACHE_ROOT
+from bookbuild.dag import FAILED, Stage, critical_path, run_stages
+from bookbuild.opf import get_spine_order
+from bookbuild.pdf_optimize import format_size, optimize_pdf
+from bookbuild.trims import DEFAULT_TRIM, TRIMS
+
+REPO_ROOT = Path(__file__).parent
+PDF_DIR = REPO_ROOT / "pdf"
+OPF_PATH = REPO_ROOT / "pub" / "OEBPS" / "content.opf"
+LATEX_PDF = PDF_DIR / "CurlsAndContemplation-master.pdf"
+# Output name of generate-pod-pdf.py for a trim
+POD_PDF = "CurlsAndContemplation-POD-{trim}.pdf"
+
+
+def check_spine(opf_path: Path) -> str:
+    """Stage: read the spine and check that every file exists."""
+    spine_files = get_spine_order(opf_path)
+    missing = [f for f in spine_files if not (opf_path.parent / f).is_file()]
+    if missing:
+        raise FileNotFoundError(f"spine files missing: {', '.join(missing)}")
+    return f"{len(spine_files)} spine files"
+
+
+def optimize_files(paths: list, linearize: bool) -> str:
+    """Stage: optimize finished PDFs in place (see bookbuild/pdf_optimize.py)."""
+    lines = []
+    for path in map(Path, paths):
+        data = path.read_bytes()
+        optimized, merged = optimize_pdf(data, linearize)
+        path.write_bytes(optimized)
+        lines.append(f"{path.name}: {format_size(len(data))} -> {format_size(len(optimized))} "
+                     f"({merged} duplicate streams merged)")
+    return "\n".join(lines)
+
+
+def build_stages(args) -> list:
+    """Return the release build graph for the chosen outputs."""
+    python = sys.executable
+    # Stages with their own worker pools share the machine with the other branches
+    pool = max(1, args.jobs // 2)
+    proof = ["--proof"] if args.proof else []
+
+    stages = [Stage("spine", func=check_spine, args=(OPF_PATH,))]
+    if not args.no_latex:
+        stages += [
+            Stage("transcode", [python, PDF_DIR / "transcode_assets.py", "-j", pool],
+                  deps=["spine"], cwd=PDF_DIR, slots=pool),
+            # build_latex.py also transcodes; after the stage above it is all cache hits
+            Stage("latex-convert", [python, PDF_DIR / "build_latex.py", "-j", pool, *proof],
+                  deps=["transcode"], cwd=PDF_DIR, slots=pool),
+            Stage("xelatex", [python, PDF_DIR / "compile_latex.py"],
+                  deps=["latex-convert"], cwd=PDF_DIR),
+        ]
+        if args.optimize:
+            stages.append(Stage("latex-optimize", func=optimize_files,
+                                args=([LATEX_PDF], args.linearize), deps=["xelatex"]))
+    if not args.no_pod:
+        variants = min(len(args.trim), args.jobs)
+        trims = [f"--trim={trim}" for trim in args.trim]
+        stages.append(Stage("pod-render",
+                            [python, REPO_ROOT / "generate-pod-pdf.py", *trims, *proof,
+                             "-j", variants],
+                            deps=["spine"], cwd=REPO_ROOT, slots=variants))
+        if args.optimize:
+            outputs = [REPO_ROOT / POD_PDF.format(trim=trim) for trim in args.trim]
+            stages.append(Stage("pod-optimize", func=optimize_files,
+                                args=(outputs, args.linearize), deps=["pod-render"]))
+    if not args.no_epub:
+        stages.append(Stage("epub", [python, REPO_ROOT / "package-epub.py"],
+                            deps=["spine"], cwd=REPO_ROOT))
+    return stages
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Build the LaTeX PDF, POD PDFs and EPUB concurrently.")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="CPUs the build may use across all stages (default: CPU count)",
+    )
+    parser.add_argument(
+        "--trim",
+        action="append",
+        choices=list(TRIMS),
+        help=f"POD trim size; repeatable (default: {DEFAULT_TRIM})",
+    )
+    parser.add_argument(
+        "--proof",
+        action="store_true",
+        help="resample images at proof resolution in both PDF builds",
+    )
+    parser.add_argument(
+        "--no-optimize",
+        dest="optimize",
+        action="store_false",
+        help="skip the PDF post-processing stages",
+    )
+    parser.add_argument(
+        "--linearize",
+        action="store_true",
+        help="linearize the optimized PDFs for fast web view",
+    )
+    parser.add_argument("--no-latex", action="store_true", help="skip the LaTeX PDF")
+    parser.add_argument("--no-pod", action="store_true", help="skip the POD PDFs")
+    parser.add_argument("--no-epub", action="store_true", help="skip the EPUB")
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.linearize and not args.optimize:
+        parser.error("--linearize needs the optimize stages")
+    args.trim = list(dict.fromkeys(args.trim or [DEFAULT_TRIM]))
+    return args
+
+
+def main(argv=None):
+    """Main entry point."""
+    args = parse_args(argv)
+    stages = build_stages(args)
+    log_dir = CACHE_ROOT / "release-logs"
+
+    print("=" * 60)
+    print(f"Release build: {len(stages)} stages, {args.jobs} CPUs")
+    print("=" * 60)
+    start = time.monotonic()
+    results = run_stages(stages, args.jobs, log_dir)
+    wall = time.monotonic() - start
+
+    print()
+    for stage in stages:
+        status, seconds = results[stage.name]
+        print(f"  {stage.name:<16} {status:<8} {seconds:6.1f}s")
+    total = sum(seconds for _, seconds in results.values())
+    path_seconds, path = critical_path(stages, results)
+    print()
+    print(f"Wall time {wall:.1f}s; stages total {total:.1f}s; "
+          f"critical path {path_seconds:.1f}s ({' -> '.join(path)})")
+    print(f"Logs: {log_dir}")
+
+    failed = [name for name, (status, _) in results.items() if status == FAILED]
+    if failed:
+        print(f"FAILED: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
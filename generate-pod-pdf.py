@@ -1,97 +1,215 @@
 #!/usr/bin/env python3
 """
-Generate 6x9" Print-on-Demand PDF from EPUB source files.
+Generate Print-on-Demand PDFs (6x9" by default) from EPUB source files.
 
 This script combines all XHTML content files in spine order and renders
 them to a single PDF using WeasyPrint with print.css for proper POD formatting.
+The combined document is handed to WeasyPrint in memory, keeping the
+EPUB's relative URLs; a caching url_fetcher resolves them against pub/OEBPS.
+Style rules that match no element of the book are dropped before rendering,
+and the web fonts are served as subsets holding only the characters used.
+Pass --keep-intermediate to also write it to pod-combined.html.
 
-Output: CurlsAndContemplation-POD-6x9.pdf
+The book is laid out once; the PDF, the page report and, on request, PNG
+page previews (--previews) and a page -> spine file map (--page-map) are
+all derived from that one layout.
+
+Several trim sizes (--trim, see bookbuild/trims.py) can be built in one run:
+the combined HTML, pruned CSS and resampled images are prepared once and
+each variant is rendered in its own process.
+
+Finished PDFs are stored in .cache/artifacts/ under a hash of the sources,
+the build code, the trim CSS, the options and the tool versions; a full
+build of unchanged inputs restores the stored PDF instead of rendering.
+
+Output: CurlsAndContemplation-POD-<trim>.pdf (CurlsAndContemplation-POD-6x9.pdf)
 """
 
+import io
+import json
 import os
 import sys
+import argparse
 from pathlib import Path
-from xml.etree import ElementTree as ET
-
-# Register EPUB namespaces
-NAMESPACES = {
-    'opf': 'http://www.idpf.org/2007/opf',
-    'dc': 'http://purl.org/dc/elements/1.1/'
-}
-
-def get_spine_order(opf_path: Path) -> list[str]:
-    """Extract the reading order from content.opf spine."""
-    tree = ET.parse(opf_path)
-    root = tree.getroot()
-
-    # Build manifest ID -> href mapping
-    manifest = {}
-    for item in root.findall('.//opf:manifest/opf:item', NAMESPACES):
-        item_id = item.get('id')
-        href = item.get('href')
-        if item_id and href:
-            manifest[item_id] = href
 
-    # Get spine order
-    spine_items = []
-    for itemref in root.findall('.//opf:spine/opf:itemref', NAMESPACES):
-        idref = itemref.get('idref')
-        if idref and idref in manifest:
-            spine_items.append(manifest[idref])
-
-    return spine_items
-
-
-def create_combined_html(oebps_path: Path, spine_files: list[str], output_path: Path) -> None:
-    """Create a single HTML file combining all spine content in order."""
+from lxml import etree
+
+from bookbuild.artifacts import (
+    artifact_cache, artifact_key, code_digest, package_versions, restore_artifact, tree_digest,
+)
+from bookbuild.cache import CACHE_ROOT, DiskCache, hash_parts
+from bookbuild.css_prune import css_cache, prune_stylesheets
+from bookbuild.document import document_cache, load_document
+from bookbuild.fetcher import CachingFetcher
+from bookbuild.font_subset import font_cache, subset_fonts
+from bookbuild.images import PRINT_DPI, PROOF_DPI, image_cache, optimize_images, variant_dir_name
+from bookbuild.opf import get_spine_order
+from bookbuild.pdf_optimize import format_size, optimize_pdf
+from bookbuild.pod_outputs import (
+    load_first_pages, page_report, pdf_page_map, rasterize_pages, save_first_pages, section_id,
+    write_page_map,
+)
+from bookbuild.pod_render import (
+    BYTES_PER_PAGE, page_count_cache, render_document, render_parallel, render_runs, render_variants,
+    renderer_version, splice_pdfs,
+)
+from bookbuild.spine import contiguous_runs, select_spine
+from bookbuild.trims import DEFAULT_TRIM, TRIMS, image_scale, page_css, scaled_sizes_css
+
+
+# Additional CSS for proper page breaks and fix problematic floats
+# NOTE: For POD, we use the exact trim size WITHOUT crop marks
+# POD services add their own bleed/marks during production
+# Page size and margins come from the trim variant (see pod_css())
+POD_CSS = '''
+    @page :blank {
+        marks: none !important;
+    }
+
+    section.chapter-section {
+        page-break-before: always;
+        break-before: page;
+    }
+
+    section.chapter-section:first-of-type {
+        page-break-before: avoid;
+        break-before: avoid;
+    }
+
+    /* Fix: Remove problematic float on drop caps that causes assertion error */
+    .introduction-paragraph p:first-of-type strong:first-child,
+    .dropcap-first-letter p:first-of-type strong:first-child,
+    p.intro-text:first-of-type::first-letter {
+        float: none !important;
+        display: inline;
+        font-size: 24pt;
+        font-weight: bold;
+    }
+
+    /* Ensure images don't break PDF generation */
+    img {
+        max-width: 100%;
+        height: auto;
+    }
+
+    /* Fix flex containers for WeasyPrint compatibility */
+    .title-page-body,
+    .copyright-body,
+    .dedication-page,
+    .chap-title,
+    .part-body,
+    .part-page,
+    .quote-page,
+    .image-quote {
+        display: block;
+    }
+'''
+
+
+def pod_css(trim: str, stylesheets: list[str]) -> str:
+    """Return the POD stylesheet for a trim-size variant of the book's stylesheets."""
+    css = page_css(TRIMS[trim]) + POD_CSS
+    scale = TRIMS[trim]['font_scale']
+    if scale != 1:
+        # The book's sizes are overridden; POD_CSS's own only follow it
+        css += scaled_sizes_css(stylesheets, scale) + scaled_sizes_css([POD_CSS], scale, important=False)
+    return css
+
+
+def pdf_output_name(trim: str, preview: bool = False) -> str:
+    """Return the output file name for a trim-size variant."""
+    return f'CurlsAndContemplation-POD-{trim}{"-preview" if preview else ""}.pdf'
+
+
+def prepare_images(oebps_path: Path, dpi: int, scale: float = 1.0) -> dict[str, Path]:
+    """
+    Resample the book's raster images for the page; returns name -> variant path.
+
+    scale enlarges the 6x9 placement sizes; one set serves every trim built.
+    """
+    variant_dir = CACHE_ROOT / 'pod-images' / variant_dir_name(dpi, scale)
+    sources = sorted(p for p in (oebps_path / 'images').iterdir() if p.is_file())
+    variants = optimize_images(sources, variant_dir, dpi, cache=image_cache(), scale=scale)
+    if variants:
+        print(f"  {len(variants)} images at {dpi} DPI in {variant_dir}")
+    return variants
+
+
+def document_base_url(oebps_path: Path) -> str:
+    """Base URL that resolves the chapters' ../images/ and ../fonts/ URLs."""
+    return (oebps_path.resolve() / 'xhtml').as_uri() + '/'
+
+
+def rewrite_body(body) -> None:
+    """
+    Prepare a parsed XHTML body for the combined document in one pass.
+
+    Drops the XHTML namespace so the HTML serializer writes void elements
+    (<br>, <img>) and empty ones (<textarea></textarea>) the way an HTML
+    parser expects. URLs are left as they are; they resolve against
+    document_base_url().
+    """
+    for el in body.iter():
+        if not isinstance(el.tag, str):
+            continue  # comments and processing instructions
+        el.tag = etree.QName(el).localname
+    etree.cleanup_namespaces(body)
+
+
+def load_stylesheets(oebps_path: Path) -> list[str]:
+    """Read the EPUB stylesheets in cascade order, adjusted for POD."""
 
     # Read print.css content
     print_css_path = oebps_path / 'style' / 'print.css'
     style_css_path = oebps_path / 'style' / 'style.css'
     fonts_css_path = oebps_path / 'style' / 'fonts.css'
 
-    # Build combined HTML document
-    html_parts = [
-        '<!DOCTYPE html>',
-        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en">',
-        '<head>',
-        '<meta charset="UTF-8"/>',
-        '<title>Curls &amp; Contemplation: A Freelance Hairstylist\'s Guide to Creative Excellence</title>',
-    ]
+    stylesheets = []
 
-    # Inline the fonts CSS
+    # The fonts CSS
     if fonts_css_path.exists():
-        fonts_css = fonts_css_path.read_text()
-        # Update font paths to be absolute
-        fonts_css = fonts_css.replace("url('../fonts/", f"url('{oebps_path}/fonts/")
-        fonts_css = fonts_css.replace('url("../fonts/', f'url("{oebps_path}/fonts/')
-        html_parts.append(f'<style>{fonts_css}</style>')
+        stylesheets.append(fonts_css_path.read_text())
 
-    # Inline the main style CSS
+    # The main style CSS
     if style_css_path.exists():
-        style_css = style_css_path.read_text()
-        # Update image paths to be absolute
-        style_css = style_css.replace("url('../images/", f"url('{oebps_path}/images/")
-        style_css = style_css.replace('url("../images/', f'url("{oebps_path}/images/')
-        html_parts.append(f'<style>{style_css}</style>')
+        stylesheets.append(style_css_path.read_text())
 
-    # Inline the print CSS (this takes precedence)
+    # The print CSS (this takes precedence)
     if print_css_path.exists():
         print_css = print_css_path.read_text()
         # Remove @import since we already included style.css
         print_css = print_css.replace("@import url('style.css');", "/* style.css already included */")
-        # Update image paths
-        print_css = print_css.replace("url('../images/", f"url('{oebps_path}/images/")
-        print_css = print_css.replace('url("../images/', f'url("{oebps_path}/images/')
         # Remove crop/cross marks from print.css - POD services add their own
         print_css = print_css.replace("marks: crop cross;", "marks: none;")
-        html_parts.append(f'<style>{print_css}</style>')
+        stylesheets.append(print_css)
+
+    return stylesheets
+
+
+def create_combined_head(oebps_path: Path, stylesheets: list[str]) -> str:
+    """Build the document head with the inlined stylesheets, up to <body>."""
+
+    # Build combined HTML document
+    html_parts = [
+        '<!DOCTYPE html>',
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en">',
+        '<head>',
+        '<meta charset="UTF-8"/>',
+        f'<base href="{document_base_url(oebps_path)}"/>',
+        '<title>Curls &amp; Contemplation: A Freelance Hairstylist\'s Guide to Creative Excellence</title>',
+    ]
+    for css in stylesheets:
+        html_parts.append(f'<style>{css}</style>')
 
     html_parts.append('</head>')
     html_parts.append('<body>')
+    return '\n'.join(html_parts)
+
 
-    # Process each spine file
-    for i, spine_file in enumerate(spine_files):
+def create_sections(oebps_path: Path, spine_files: list[str]) -> list[str]:
+    """Convert each spine file's body into a chapter section, in spine order."""
+    sections = []
+    for spine_file in spine_files:
         file_path = oebps_path / spine_file
         if not file_path.exists():
             print(f"  Warning: {spine_file} not found, skipping")
@@ -99,124 +217,345 @@ def create_combined_html(oebps_path: Path, spine_files: list[str], output_path:
 
         print(f"  Processing: {spine_file}")
 
-        content = file_path.read_text()
-
-        # Extract body content
-        body_start = content.find('<body')
-        body_end = content.find('</body>')
+        body = load_document(file_path, document_cache()).body()
+        rewrite_body(body)
 
-        if body_start != -1 and body_end != -1:
-            # Find the actual start of body content (after the opening tag)
-            body_tag_end = content.find('>', body_start) + 1
-            body_content = content[body_tag_end:body_end]
+        # The body itself becomes the section with page-break for each document
+        body.attrib.clear()
+        body.tag = 'section'
+        body.set('id', section_id(spine_file))
+        body.set('class', 'chapter-section')
+        body.set('data-file', spine_file)
+        sections.append(etree.tostring(body, method='html', encoding='unicode', with_tail=False))
 
-            # Fix relative image paths to absolute
-            body_content = body_content.replace('src="../images/', f'src="{oebps_path}/images/')
-            body_content = body_content.replace("src='../images/", f"src='{oebps_path}/images/")
-            body_content = body_content.replace('href="../', f'href="{oebps_path}/')
+    return sections
 
-            # Wrap in a section with page-break for each document
-            html_parts.append(f'<section class="chapter-section" data-file="{spine_file}">')
-            html_parts.append(body_content)
-            html_parts.append('</section>')
 
-    html_parts.append('</body>')
-    html_parts.append('</html>')
+def create_combined_html(head: str, sections: list[str]) -> str:
+    """Combine the head and all sections into a single HTML document string."""
+    out = io.StringIO()
+    out.write(head)
+    for section in sections:
+        out.write('\n')
+        out.write(section)
+    out.write('\n</body>\n</html>')
+    return out.getvalue()
 
-    # Write combined HTML
-    output_path.write_text('\n'.join(html_parts))
-    print(f"  Combined HTML written to: {output_path}")
 
+def generate_pdf(html: str, base_url: str, pdf_path: Path, url_fetcher: CachingFetcher,
+                 spine_files: list[str], css: str) -> tuple[bytes, list]:
+    """
+    Lay out the combined HTML once using WeasyPrint on one core and write the PDF.
 
-def generate_pdf(html_path: Path, pdf_path: Path) -> None:
-    """Generate PDF from combined HTML using WeasyPrint."""
-    from weasyprint import HTML, CSS
-    from weasyprint.text.fonts import FontConfiguration
-
+    Returns (PDF bytes, spine file on each page), both from the one layout.
+    """
     print(f"  Generating PDF with WeasyPrint...")
-
-    font_config = FontConfiguration()
-
-    # Additional CSS for proper page breaks and fix problematic floats
-    # NOTE: For POD, we use exact 6x9" trim size WITHOUT crop marks
-    # POD services add their own bleed/marks during production
-    # 6" = 432pt, 9" = 648pt
-    extra_css = CSS(string='''
-        @page {
-            size: 432pt 648pt !important;
-            margin-top: 54pt;      /* 0.75in */
-            margin-bottom: 54pt;   /* 0.75in */
-            margin-left: 54pt;     /* 0.75in default */
-            margin-right: 45pt;    /* 0.625in */
-            marks: none !important;
-        }
-
-        @page :left {
-            margin-left: 63pt;     /* 0.875in gutter */
-            margin-right: 45pt;    /* 0.625in */
-        }
-
-        @page :right {
-            margin-left: 45pt;     /* 0.625in */
-            margin-right: 63pt;    /* 0.875in gutter */
-        }
-
-        @page :first {
-            margin-top: 72pt;      /* 1in */
-            marks: none !important;
-        }
-
-        @page :blank {
-            marks: none !important;
-        }
-
-        section.chapter-section {
-            page-break-before: always;
-            break-before: page;
-        }
-
-        section.chapter-section:first-of-type {
-            page-break-before: avoid;
-            break-before: avoid;
-        }
-
-        /* Fix: Remove problematic float on drop caps that causes assertion error */
-        .introduction-paragraph p:first-of-type strong:first-child,
-        .dropcap-first-letter p:first-of-type strong:first-child,
-        p.intro-text:first-of-type::first-letter {
-            float: none !important;
-            display: inline;
-            font-size: 24pt;
-            font-weight: bold;
-        }
-
-        /* Ensure images don't break PDF generation */
-        img {
-            max-width: 100%;
-            height: auto;
-        }
-
-        /* Fix flex containers for WeasyPrint compatibility */
-        .title-page-body,
-        .copyright-body,
-        .dedication-page,
-        .chap-title,
-        .part-body,
-        .part-page,
-        .quote-page,
-        .image-quote {
-            display: block;
-        }
-    ''', font_config=font_config)
-
-    html = HTML(filename=str(html_path))
-    html.write_pdf(str(pdf_path), stylesheets=[extra_css], font_config=font_config)
-
+    pdf, page_map, _, _ = render_document(html, base_url, [css], spine_files, url_fetcher)
+    pdf_path.write_bytes(pdf)
+    print(f"  PDF generated: {pdf_path}")
+    return pdf, page_map
+
+
+def generate_pdf_parallel(head: str, sections: list[str], base_url: str, pdf_path: Path,
+                          jobs: int, url_fetcher: CachingFetcher,
+                          spine_files: list[str], css: str) -> tuple[bytes, list]:
+    """
+    Render groups of sections in parallel processes and splice the pages.
+
+    Returns (PDF bytes, spine file on each page); the map is read from the
+    spliced PDF's named destinations.
+    """
+    print(f"  Generating PDF with WeasyPrint ({jobs} processes)...")
+    # Warm the fetcher once so every worker starts with the fonts and images
+    url_fetcher.prefetch('fonts', 'images')
+    results = render_parallel(head, sections, base_url, css, jobs, page_count_cache(),
+                              url_fetcher)
+    pdf = splice_pdfs(results)
+    pdf_path.write_bytes(pdf)
+    print(f"  PDF generated: {pdf_path}")
+    return pdf, pdf_page_map(pdf, spine_files)
+
+
+def generate_variants(html: str, base_url: str, output_dir: Path, variant_css: dict, jobs: int,
+                      url_fetcher: CachingFetcher, spine_files: list[str]) -> dict:
+    """
+    Render every trim variant ({trim: POD CSS}) of the same combined HTML in parallel processes.
+
+    Returns {trim: (PDF bytes, spine file on each page)}.
+    """
+    print(f"  Generating {len(variant_css)} variants with WeasyPrint ({jobs} processes)...")
+    url_fetcher.prefetch('fonts', 'images')
+    results = render_variants(html, base_url, variant_css, spine_files, jobs, url_fetcher)
+    for trim, (pdf, _) in results.items():
+        pdf_path = output_dir / pdf_output_name(trim)
+        pdf_path.write_bytes(pdf)
+        print(f"  PDF generated: {pdf_path}")
+    return results
+
+
+def generate_preview(head: str, runs: list[list[str]], run_sections: list[list[str]],
+                     base_url: str, pdf_path: Path, url_fetcher: CachingFetcher,
+                     spine_files: list[str], trim: str, css: str) -> tuple[bytes, list]:
+    """
+    Render only the selected runs of spine files, at their pages in the full book.
+
+    Start pages come from the last full build of the trim; without one, the
+    first run starts on page 1 and each following run after the previous.
+    Returns (PDF bytes, spine file on each page).
+    """
+    first_pages = load_first_pages(page_count_cache(), trim)
+    if not first_pages:
+        print(f"  Note: no full {trim} build yet, page numbers start at 1")
+    starts, page = [], 1
+    for run, sections in zip(runs, run_sections):
+        page = first_pages.get(run[0], page)
+        starts.append(page)
+        # Fallback for the next run: roughly where this one ends
+        page += max(1, sum(len(s) for s in sections) // BYTES_PER_PAGE)
+
+    print(f"  Generating preview with WeasyPrint ({len(runs)} run{'s' if len(runs) != 1 else ''}, "
+          f"from page {', '.join(map(str, starts))})...")
+    pdf, page_map = render_runs(head, list(zip(run_sections, starts)), base_url, css,
+                                spine_files, url_fetcher)
+    pdf_path.write_bytes(pdf)
     print(f"  PDF generated: {pdf_path}")
+    return pdf, page_map
+
+
+def write_outputs(pdf: bytes, page_map: list, args: argparse.Namespace, trim: str) -> None:
+    """Report page counts and write the outputs derived from the rendered PDF."""
+    # With several trims, each gets its own preview directory and map file
+    previews, map_path = args.previews, args.page_map
+    if len(args.trim) > 1:
+        previews = previews and previews / trim
+        map_path = map_path and map_path.with_name(f"{map_path.stem}-{trim}{map_path.suffix}")
+
+    print(f"  Page report for {trim} ({len(page_map)} pages):")
+    for spine_file, first, count in page_report(page_map):
+        last = first + count - 1
+        print(f"    pp. {first:>3}-{last:<3} ({count:>2})  {spine_file or '(no section)'}")
+
+    if map_path:
+        write_page_map(map_path, page_map)
+        print(f"  Page map written to: {map_path}")
+
+    if previews:
+        paths = rasterize_pages(pdf, previews, args.preview_dpi, len(page_map), args.jobs)
+        print(f"  {len(paths)} page previews at {args.preview_dpi} DPI in {previews}")
+
+
+def pod_inputs_digest(oebps_path: Path) -> str:
+    """Hash what every trim depends on: the EPUB sources, the build code and the renderer."""
+    return hash_parts(
+        tree_digest(oebps_path),
+        code_digest(__file__),
+        package_versions('weasyprint', 'pydyf', 'fonttools', 'pillow', 'pikepdf', 'lxml',
+                         'tinycss2', 'cssselect2', 'tinyhtml5'),
+        renderer_version(),
+    )
+
+
+def pod_artifact_key(inputs: str, trim: str, stylesheets: list[str], scale: float,
+                     args: argparse.Namespace) -> str:
+    """Key of a finished POD PDF: the shared inputs, the trim's CSS and the options."""
+    # A spliced parallel render is laid out the same but written differently
+    spliced = len(args.trim) == 1 and args.jobs > 1
+    dpi = PROOF_DPI if args.proof else PRINT_DPI
+    return artifact_key(
+        'pod-pdf',
+        inputs,
+        pod_css(trim, stylesheets),
+        f'dpi={dpi} scale={scale!r} prune={not args.no_prune_css} '
+        f'subset={not args.no_subset_fonts} optimize={args.optimize or args.linearize} '
+        f'linearize={args.linearize} spliced={spliced}',
+    )
+
+
+def restore_pod_pdf(cache: DiskCache, key: str, pdf_path: Path):
+    """Restore a stored POD PDF to pdf_path; returns (PDF bytes, page map) or None."""
+    page_map = cache.get_text(hash_parts(key, 'page-map'))
+    if page_map is None:
+        return None
+    pdf = restore_artifact(cache, key, pdf_path)
+    return None if pdf is None else (pdf, json.loads(page_map))
+
+
+def store_pod_pdf(cache: DiskCache, key: str, pdf: bytes, page_map: list) -> None:
+    """Store a finished POD PDF and its page map."""
+    cache.put(key, pdf)
+    cache.put_text(hash_parts(key, 'page-map'), json.dumps(page_map))
+
+
+def build_pdfs(args: argparse.Namespace, trims: list[str], scale: float, oebps_path: Path,
+               repo_root: Path, spine_files: list[str], runs: list[list[str]]) -> dict:
+    """
+    Prepare the images, combined document and CSS, then render the trims.
+
+    Returns {trim: (PDF bytes, spine file on each page)}.
+    """
+    # Step 2: Resample images for the printed page
+    dpi = PROOF_DPI if args.proof else PRINT_DPI
+    print(f"[2/4] Preparing images at {dpi} DPI...")
+    image_variants = prepare_images(oebps_path, dpi, scale)
+    print()
 
+    # Step 3: Create combined HTML
+    print("[3/4] Combining XHTML files...")
+    stylesheets = load_stylesheets(oebps_path)
+    run_sections = [create_sections(oebps_path, run) for run in runs]
+    sections = [section for group in run_sections for section in group]
+    # The document as rendered, minus the CSS, for pruning and font subsetting
+    document = create_combined_html(create_combined_head(oebps_path, []), sections)
+    if not args.no_prune_css:
+        stylesheets, kept, total = prune_stylesheets(stylesheets, document, css_cache())
+        print(f"  CSS: kept {kept} of {total} rules")
+    font_subsets = {}
+    if not args.no_subset_fonts:
+        font_subsets = subset_fonts(stylesheets, document, document_base_url(oebps_path),
+                                    CACHE_ROOT / 'pod-fonts', font_cache())
+        original = sum(path.stat().st_size for path in font_subsets)
+        subset = sum(path.stat().st_size for path in font_subsets.values())
+        print(f"  Fonts: {len(font_subsets)} subsets, {original // 1024} KB WOFF2 -> "
+              f"{subset // 1024} KB TTF")
+    head = create_combined_head(oebps_path, stylesheets)
+    if args.keep_intermediate:
+        combined_html = create_combined_html(head, sections)
+        combined_html_path = repo_root / 'pod-combined.html'
+        combined_html_path.write_text(combined_html)
+        print(f"  Combined HTML written to: {combined_html_path}")
+    print()
 
-def main():
+    # Step 4: Generate PDF
+    print(f"[4/4] Generating {', '.join(trims)} POD PDF...")
+    base_url = document_base_url(oebps_path)
+    # Serve the print-resolution variants in place of the EPUB images, and
+    # the subsets in place of the fonts (the @font-face URLs stay as they are)
+    overrides = {oebps_path / 'images' / name: variant for name, variant in image_variants.items()}
+    overrides.update(font_subsets)
+    url_fetcher = CachingFetcher(oebps_path, overrides)
+    variant_css = {trim: pod_css(trim, stylesheets) for trim in trims}
+    if args.only:
+        results = {trim: generate_preview(head, runs, run_sections, base_url,
+                                          repo_root / pdf_output_name(trim, preview=True),
+                                          url_fetcher, spine_files, trim, variant_css[trim])
+                   for trim in trims}
+    elif len(args.trim) > 1:
+        results = generate_variants(create_combined_html(head, sections), base_url, repo_root,
+                                    variant_css, args.jobs, url_fetcher, spine_files)
+    elif args.jobs > 1:
+        trim = trims[0]
+        results = {trim: generate_pdf_parallel(head, sections, base_url,
+                                               repo_root / pdf_output_name(trim), args.jobs,
+                                               url_fetcher, spine_files, variant_css[trim])}
+    else:
+        trim = trims[0]
+        results = {trim: generate_pdf(create_combined_html(head, sections), base_url,
+                                      repo_root / pdf_output_name(trim), url_fetcher,
+                                      spine_files, variant_css[trim])}
+    print(f"  Asset fetches: {url_fetcher.stats()}")
+    return results
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Generate the 6x9\" POD PDF from the EPUB sources.")
+    parser.add_argument(
+        "--proof",
+        action="store_true",
+        help=f"resample images to {PROOF_DPI} DPI instead of {PRINT_DPI} for a faster proof",
+    )
+    parser.add_argument(
+        "--keep-intermediate",
+        action="store_true",
+        help="also write the combined document to pod-combined.html",
+    )
+    parser.add_argument(
+        "--trim",
+        action="append",
+        choices=[*TRIMS, "all"],
+        help=f"trim size to build; repeat for several, or 'all' "
+             f"(default: {DEFAULT_TRIM}; choices: {', '.join(TRIMS)})",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="post-process the PDF: merge duplicate images and fonts, drop unused "
+             "objects, compress object streams (requires pikepdf)",
+    )
+    parser.add_argument(
+        "--linearize",
+        action="store_true",
+        help="also linearize the PDF for fast web view (implies --optimize)",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        metavar="SELECTOR",
+        help="preview only these spine files, at their page numbers in the last full "
+             "build; repeatable. A selector is a file name or glob, chapter:N (arabic "
+             "or roman, or a range N-M) or part:N. Writes CurlsAndContemplation-POD-<trim>-preview.pdf",
+    )
+    parser.add_argument(
+        "--previews",
+        type=Path,
+        metavar="DIR",
+        help="also write a PNG of every page to DIR, rasterized from the same render "
+             "(requires pdftoppm)",
+    )
+    parser.add_argument(
+        "--preview-dpi",
+        type=int,
+        default=96,
+        help="resolution of the page previews (default: 96)",
+    )
+    parser.add_argument(
+        "--page-map",
+        type=Path,
+        metavar="FILE",
+        help="also write the page -> spine file map and page counts as JSON",
+    )
+    parser.add_argument(
+        "--no-prune-css",
+        action="store_true",
+        help="inline the stylesheets whole instead of dropping rules no element matches",
+    )
+    parser.add_argument(
+        "--no-subset-fonts",
+        action="store_true",
+        help="embed the web fonts whole instead of subsetting them to the characters used "
+             "(subsetting requires fontTools)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="render even if a build of the same inputs is stored in .cache/artifacts/",
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        help="with one trim: render groups of spine sections in this many processes "
+             "and splice the pages (requires pikepdf; default: 1, a single render); "
+             "with several: render this many variants at once (default: all)",
+    )
+    args = parser.parse_args(argv)
+    if not args.trim:
+        args.trim = [DEFAULT_TRIM]
+    elif "all" in args.trim:
+        args.trim = list(TRIMS)
+    args.trim = list(dict.fromkeys(args.trim))
+    if args.jobs is None:
+        args.jobs = 1 if len(args.trim) == 1 else min(len(args.trim), os.cpu_count() or 1)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.preview_dpi < 1:
+        parser.error("--preview-dpi must be at least 1")
+    return args
+
+
+def main(argv=None):
     """Main entry point."""
+    args = parse_args(argv)
+
     # Paths
     repo_root = Path(__file__).parent
     oebps_path = repo_root / 'pub' / 'OEBPS'
@@ -227,43 +566,84 @@ def main():
         sys.exit(1)
 
     print("=" * 60)
-    print("POD PDF Generator - 6x9\" Print-on-Demand")
+    print(f"POD PDF Generator - {', '.join(args.trim)} Print-on-Demand")
     print("=" * 60)
     print()
 
     # Step 1: Get spine order
-    print("[1/3] Reading spine order from content.opf...")
+    print("[1/4] Reading spine order from content.opf...")
     spine_files = get_spine_order(opf_path)
     print(f"  Found {len(spine_files)} files in spine order")
+    runs = [spine_files]
+    if args.only:
+        try:
+            selected = select_spine(spine_files, args.only)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(2)
+        runs = contiguous_runs(spine_files, selected)
+        print(f"  Preview: {len(selected)} of {len(spine_files)} files")
     print()
 
-    # Step 2: Create combined HTML
-    print("[2/3] Combining XHTML files...")
-    combined_html_path = repo_root / 'pod-combined.html'
-    create_combined_html(oebps_path, spine_files, combined_html_path)
-    print()
-
-    # Step 3: Generate PDF
-    print("[3/3] Generating 6x9\" POD PDF...")
-    pdf_output_path = repo_root / 'CurlsAndContemplation-POD-6x9.pdf'
-    generate_pdf(combined_html_path, pdf_output_path)
-    print()
-
-    # Cleanup intermediate file
-    combined_html_path.unlink()
-    print("  Cleaned up intermediate files")
+    # Full builds of unchanged inputs are restored instead of rendered
+    scale = image_scale([TRIMS[t] for t in args.trim])
+    artifacts = artifact_cache(enabled=not (args.no_cache or args.only or args.keep_intermediate))
+    keys, results = {}, {}
+    if artifacts.enabled:
+        inputs = pod_inputs_digest(oebps_path)
+        stylesheets = load_stylesheets(oebps_path)
+        for trim in args.trim:
+            keys[trim] = pod_artifact_key(inputs, trim, stylesheets, scale, args)
+            restored = restore_pod_pdf(artifacts, keys[trim], repo_root / pdf_output_name(trim))
+            if restored:
+                results[trim] = restored
+                print(f"  {pdf_output_name(trim)}: inputs unchanged, cached PDF restored")
+        print()
+    trims = [trim for trim in args.trim if trim not in results]
+
+    # Sizes as rendered, for the summary
+    rendered_sizes = {}
+    if trims:
+        rendered = build_pdfs(args, trims, scale, oebps_path, repo_root, spine_files, runs)
+        for trim, (pdf, page_map) in rendered.items():
+            if args.optimize or args.linearize:
+                pdf_path = repo_root / pdf_output_name(trim, preview=bool(args.only))
+                optimized, merged = optimize_pdf(pdf, args.linearize)
+                pdf_path.write_bytes(optimized)
+                rendered_sizes[trim] = len(pdf)
+                rendered[trim] = (optimized, page_map)
+                print(f"  Optimized {pdf_path.name}: {format_size(len(pdf))} -> "
+                      f"{format_size(len(optimized))} ({merged} duplicate streams merged)")
+            if trim in keys:
+                store_pod_pdf(artifacts, keys[trim], *rendered[trim])
+        results.update(rendered)
+    results = {trim: results[trim] for trim in args.trim}
+
+    for trim, (pdf, page_map) in results.items():
+        write_outputs(pdf, page_map, args, trim)
+        if not args.only:
+            # Previews (--only) start their pages where this build put them
+            save_first_pages(page_count_cache(), trim, page_map)
     print()
 
     # Summary
     print("=" * 60)
     print("SUCCESS!")
     print("=" * 60)
-    print(f"Output: {pdf_output_path}")
-    print(f"Size: {pdf_output_path.stat().st_size / 1024 / 1024:.2f} MB")
+    for trim, (_, page_map) in results.items():
+        pdf_output_path = repo_root / pdf_output_name(trim, preview=bool(args.only))
+        print(f"Output: {pdf_output_path}")
+        size = format_size(pdf_output_path.stat().st_size)
+        if trim in rendered_sizes:
+            size += f" (was {format_size(rendered_sizes[trim])} before optimization)"
+        print(f"  Size: {size}, {len(page_map)} pages")
     print()
     print("PDF Specifications:")
-    print("  - Trim Size: 6\" x 9\" (432pt x 648pt) - standard POD")
-    print("  - Margins: 0.75\" top/bottom, 0.875\" gutter, 0.625\" outside")
+    for trim in args.trim:
+        t = TRIMS[trim]
+        print(f"  - {trim}: {t['width']:g}\" x {t['height']:g}\" trim, "
+              f"{t['top']:g}\" top/{t['bottom']:g}\" bottom, {t['gutter']:g}\" gutter, "
+              f"{t['outside']:g}\" outside, text at {t['font_scale']:g}x")
     print("  - Fonts: Libre Baskerville, Cinzel Decorative, Montserrat")
     print("  - Print marks: None (POD services add their own)")
     print()
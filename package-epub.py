@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Package the EPUB in pub/ into CurlsAndContemplation.epub.
+
+The archive lists mimetype (stored), META-INF/, content.opf and the
+content.opf manifest, in that order, with fixed timestamps, so the same
+tree always packages to the same bytes (set SOURCE_DATE_EPOCH to stamp
+the entries with a release date). Compressed entries are cached by
+content; re-packaging after an edit only compresses the changed files,
+and an unchanged tree restores the whole archive from .cache/artifacts/.
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+from bookbuild.artifacts import (
+    artifact_cache, artifact_key, code_digest, files_digest, restore_artifact, source_date_epoch,
+)
+from bookbuild.epub import epub_cache, package_entries, write_epub
+from bookbuild.pdf_optimize import format_size
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Package pub/ as a reproducible EPUB.")
+    parser.add_argument(
+        "-o", "--output",
+        type=Path,
+        default=Path(__file__).parent / "CurlsAndContemplation.epub",
+        help="output file (default: CurlsAndContemplation.epub)",
+    )
+    parser.add_argument(
+        "--level",
+        type=int,
+        default=9,
+        choices=range(1, 10),
+        metavar="1-9",
+        help="deflate level (default: 9)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="package and compress every entry instead of reusing cached output",
+    )
+    return parser.parse_args(argv)
+
+
+def epub_artifact_key(pub_path: Path, level: int) -> tuple:
+    """Return (key of the finished EPUB, missing manifest hrefs)."""
+    names, missing = package_entries(pub_path)
+    key = artifact_key(
+        "epub",
+        files_digest(pub_path, [pub_path / name for name in names]),
+        code_digest(__file__),
+        f"level={level}",
+        str(source_date_epoch()),
+    )
+    return key, missing
+
+
+def main(argv=None):
+    """Main entry point."""
+    args = parse_args(argv)
+    pub_path = Path(__file__).parent / "pub"
+
+    print("Packaging EPUB...")
+    cache = epub_cache(enabled=not args.no_cache)
+    artifacts = artifact_cache(enabled=not args.no_cache)
+    try:
+        key, missing = epub_artifact_key(pub_path, args.level)
+        restored = artifacts.enabled and restore_artifact(artifacts, key, args.output) is not None
+        if not restored:
+            entries, recompressed, written, missing = write_epub(pub_path, args.output,
+                                                                 args.level, cache)
+            artifacts.put(key, args.output.read_bytes())
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    for href in missing:
+        print(f"  Warning: manifest item {href} is missing; the EPUB will not validate")
+
+    if restored:
+        state = "restored from cache"
+    else:
+        state = "written" if written else "unchanged"
+        print(f"  {entries} entries, {recompressed} compressed ({cache.stats()})")
+    print(f"Output: {args.output} ({format_size(args.output.stat().st_size)}, {state})")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,14 +5,29 @@ Converts each XHTML to individual .tex files and creates a master document.
 """
 
 import os
-import re
-import subprocess
-import shutil
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from lxml import etree
 
 # Directory setup
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from bookbuild.cache import DiskCache
+from bookbuild.document import document_cache, load_document, type_from_filename
+from bookbuild.files import write_if_changed
+from bookbuild.images import PRINT_DPI, PROOF_DPI, image_cache, optimize_images, variant_dir_name
+from bookbuild.native_latex import convert_xhtml
+from bookbuild.rewrite import Rule, RuleSet
+from bookbuild.trims import DEFAULT_TRIM, TRIMS, image_scale, latex_page_setup
+from bookbuild.transcode import transcode_assets, transcode_cache
+from bookbuild.spine import select_spine
+from bookbuild.sync import format_counts, sync_tree
+from bookbuild.pandoc import BACKENDS, pandoc_cache, run_pandoc, run_pandoc_batch
+
+OPF_PATH = BASE_DIR / "pub" / "OEBPS" / "content.opf"
 XHTML_DIR = BASE_DIR / "pub" / "OEBPS" / "xhtml"
 IMAGES_DIR = BASE_DIR / "pub" / "OEBPS" / "images"
 FONTS_DIR = BASE_DIR / "pub" / "OEBPS" / "fonts"
@@ -20,6 +35,8 @@ PDF_DIR = BASE_DIR / "pdf"
 LATEX_DIR = PDF_DIR / "latex"
 LATEX_IMAGES_DIR = LATEX_DIR / "images"
 LATEX_FONTS_DIR = LATEX_DIR / "fonts"
+MASTER_TEX = PDF_DIR / "CurlsAndContemplation-master.tex"
+INCLUDEONLY_TEX = PDF_DIR / "CurlsAndContemplation-includeonly.tex"
 
 # Ordered list of XHTML files based on content.opf spine
 SPINE_ORDER = [
@@ -80,107 +97,73 @@ def setup_directories():
 
 
 def copy_assets():
-    """Copy images and fonts to latex directory."""
-    print("Copying images...")
-    for img in IMAGES_DIR.glob("*"):
-        if img.is_file():
-            shutil.copy2(img, LATEX_IMAGES_DIR / img.name)
-
-    print("Copying fonts...")
-    for font in FONTS_DIR.glob("*"):
-        if font.is_file():
-            shutil.copy2(font, LATEX_FONTS_DIR / font.name)
-
-
-def convert_xhtml_to_latex(xhtml_path: Path) -> str:
-    """Convert a single XHTML file to LaTeX using pandoc."""
-    result = subprocess.run(
-        [
-            "pandoc",
-            str(xhtml_path),
-            "-f", "html",
-            "-t", "latex",
-            "--wrap=preserve",
-        ],
-        capture_output=True,
-        text=True
-    )
-    if result.returncode != 0:
-        print(f"Warning: pandoc error for {xhtml_path.name}: {result.stderr}")
-    return result.stdout
-
-
-def fix_latex_content(content: str, filename: str) -> str:
-    """Fix and enhance LaTeX content."""
-    # Fix image paths
-    content = re.sub(
-        r'\\includegraphics(\[.*?\])?\{\.\.?/images/',
-        r'\\includegraphics\1{images/',
-        content
-    )
-    content = re.sub(
-        r'\\includegraphics(\[.*?\])?\{images/',
-        r'\\includegraphics\1{images/',
-        content
-    )
+    """Sync images and fonts into the latex directory, skipping unchanged files."""
+    print(f"   Images: {format_counts(sync_tree(IMAGES_DIR, LATEX_IMAGES_DIR))}")
+    print(f"   Fonts: {format_counts(sync_tree(FONTS_DIR, LATEX_FONTS_DIR))}")
 
-    # Fix SVG references (convert to PDF if needed, or use PNG fallback)
-    content = re.sub(
-        r'\\includegraphics(\[.*?\])?\{images/brushstroke\.svg\}',
-        r'\\includegraphics\1{images/brushstroke}',
-        content
-    )
 
-    # Escape special characters that might have slipped through
-    # (pandoc usually handles this but just in case)
+def resample_images(dpi: int, jobs: int, use_cache: bool = True, scale: float = 1.0) -> dict:
+    """
+    Write print-resolution copies of the raster images to images/<dpi>dpi/.
 
-    return content
+    scale enlarges the placement sizes for trims with a bigger text block
+    than 6x9. Returns {image name: path relative to the images directory}.
+    """
+    variant_dir = LATEX_IMAGES_DIR / variant_dir_name(dpi, scale)
+    sources = sorted(p for p in IMAGES_DIR.iterdir() if p.is_file())
+    variants = optimize_images(sources, variant_dir, dpi, jobs, image_cache(use_cache), scale)
+    if variants:
+        print(f"   Images at {dpi} DPI: {len(variants)} in {variant_dir}")
+    return {name: f"{variant_dir.name}/{name}" for name in variants}
+
+
+ENGINES = ["pandoc", "native"]
+
+
+def convert_xhtml_to_latex(xhtml_path: Path, cache: DiskCache = None, engine: str = "pandoc") -> str:
+    """Convert a single XHTML file to LaTeX using pandoc or the native lxml engine."""
+    if engine == "native":
+        return convert_xhtml(xhtml_path, cache)
+    return run_pandoc(xhtml_path, cache)
+
+
+def _image_path(match, image_variants: dict = None) -> str:
+    # Point at the print-resolution variant, if there is one
+    name = match.group(2)
+    if image_variants:
+        name = image_variants.get(name, name)
+    return f"\\includegraphics{match.group(1) or ''}{{images/{name}}}"
+
+
+# Applied to every converted chapter, in one pass (see bookbuild/rewrite.py).
+# pandoc 3 writes SVGs as \includesvg, which needs Inkscape at typesetting
+# time; both forms become \includegraphics.
+LATEX_RULES = RuleSet([
+    # SVGs are transcoded to PDF (see transcode_assets.py)
+    Rule("svg-to-pdf", r'\\include(?:graphics|svg)(\[.*?\])?\{(?:\.\.?/)?images/([^}]+)\.svg\}',
+         r'\\includegraphics\1{images/\2.pdf}'),
+    # Rebase ../images/ and ./images/ onto the latex directory's images/
+    Rule("image-path", r'\\include(?:graphics|svg)(\[.*?\])?\{(?:\.\.?/)?images/([^}]+)\}',
+         _image_path),
+])
+
+
+def fix_latex_content(content: str, filename: str, image_variants: dict = None) -> str:
+    """
+    Fix and enhance LaTeX content.
+
+    image_variants maps image names to the resampled copies from
+    optimize_images(), relative to the images directory.
+    """
+    return LATEX_RULES.apply(content, image_variants=image_variants)
 
 
 def get_file_type(filename: str) -> str:
-    """Determine the type of content based on filename."""
-    if "TitlePage" in filename:
-        return "titlepage"
-    elif "Copyright" in filename:
-        return "copyright"
-    elif "TableOfContents" in filename:
-        return "toc"
-    elif "Dedication" in filename:
-        return "dedication"
-    elif "Preface" in filename and "quote" not in filename:
-        return "preface"
-    elif "-quote" in filename:
-        return "quote"
-    elif "Part-I" in filename or "Part-II" in filename or "Part-III" in filename or "Part-IV" in filename:
-        return "part"
-    elif "chapter-" in filename:
-        return "chapter"
-    elif "Conclusion" in filename and "quote" not in filename:
-        return "conclusion"
-    elif "QuizKey" in filename:
-        return "quizkey"
-    elif "SelfAssessment" in filename:
-        return "assessment"
-    elif "Affirmation" in filename or "affirmation" in filename:
-        return "affirmation"
-    elif "Acknowledgments" in filename:
-        return "acknowledgments"
-    elif "AbouttheAuthor" in filename:
-        return "author"
-    elif "bibliography" in filename:
-        return "bibliography"
-    elif "Journal" in filename or "journal" in filename:
-        return "journal"
-    elif "Doodle" in filename:
-        return "doodle"
-    elif "SMART" in filename:
-        return "worksheet"
-    elif "Collective" in filename:
-        return "collective"
-    elif "commitment" in filename:
-        return "commitment"
-    else:
-        return "generic"
+    """Determine the type of content, from its epub:type or else its filename."""
+    try:
+        return load_document(XHTML_DIR / filename, document_cache()).file_type
+    except (OSError, etree.XMLSyntaxError):
+        return type_from_filename(filename)
 
 
 def create_individual_tex_file(filename: str, content: str, file_type: str) -> str:
@@ -191,23 +174,86 @@ def create_individual_tex_file(filename: str, content: str, file_type: str) -> s
     return tex_content
 
 
-def create_preamble() -> str:
+def write_tex_file(filename: str, latex_content: str, image_variants: dict = None) -> tuple:
+    """
+    Fix up converted LaTeX and write its .tex file if the content changed.
+
+    Returns (tex_filename, changed).
+    """
+    latex_content = fix_latex_content(latex_content, filename, image_variants)
+
+    # Get file type
+    file_type = get_file_type(filename)
+
+    # Create individual tex file
+    tex_filename = filename.replace(".xhtml", ".tex")
+    tex_content = create_individual_tex_file(filename, latex_content, file_type)
+
+    # Write the file (unchanged files keep their mtime)
+    changed = write_if_changed(LATEX_DIR / tex_filename, tex_content)
+
+    return tex_filename, changed
+
+
+def convert_spine_files(filenames: list, jobs: int, cache: DiskCache = None,
+                        backend: str = "subprocess", engine: str = "pandoc",
+                        image_variants: dict = None) -> tuple:
+    """
+    Convert spine files concurrently with up to `jobs` workers.
+
+    With the "subprocess" backend every file is its own pandoc run; with
+    "batch" the spine is split into one slice per worker and each slice goes
+    through a single pandoc process. Either way the pandoc work happens in
+    subprocesses, so a thread pool is enough to keep them all busy. The
+    "native" engine converts in-process and only calls pandoc for elements
+    it does not handle; the backend setting does not apply to it.
+
+    Results are collected and written in spine order; a failure in one file
+    is recorded and does not stop the others.
+
+    Returns (tex_files, errors) where errors maps filename -> exception.
+    """
+    tex_files = []
+    errors = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        if engine == "pandoc" and backend == "batch":
+            # Interleave so the long chapters are spread across workers
+            futures = {}
+            for i in range(min(jobs, len(filenames))):
+                chunk = filenames[i::jobs]
+                future = pool.submit(run_pandoc_batch, [XHTML_DIR / f for f in chunk], cache)
+                for filename in chunk:
+                    futures[filename] = future
+        else:
+            futures = {
+                filename: pool.submit(convert_xhtml_to_latex, XHTML_DIR / filename, cache, engine)
+                for filename in filenames
+            }
+
+        for filename in filenames:
+            try:
+                latex_content = futures[filename].result()
+                if engine == "pandoc" and backend == "batch":
+                    latex_content = latex_content[XHTML_DIR / filename]
+                tex_filename, changed = write_tex_file(filename, latex_content, image_variants)
+                tex_files.append(tex_filename)
+                print(f"   {'Converted' if changed else 'Unchanged'}: {filename}")
+            except Exception as e:
+                errors[filename] = e
+                print(f"   Error: {filename}: {e}")
+
+    return tex_files, errors
+
+
+def create_preamble(trim: str = DEFAULT_TRIM) -> str:
     """Create the LaTeX preamble with all necessary packages and styling."""
     return r"""\documentclass[11pt,twoside]{book}
 
 % ============================================================================
-% PAGE GEOMETRY - 6x9 inch trim size for POD
+% PAGE GEOMETRY - """ + trim + r""" trim size for POD (see bookbuild/trims.py)
 % ============================================================================
-\usepackage[
-    paperwidth=6in,
-    paperheight=9in,
-    inner=0.875in,
-    outer=0.625in,
-    top=0.75in,
-    bottom=0.75in,
-    footskip=0.4in
-]{geometry}
-
+""" + latex_page_setup(TRIMS[trim]) + r"""
 % ============================================================================
 % ESSENTIAL PACKAGES
 % ============================================================================
@@ -242,6 +288,13 @@ def create_preamble() -> str:
 \usepackage{calc}
 \usepackage{etoolbox}
 
+% tcolorbox for boxes (load after other packages)
+\usepackage[most]{tcolorbox}
+
+% Everything above is dumped into the precompiled preamble format by
+% compile_latex.py; fonts and settings below are applied on every run
+\csname endofdump\endcsname
+
 % ============================================================================
 % COLORS - Matching EPUB theme
 % ============================================================================
@@ -415,6 +468,20 @@ def create_preamble() -> str:
 \graphicspath{{images/}}
 \DeclareGraphicsExtensions{.pdf,.png,.jpg,.jpeg}
 
+% pandoc 3 wraps images in \pandocbounded: scale down to fit the text block
+\makeatletter
+\newsavebox\pandoc@box
+\providecommand*\pandocbounded[1]{%
+    \sbox\pandoc@box{#1}%
+    \Gscale@div\@tempa{\textheight}{\dimexpr\ht\pandoc@box+\dp\pandoc@box\relax}%
+    \Gscale@div\@tempb{\linewidth}{\wd\pandoc@box}%
+    \ifdim\@tempb\p@<\@tempa\p@\let\@tempa\@tempb\fi
+    \ifdim\@tempa\p@<\p@\scalebox{\@tempa}{\usebox\pandoc@box}%
+    \else\usebox{\pandoc@box}%
+    \fi
+}
+\makeatother
+
 % Full page image command
 \newcommand{\fullpageimage}[1]{%
     \clearpage
@@ -466,9 +533,6 @@ def create_preamble() -> str:
 \setlist[itemize]{leftmargin=*,itemsep=0.5em}
 \setlist[enumerate]{leftmargin=*,itemsep=0.5em}
 
-% tcolorbox for boxes (load after other packages)
-\usepackage[most]{tcolorbox}
-
 % ============================================================================
 % DOCUMENT INFO
 % ============================================================================
@@ -479,9 +543,18 @@ def create_preamble() -> str:
 """
 
 
-def create_master_document(tex_files: list) -> str:
-    """Create the master LaTeX document that includes all individual files."""
-    content = create_preamble()
+def create_master_document(tex_files: list, trim: str = DEFAULT_TRIM) -> str:
+    """
+    Create the master LaTeX document that includes all individual files.
+
+    Each file is pulled in with \\include, which gives it its own .aux file
+    under latex/. The preamble reads an optional \\includeonly list from
+    INCLUDEONLY_TEX (see create_includeonly()), so a draft compile can
+    retypeset only what changed while keeping the page numbers, TOC entries
+    and labels of everything else.
+    """
+    content = create_preamble(trim)
+    content += f"\\InputIfFileExists{{{INCLUDEONLY_TEX.name}}}{{}}{{}}\n"
     content += "\n\\begin{document}\n\n"
 
     # Front matter
@@ -508,12 +581,8 @@ def create_master_document(tex_files: list) -> str:
             content += "\n\\backmatter\n\n"
             in_backmatter = True
 
-        # Include the file
-        content += f"\\input{{latex/{basename}}}\n"
-
-        # Add page breaks after certain sections
-        if file_type in ["titlepage", "copyright", "dedication", "toc", "part", "chapter", "quote", "conclusion"]:
-            content += "\\clearpage\n"
+        # Include the file (\include starts and ends with \clearpage)
+        content += f"\\include{{latex/{basename}}}\n"
 
         content += "\n"
 
@@ -521,8 +590,118 @@ def create_master_document(tex_files: list) -> str:
     return content
 
 
-def main():
+def stale_tex_files(tex_files: list) -> list:
+    """
+    Return the .tex files that changed since the last xelatex run.
+
+    A file is stale when its .aux (written by \\include) is missing or older
+    than the .tex. Because unchanged .tex files are never rewritten, their
+    mtimes stay put and they are not reported.
+    """
+    stale = []
+    for tex_file in tex_files:
+        tex_path = LATEX_DIR / tex_file
+        aux_path = tex_path.with_suffix(".aux")
+        if not aux_path.exists() or aux_path.stat().st_mtime < tex_path.stat().st_mtime:
+            stale.append(tex_file)
+    return stale
+
+
+def create_includeonly(tex_files: list, draft: bool, only: list = None) -> tuple:
+    """
+    Create the contents of INCLUDEONLY_TEX.
+
+    For a draft build this is an \\includeonly list of the stale chapters.
+    A full build, a first build, or a changed master document (whose preamble
+    affects every page) leaves the list out so everything is typeset.
+    A preview (--only) lists exactly the selected chapters.
+
+    Returns (content, included) where included is the list of chapters that
+    will be typeset, or None for all of them.
+    """
+    header = "% Generated by build_latex.py - do not edit\n"
+    if only:
+        names = ",".join(f"latex/{tex_file.replace('.tex', '')}" for tex_file in only)
+        return header + f"% Preview: selected chapters only\n\\includeonly{{{names}}}\n", only
+
+    if not draft:
+        return header + "% Full build: all chapters are typeset\n", None
+
+    master_aux = MASTER_TEX.with_suffix(".aux")
+    if not master_aux.exists() or master_aux.stat().st_mtime < MASTER_TEX.stat().st_mtime:
+        return header + "% Draft build: master changed, all chapters are typeset\n", None
+
+    stale = stale_tex_files(tex_files)
+    if not stale:
+        return header + "% Draft build: nothing changed since the last compile\n", None
+
+    names = ",".join(f"latex/{tex_file.replace('.tex', '')}" for tex_file in stale)
+    return header + f"% Draft build: chapters changed since the last compile\n\\includeonly{{{names}}}\n", stale
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Build LaTeX files from XHTML sources.")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of concurrent pandoc conversions (default: CPU count)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always run pandoc and resample images instead of reusing cached output",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="pandoc",
+        help="converter: pandoc, or the in-process lxml engine (falls back to "
+             "pandoc for elements it does not handle)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="subprocess",
+        help="pandoc invocation: one process per file, or one 'pandoc lua' "
+             "process per worker (requires pandoc >= 3.0)",
+    )
+    parser.add_argument(
+        "--proof",
+        action="store_true",
+        help=f"resample images to {PROOF_DPI} DPI instead of {PRINT_DPI} for faster proofs",
+    )
+    parser.add_argument(
+        "--trim",
+        choices=list(TRIMS),
+        default=DEFAULT_TRIM,
+        help=f"trim size of the master document (default: {DEFAULT_TRIM})",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        metavar="SELECTOR",
+        help="convert and typeset only these spine files; repeatable. A selector is "
+             "a file name or glob, chapter:N (arabic or roman, or a range N-M) or part:N. "
+             "Other chapters keep the page numbers of the last full compile",
+    )
+    parser.add_argument(
+        "--draft",
+        action="store_true",
+        help="only typeset chapters that changed since the last compile "
+             "(via \\includeonly)",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+
+def main(argv=None):
     """Main function to build all LaTeX files."""
+    args = parse_args(argv)
+
     print("=" * 60)
     print("Building LaTeX files for 'Curls & Contemplation'")
     print("=" * 60)
@@ -532,59 +711,82 @@ def main():
     setup_directories()
 
     # Copy assets
-    print("\n2. Copying images and fonts...")
+    print("\n2. Syncing images and fonts...")
     copy_assets()
-
-    # Convert SVG to PDF for LaTeX compatibility
-    print("\n3. Converting SVG to PDF...")
-    svg_path = LATEX_IMAGES_DIR / "brushstroke.svg"
-    if svg_path.exists():
-        subprocess.run([
-            "rsvg-convert", "-f", "pdf",
-            "-o", str(LATEX_IMAGES_DIR / "brushstroke.pdf"),
-            str(svg_path)
-        ], check=True)
-        print("   Converted brushstroke.svg to PDF")
+    image_variants = resample_images(PROOF_DPI if args.proof else PRINT_DPI, args.jobs,
+                                     use_cache=not args.no_cache,
+                                     scale=image_scale([TRIMS[args.trim]]))
+
+    # Convert SVG to PDF and WOFF2 to TTF for LaTeX compatibility
+    print("\n3. Transcoding SVG images and WOFF2 fonts...")
+    transcoded = transcode_cache(enabled=not args.no_cache)
+    written, unchanged, transcode_errors = transcode_assets(OPF_PATH, LATEX_DIR, args.jobs, transcoded)
+    for path in written:
+        print(f"   Converted: {path.relative_to(LATEX_DIR)}")
+    for href, e in transcode_errors.items():
+        print(f"   Warning: could not convert {href}: {e}")
+    print(f"   {len(written)} converted, {len(unchanged)} unchanged ({transcoded.stats()})")
 
     # Convert each XHTML to LaTeX
-    print("\n4. Converting XHTML files to LaTeX...")
-    tex_files = []
+    if args.engine == "native":
+        print(f"\n4. Converting XHTML files to LaTeX ({args.jobs} jobs, native engine)...")
+    else:
+        print(f"\n4. Converting XHTML files to LaTeX ({args.jobs} jobs, {args.backend} backend)...")
+    spine_files = []
 
     for filename in SPINE_ORDER:
-        xhtml_path = XHTML_DIR / filename
-        if not xhtml_path.exists():
+        if not (XHTML_DIR / filename).exists():
             print(f"   Warning: {filename} not found, skipping")
             continue
-
-        print(f"   Converting: {filename}")
-
-        # Convert to LaTeX
-        latex_content = convert_xhtml_to_latex(xhtml_path)
-        latex_content = fix_latex_content(latex_content, filename)
-
-        # Get file type
-        file_type = get_file_type(filename)
-
-        # Create individual tex file
-        tex_filename = filename.replace(".xhtml", ".tex")
-        tex_content = create_individual_tex_file(filename, latex_content, file_type)
-
-        # Write the file
-        tex_path = LATEX_DIR / tex_filename
-        with open(tex_path, "w", encoding="utf-8") as f:
-            f.write(tex_content)
-
-        tex_files.append(tex_filename)
+        spine_files.append(filename)
+
+    selected = spine_files
+    if args.only:
+        try:
+            selected = select_spine(spine_files, args.only)
+        except ValueError as e:
+            print(f"   Error: {e}")
+            sys.exit(2)
+        print(f"   Preview: {len(selected)} of {len(spine_files)} files")
+
+    cache = pandoc_cache(enabled=not args.no_cache)
+    LATEX_RULES.reset()
+    tex_files, errors = convert_spine_files(selected, args.jobs, cache, args.backend, args.engine,
+                                           image_variants)
+    print(f"   Pandoc cache: {cache.stats()}")
+    print(f"   Rewrite rules: {LATEX_RULES.report()}")
+    if tex_files and LATEX_RULES.dead_rules():
+        print(f"   Rules that never fired: {', '.join(LATEX_RULES.dead_rules())}")
 
     # Create master document
     print("\n5. Creating master document...")
-    master_content = create_master_document(tex_files)
-
-    master_path = PDF_DIR / "CurlsAndContemplation-master.tex"
-    with open(master_path, "w", encoding="utf-8") as f:
-        f.write(master_content)
-
-    print(f"   Master document: {master_path}")
+    only = None
+    if args.only:
+        # The master still lists every chapter, so the front matter, part
+        # structure and counters come out as in the full book
+        only = tex_files
+        tex_files = [f.replace(".xhtml", ".tex") for f in spine_files
+                     if (LATEX_DIR / f.replace(".xhtml", ".tex")).exists()]
+    master_content = create_master_document(tex_files, args.trim)
+
+    master_path = MASTER_TEX
+    if write_if_changed(master_path, master_content):
+        print(f"   Master document: {master_path}")
+    else:
+        print(f"   Master document unchanged: {master_path}")
+
+    includeonly_content, included = create_includeonly(tex_files, args.draft, only)
+    write_if_changed(INCLUDEONLY_TEX, includeonly_content)
+    if included is None:
+        print("   Typesetting all chapters")
+    elif only:
+        print(f"   Preview: typesetting {len(included)} selected chapter(s)")
+        for tex_file in included:
+            print(f"     - {tex_file}")
+    else:
+        print(f"   Draft: typesetting {len(included)} changed chapter(s)")
+        for tex_file in included:
+            print(f"     - {tex_file}")
 
     # Summary
     print("\n" + "=" * 60)
@@ -594,8 +796,13 @@ def main():
     print(f"Master document: {master_path}")
     print(f"\nTo compile to PDF, run:")
     print(f"  cd {PDF_DIR}")
-    print(f"  xelatex CurlsAndContemplation-master.tex")
-    print(f"  xelatex CurlsAndContemplation-master.tex  # (run twice for TOC)")
+    print(f"  python3 compile_latex.py  # (repeats xelatex until the TOC converges)")
+
+    if errors:
+        print(f"\n{len(errors)} file(s) failed to convert:")
+        for filename, error in errors.items():
+            print(f"  - {filename}: {error}")
+        sys.exit(1)
 
     return tex_files
 
@@ -1,6 +1,8 @@
 #!/bin/bash
 # Compile LaTeX to POD-ready PDF
-# Usage: ./compile.sh [--rebuild]
+# Usage: ./compile.sh [--rebuild] [--only SELECTOR]...
+#   --only chapter:3, part:II or a spine file name typesets just that part
+#   (implies --rebuild); see bookbuild/spine.py
 
 set -e
 
@@ -12,50 +14,38 @@ echo "Curls & Contemplation - PDF Build"
 echo "=========================================="
 echo ""
 
-# Check for rebuild flag
-if [ "$1" == "--rebuild" ]; then
+# Parse flags
+REBUILD=0
+ONLY_ARGS=()
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --rebuild) REBUILD=1 ;;
+        --only)
+            if [ $# -lt 2 ]; then
+                echo "--only needs a selector (e.g. chapter:3)"; exit 2
+            fi
+            ONLY_ARGS+=("--only" "$2"); REBUILD=1; shift ;;
+        *) echo "Unknown option: $1"; exit 2 ;;
+    esac
+    shift
+done
+
+if [ "$REBUILD" == "1" ]; then
     echo "Rebuilding LaTeX from XHTML sources..."
-    python3 build_latex.py
+    python3 build_latex.py "${ONLY_ARGS[@]}"
     echo ""
 fi
 
-# Convert fonts if needed
-echo "Step 1: Checking fonts..."
-cd latex/fonts
-for f in *.woff2; do
-    if [ -f "$f" ]; then
-        ttf_file="${f%.woff2}.ttf"
-        if [ ! -f "$ttf_file" ]; then
-            echo "  Converting $f to TTF..."
-            woff2_decompress "$f" 2>/dev/null || true
-        fi
-    fi
-done
-cd "$SCRIPT_DIR"
-echo "  Fonts ready."
+# Convert fonts (WOFF2 -> TTF) and images (SVG -> PDF); cached, so a no-op when current
+echo "Step 1: Checking fonts and images..."
+python3 transcode_assets.py || echo "  Warning: some assets could not be converted"
 echo ""
 
-# Convert SVG to PDF if needed
-echo "Step 2: Checking images..."
-if [ -f "latex/images/brushstroke.svg" ] && [ ! -f "latex/images/brushstroke.pdf" ]; then
-    echo "  Converting brushstroke.svg to PDF..."
-    rsvg-convert -f pdf -o latex/images/brushstroke.pdf latex/images/brushstroke.svg
-fi
-echo "  Images ready."
+# Compile LaTeX (passes repeat until the TOC and references converge)
+echo "Step 2: Compiling LaTeX..."
 echo ""
 
-# Compile LaTeX (3 passes for proper TOC and references)
-echo "Step 3: Compiling LaTeX..."
-echo ""
-
-echo "  Pass 1 of 3..."
-xelatex -interaction=nonstopmode CurlsAndContemplation-master.tex > /dev/null 2>&1 || true
-
-echo "  Pass 2 of 3..."
-xelatex -interaction=nonstopmode CurlsAndContemplation-master.tex > /dev/null 2>&1 || true
-
-echo "  Pass 3 of 3..."
-xelatex -interaction=nonstopmode CurlsAndContemplation-master.tex
+python3 compile_latex.py CurlsAndContemplation-master.tex
 
 echo ""
 echo "=========================================="
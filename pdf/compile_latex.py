@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Compile the master LaTeX document to PDF for 'Curls & Contemplation'.
+Runs xelatex until cross-references converge, then writes the PDF once.
+
+Finished PDFs are kept in .cache/artifacts/ under a hash of the sources,
+the TeX distribution and the options; compiling the same sources again
+restores the stored PDF instead of running xelatex (--no-cache rebuilds).
+The .aux files are stored and restored with it, since a later \includeonly
+compile reads those of the chapters it skips.
+"""
+
+import json
+import sys
+import argparse
+from pathlib import Path
+
+# Directory setup
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from bookbuild.artifacts import (
+    artifact_cache, artifact_key, code_digest, files_digest, package_versions, restore_artifact,
+    source_date_epoch,
+)
+from bookbuild.cache import DiskCache, hash_parts
+from bookbuild.files import write_if_changed
+from bookbuild.pdf_optimize import format_size, optimize_pdf
+from bookbuild.xelatex import (
+    DEFAULT_MAX_PASSES, LatexError, compile_latex, document_inputs, state_files,
+    tex_distribution_id,
+)
+
+PDF_DIR = BASE_DIR / "pdf"
+MASTER_TEX = PDF_DIR / "CurlsAndContemplation-master.tex"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Compile LaTeX to PDF with as few xelatex passes as needed.")
+    parser.add_argument(
+        "tex",
+        nargs="?",
+        type=Path,
+        default=MASTER_TEX,
+        help=f"document to compile (default: {MASTER_TEX.name})",
+    )
+    parser.add_argument(
+        "--max-passes",
+        type=int,
+        default=DEFAULT_MAX_PASSES,
+        help=f"hard cap on xelatex passes (default: {DEFAULT_MAX_PASSES})",
+    )
+    parser.add_argument(
+        "--no-format",
+        action="store_true",
+        help="do not use the precompiled preamble format",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="post-process the PDF: merge duplicate images and fonts, drop unused "
+             "objects, compress object streams (requires pikepdf)",
+    )
+    parser.add_argument(
+        "--linearize",
+        action="store_true",
+        help="also linearize the PDF for fast web view (implies --optimize)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="compile even if these sources were compiled before",
+    )
+    args = parser.parse_args(argv)
+    if args.max_passes < 1:
+        parser.error("--max-passes must be at least 1")
+    return args
+
+
+def pdf_artifact_key(tex_path: Path, args: argparse.Namespace) -> str:
+    """Key of the finished PDF: sources, build code, TeX distribution, options and date."""
+    tex_path = tex_path.resolve()
+    optimize = args.optimize or args.linearize
+    return artifact_key(
+        "latex-pdf",
+        tex_path.name,
+        files_digest(tex_path.parent, document_inputs(tex_path)),
+        code_digest(__file__),
+        tex_distribution_id(),
+        package_versions("pikepdf") if optimize else "",
+        f"max_passes={args.max_passes} format={not args.no_format} "
+        f"optimize={optimize} linearize={args.linearize}",
+        str(source_date_epoch()),
+    )
+
+
+def store_pdf(cache: DiskCache, key: str, pdf_path: Path, tex_path: Path) -> None:
+    """Store a finished PDF and the cross-reference files its compile left behind."""
+    workdir = tex_path.resolve().parent
+    names = [path.relative_to(workdir).as_posix()
+             for path in state_files(tex_path.resolve()) if path.exists()]
+    for name in names:
+        cache.put(hash_parts(key, "state", name), (workdir / name).read_bytes())
+    cache.put_text(hash_parts(key, "state"), json.dumps(names))
+    cache.put(key, pdf_path.read_bytes())
+
+
+def restore_pdf(cache: DiskCache, key: str, pdf_path: Path, tex_path: Path) -> bool:
+    """Restore a stored PDF and its cross-reference files; returns False if not stored."""
+    names = cache.get_text(hash_parts(key, "state"))
+    if names is None:
+        return False
+    state = {}
+    for name in json.loads(names):
+        data = cache.get(hash_parts(key, "state", name))
+        if data is None:
+            return False  # evicted
+        state[name] = data
+    if restore_artifact(cache, key, pdf_path) is None:
+        return False
+    workdir = tex_path.resolve().parent
+    for name, data in state.items():
+        write_if_changed(workdir / name, data)
+    return True
+
+
+def main(argv=None):
+    """Main function to compile the PDF."""
+    args = parse_args(argv)
+    pdf_path = args.tex.resolve().with_suffix(".pdf")
+
+    cache = artifact_cache(enabled=not args.no_cache)
+    key = pdf_artifact_key(args.tex, args) if cache.enabled else None
+    if key and restore_pdf(cache, key, pdf_path, args.tex):
+        print(f"Build complete: {pdf_path} (sources unchanged, cached PDF restored)")
+        return pdf_path
+
+    print(f"Compiling {args.tex.name}...")
+    try:
+        pdf_path, passes, converged = compile_latex(args.tex, args.max_passes, use_format=not args.no_format)
+    except LatexError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Build complete: {pdf_path} ({passes} xelatex pass{'es' if passes != 1 else ''})")
+
+    if args.optimize or args.linearize:
+        data = pdf_path.read_bytes()
+        optimized, merged = optimize_pdf(data, args.linearize)
+        pdf_path.write_bytes(optimized)
+        print(f"Optimized: {format_size(len(data))} -> {format_size(len(optimized))} "
+              f"({merged} duplicate streams merged)")
+
+    # Without converged cross-references the PDF depends on the old .aux files
+    if key and converged:
+        store_pdf(cache, key, pdf_path, args.tex)
+    return pdf_path
+
+
+if __name__ == "__main__":
+    main()
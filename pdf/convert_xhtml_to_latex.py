@@ -5,8 +5,8 @@ Uses the spine order from content.opf for proper document structure.
 """
 
 import os
-import re
-import subprocess
+import sys
+import argparse
 from pathlib import Path
 from lxml import etree
 
@@ -61,43 +61,33 @@ SPINE_ORDER = [
 ]
 
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from bookbuild.cache import DiskCache
+from bookbuild.files import write_if_changed
+from bookbuild.pandoc import BACKENDS, pandoc_cache, run_pandoc, run_pandoc_batch
+from bookbuild.rewrite import Rule, RuleSet
+
 XHTML_DIR = BASE_DIR / "pub" / "OEBPS" / "xhtml"
 IMAGES_DIR = BASE_DIR / "pub" / "OEBPS" / "images"
 OUTPUT_DIR = BASE_DIR / "pdf"
 
 
-def convert_single_xhtml_to_latex(xhtml_path: Path) -> str:
+def convert_single_xhtml_to_latex(xhtml_path: Path, cache: DiskCache = None) -> str:
     """Convert a single XHTML file to LaTeX using pandoc."""
-    result = subprocess.run(
-        [
-            "pandoc",
-            str(xhtml_path),
-            "-f", "html",
-            "-t", "latex",
-            "--wrap=preserve",
-        ],
-        capture_output=True,
-        text=True
-    )
-    if result.returncode != 0:
-        print(f"Warning: pandoc error for {xhtml_path.name}: {result.stderr}")
-    return result.stdout
+    return run_pandoc(xhtml_path, cache)
+
+
+# Rebase ../images/ and ./images/ onto the EPUB images, relative to pdf/
+IMAGE_RULES = RuleSet([
+    Rule("image-path", r'\\includegraphics(\[.*?\])?\{(?:\.\.?/)?images/',
+         r'\\includegraphics\1{../pub/OEBPS/images/'),
+])
 
 
 def fix_image_paths(latex_content: str) -> str:
     """Fix image paths to be relative to the pdf directory."""
-    # Replace image paths to point to ../pub/OEBPS/images/
-    latex_content = re.sub(
-        r'\\includegraphics(\[.*?\])?\{\.\.?/images/',
-        r'\\includegraphics\1{../pub/OEBPS/images/',
-        latex_content
-    )
-    latex_content = re.sub(
-        r'\\includegraphics(\[.*?\])?\{images/',
-        r'\\includegraphics\1{../pub/OEBPS/images/',
-        latex_content
-    )
-    return latex_content
+    return IMAGE_RULES.apply(latex_content)
 
 
 def escape_latex_special(text: str) -> str:
@@ -106,7 +96,7 @@ def escape_latex_special(text: str) -> str:
     return text
 
 
-def generate_latex_document() -> str:
+def generate_latex_document(cache: DiskCache = None, backend: str = "subprocess") -> str:
     """Generate the complete LaTeX document."""
 
     # LaTeX preamble with professional book formatting
@@ -226,6 +216,12 @@ def generate_latex_document() -> str:
     body_parts = []
     current_part = None
 
+    # The batch backend converts everything up front in one pandoc process
+    batch_results = {}
+    if backend == "batch":
+        existing = [XHTML_DIR / f for f in SPINE_ORDER if (XHTML_DIR / f).exists()]
+        batch_results = run_pandoc_batch(existing, cache)
+
     for i, filename in enumerate(SPINE_ORDER):
         xhtml_path = XHTML_DIR / filename
         if not xhtml_path.exists():
@@ -233,7 +229,10 @@ def generate_latex_document() -> str:
             continue
 
         print(f"Converting: {filename}")
-        latex_content = convert_single_xhtml_to_latex(xhtml_path)
+        if backend == "batch":
+            latex_content = batch_results[xhtml_path]
+        else:
+            latex_content = convert_single_xhtml_to_latex(xhtml_path, cache)
         latex_content = fix_image_paths(latex_content)
 
         # Add section markers based on filename
@@ -300,8 +299,28 @@ def generate_latex_document() -> str:
     return full_document
 
 
-def main():
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Convert XHTML files to a consolidated LaTeX document.")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always run pandoc instead of reusing cached output",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="subprocess",
+        help="pandoc invocation: one process per file, or a single 'pandoc lua' "
+             "process for the whole book (requires pandoc >= 3.0)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Main function to run the conversion."""
+    args = parse_args(argv)
+
     print("Starting XHTML to LaTeX conversion...")
     print(f"XHTML directory: {XHTML_DIR}")
     print(f"Output directory: {OUTPUT_DIR}")
@@ -310,14 +329,17 @@ def main():
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
     # Generate the LaTeX document
-    latex_document = generate_latex_document()
+    cache = pandoc_cache(enabled=not args.no_cache)
+    latex_document = generate_latex_document(cache, args.backend)
+    print(f"Pandoc cache: {cache.stats()}")
+    print(f"Rewrite rules: {IMAGE_RULES.report()}")
 
     # Write the LaTeX file
     output_file = OUTPUT_DIR / "CurlsAndContemplation.tex"
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(latex_document)
-
-    print(f"\nLaTeX file generated: {output_file}")
+    if write_if_changed(output_file, latex_document):
+        print(f"\nLaTeX file generated: {output_file}")
+    else:
+        print(f"\nLaTeX file unchanged: {output_file}")
     print(f"File size: {output_file.stat().st_size} bytes")
 
     return output_file
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Transcode EPUB assets for the LaTeX build of 'Curls & Contemplation'.
+Converts the SVG images to PDF and the WOFF2 fonts to TTF listed in
+content.opf, in parallel and cached.
+"""
+
+import os
+import sys
+import argparse
+from pathlib import Path
+
+# Directory setup
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from bookbuild.transcode import transcode_assets, transcode_cache
+
+OPF_PATH = BASE_DIR / "pub" / "OEBPS" / "content.opf"
+LATEX_DIR = BASE_DIR / "pdf" / "latex"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Convert SVG and WOFF2 assets for LaTeX.")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of concurrent conversions (default: CPU count)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always run the converters instead of reusing cached output",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+
+def main(argv=None):
+    """Main function to transcode assets."""
+    args = parse_args(argv)
+
+    print("Transcoding assets...")
+    cache = transcode_cache(enabled=not args.no_cache)
+    written, unchanged, errors = transcode_assets(OPF_PATH, LATEX_DIR, args.jobs, cache)
+    for path in written:
+        print(f"  Converted: {path.relative_to(LATEX_DIR)}")
+    for href, e in errors.items():
+        print(f"  Error: {href}: {e}")
+    print(f"Assets ready: {len(written)} converted, {len(unchanged)} unchanged ({cache.stats()})")
+
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()